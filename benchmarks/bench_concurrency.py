@@ -0,0 +1,85 @@
+"""قياس زمن معالجة التحديثات عند 1 و 50 و 500 طالب في نفس الوقت
+
+يقارن المعالجة التسلسلية (الافتراضي القديم) مع PerUserUpdateProcessor.
+كل طالب يرسل عدة إجابات متتالية، وكل معالج يحاكي استدعاء API بزمن ثابت
+مع قليل من العمل على المعالج.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_concurrency --students 1 50 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+from telegram.ext import SimpleUpdateProcessor
+
+from concurrency import PerUserUpdateProcessor, UserLocks
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def simulate(processor, students, answers, io_latency, cpu_time):
+    latencies = []
+    seen = {}
+    violations = 0
+
+    async def handler(user_id, seq):
+        nonlocal violations
+        # محاكاة تحليل JSON ثم انتظار رد تيليجرام
+        deadline = time.perf_counter() + cpu_time
+        while time.perf_counter() < deadline:
+            pass
+        await asyncio.sleep(io_latency)
+        if seen.get(user_id, -1) != seq - 1:
+            violations += 1
+        seen[user_id] = seq
+
+    async def student(user_id):
+        update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+        for seq in range(answers):
+            started = time.perf_counter()
+            await processor.process_update(update, handler(user_id, seq))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with processor:
+        await asyncio.gather(*(student(uid) for uid in range(students)))
+    elapsed = time.perf_counter() - started
+    return latencies, elapsed, violations
+
+
+async def main(args):
+    print(f"{'mode':<12}{'students':>9}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'upd/s':>10}{'order':>7}")
+    for students in args.students:
+        modes = [
+            ('sequential', SimpleUpdateProcessor(1)),
+            ('per-user', PerUserUpdateProcessor(args.limit, locks=UserLocks())),
+        ]
+        for name, processor in modes:
+            latencies, elapsed, violations = await simulate(
+                processor, students, args.answers, args.io_latency, args.cpu_time
+            )
+            print(
+                f"{name:<12}{students:>9}"
+                f"{percentile(latencies, 50) * 1000:>10.1f}"
+                f"{percentile(latencies, 99) * 1000:>10.1f}"
+                f"{statistics.mean(latencies) * 1000:>10.1f}"
+                f"{len(latencies) / elapsed:>10.0f}"
+                f"{violations:>7}"
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, nargs='+', default=[1, 50, 500])
+    parser.add_argument('--answers', type=int, default=3, help='عدد الإجابات لكل طالب')
+    parser.add_argument('--limit', type=int, default=64, help='حد التوازي')
+    parser.add_argument('--io-latency', type=float, default=0.02, help='زمن استدعاء API بالثواني')
+    parser.add_argument('--cpu-time', type=float, default=0.0005, help='زمن العمل على المعالج بالثواني')
+    asyncio.run(main(parser.parse_args()))
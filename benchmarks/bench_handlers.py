@@ -0,0 +1,247 @@
+"""قياس معالجات bot.py تحت الحمل مع واجهة Bot API وهمية داخل العملية
+
+يشغّل Application الحقيقي بكل معالجاته (مع PerUserUpdateProcessor وحدود
+الإرسال) على تخزين حقيقي في مجلد مؤقت، عبر ثلاث مراحل:
+  teachers - معلمون يضيفون أسئلة من المحادثة (صح/خطأ واختيار من متعدد)
+  students - طلاب في نفس الوقت: /start ثم الدور ثم اختبار كامل ثم نتائجي
+  reports  - كل معلم يفتح الإحصائيات وقائمة الأسئلة
+
+لكل مرحلة: معدل التحديثات، وزمن التحديث من الطابور حتى الانتهاء، وطلبات
+API وعمليات القرص لكل تحديث (من /proc/self/io على لينكس). ولكل معالج
+(وكذلك finish_quiz و show_next_question): p50/p95/p99 لزمن التنفيذ.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_handlers --students 2000 --backend sqlite
+    python -m benchmarks.bench_handlers --backend json --json before.json
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.fake_telegram import FakeBotAPI, callback_update, message_update
+
+# دوال داخلية تُقاس إلى جانب المعالجات المسجلة
+TIMED_FUNCTIONS = ('finish_quiz', 'show_next_question')
+
+# حقول /proc/self/io: البايتات والاستدعاءات عبر read/write، والبايتات الفعلية على القرص
+IO_FIELDS = ('rchar', 'wchar', 'syscr', 'syscw', 'read_bytes', 'write_bytes')
+
+
+def read_io():
+    """عدادات الإدخال والإخراج للعملية، أو None خارج لينكس"""
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f.read().splitlines())
+    except OSError:
+        return None
+    return {field: int(counters[field]) for field in IO_FIELDS}
+
+
+class Recorder:
+    """أزمنة تنفيذ كل معالج حسب اسمه"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self.samples[name].append(time.perf_counter() - started)
+        return timed
+
+    def instrument(self, application, module):
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                handler.callback = self.wrap(handler.callback.__name__, handler.callback)
+        # المعالجات تستدعي هذه الدوال بالاسم من الوحدة، فيكفي استبدالها فيها
+        for name in TIMED_FUNCTIONS:
+            setattr(module, name, self.wrap(name, getattr(module, name)))
+
+
+def teacher_script(teacher_id, questions):
+    updates = [message_update(teacher_id, '/start'), callback_update(teacher_id, 'role_teacher')]
+    for i in range(questions):
+        updates.append(callback_update(teacher_id, 'add_question'))
+        if i % 2 == 0:
+            updates += [
+                callback_update(teacher_id, 'type_true_false'),
+                message_update(teacher_id, f"سؤال صح أو خطأ رقم {i}؟"),
+                callback_update(teacher_id, 'answer_true')
+            ]
+        else:
+            updates += [
+                callback_update(teacher_id, 'type_multiple_choice'),
+                message_update(teacher_id, f"سؤال اختيار رقم {i}؟"),
+                message_update(teacher_id, "أ) الأول\nب) الثاني\nج) الثالث"),
+                message_update(teacher_id, 'أ')
+            ]
+    return updates
+
+
+def student_script(student_id, quiz_size):
+    return (
+        [message_update(student_id, '/start'),
+         callback_update(student_id, 'role_student'),
+         callback_update(student_id, 'start_quiz')]
+        + [callback_update(student_id, 'ans_true') for _ in range(quiz_size)]
+        + [callback_update(student_id, 'my_results')]
+    )
+
+
+def report_script(teacher_id):
+    return [callback_update(teacher_id, 'teacher_stats'), callback_update(teacher_id, 'view_questions')]
+
+
+async def run_phase(application, database, fake_api, scripts):
+    """تشغيل سيناريوهات كل المستخدمين معاً؛ تحديثات المستخدم الواحد متتالية كما في الواقع"""
+    from telegram import Update
+
+    processor = application.update_processor
+    latencies = []
+
+    async def play(script):
+        for data in script:
+            update = Update.de_json(data, application.bot)
+            started = time.perf_counter()
+            await processor.process_update(update, application.process_update(update))
+            latencies.append(time.perf_counter() - started)
+
+    api_calls = sum(fake_api.calls.values())
+    io_before = read_io()
+    started = time.perf_counter()
+    await asyncio.gather(*(play(script) for script in scripts))
+    # الكتابة المؤجلة (التخزين memory) تُحتسب على المرحلة التي أنتجتها
+    await database.flush()
+    elapsed = time.perf_counter() - started
+    io_after = read_io()
+
+    result = {
+        'updates': len(latencies),
+        'seconds': elapsed,
+        'updates_per_second': len(latencies) / elapsed,
+        'latency_ms': {f"p{q}": percentile(latencies, q) * 1000 for q in (50, 95, 99)},
+        'api_calls_per_update': (sum(fake_api.calls.values()) - api_calls) / len(latencies)
+    }
+    if io_before is not None:
+        result['io_per_update'] = {
+            field: (io_after[field] - io_before[field]) / len(latencies) for field in IO_FIELDS
+        }
+    return result
+
+
+async def benchmark(args):
+    import bot
+
+    # سجلات كل تحديث تطغى على القياس وعلى عدادات الكتابة
+    logging.getLogger().setLevel(logging.WARNING)
+
+    fake_api = FakeBotAPI(latency=args.api_latency, flood_every=args.flood_every)
+    application = bot.build_application(request=fake_api)
+    recorder = Recorder()
+    recorder.instrument(application, bot)
+
+    teachers = [1000 + i for i in range(args.teachers)]
+    students = [100000 + i for i in range(args.students)]
+    phases = {}
+
+    async with application:
+        phases['teachers'] = await run_phase(
+            application, bot.db, fake_api, [teacher_script(t, args.questions) for t in teachers]
+        )
+        phases['students'] = await run_phase(
+            application, bot.db, fake_api, [student_script(s, args.quiz_size) for s in students]
+        )
+        phases['reports'] = await run_phase(
+            application, bot.db, fake_api, [report_script(t) for t in teachers]
+        )
+    await bot.on_shutdown(application)
+
+    handlers = {
+        name: {
+            'count': len(samples),
+            **{f"p{q}": percentile(samples, q) * 1000 for q in (50, 95, 99)}
+        }
+        for name, samples in sorted(recorder.samples.items())
+    }
+    return {'phases': phases, 'handlers': handlers, 'api_calls': dict(fake_api.calls), 'floods': fake_api.floods}
+
+
+def print_report(results, args):
+    print(f"backend={args.backend} teachers={args.teachers} questions={args.questions} "
+          f"students={args.students} quiz_size={args.quiz_size}")
+    print()
+    print(f"{'phase':<10}{'updates':>9}{'seconds':>9}{'upd/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'api/upd':>9}"
+          f"{'rB/upd':>9}{'wB/upd':>9}{'rd/upd':>8}{'wr/upd':>8}")
+    for name, phase in results['phases'].items():
+        io = phase.get('io_per_update')
+        io_columns = (
+            f"{io['rchar']:>9.0f}{io['wchar']:>9.0f}{io['syscr']:>8.1f}{io['syscw']:>8.1f}"
+            if io else f"{'n/a':>9}{'n/a':>9}{'n/a':>8}{'n/a':>8}"
+        )
+        latency = phase['latency_ms']
+        print(f"{name:<10}{phase['updates']:>9}{phase['seconds']:>9.2f}{phase['updates_per_second']:>9.0f}"
+              f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+              f"{phase['api_calls_per_update']:>9.2f}{io_columns}")
+
+    print()
+    print(f"{'handler':<28}{'count':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in results['handlers'].items():
+        print(f"{name:<28}{stats['count']:>8}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}")
+
+    if results['floods']:
+        print(f"\nردود 429 محاكاة: {results['floods']}")
+
+
+def main(args):
+    # الإعدادات تُقرأ عند الاستيراد، فتُضبط قبل استيراد bot
+    os.environ.update({
+        'STORAGE_BACKEND': args.backend,
+        'STATE_BACKEND': 'memory',
+        'ANSWER_FEEDBACK_DELAY': '0',
+        'QUIZ_SIZE': str(args.quiz_size),
+        'QUIZ_MIX': ''
+    })
+    if not args.real_limits:
+        # حدود الإرسال تُرفع حتى يُقاس زمن المعالجة لا انتظار الدلاء
+        os.environ.update({'RATE_LIMIT_GLOBAL': '1000000', 'RATE_LIMIT_CHAT': '1000000'})
+
+    output = os.path.abspath(args.json) if args.json else None
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # مسارات التخزين الافتراضية نسبية، فكل تشغيل يبدأ بتخزين فارغ
+        os.chdir(directory)
+        try:
+            results = asyncio.run(benchmark(args))
+        finally:
+            os.chdir(previous)
+
+    print_report(results, args)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), **results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'memory', 'sqlite'], default='memory')
+    parser.add_argument('--teachers', type=int, default=5)
+    parser.add_argument('--questions', type=int, default=20, help='عدد الأسئلة لكل معلم')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--quiz-size', type=int, default=5)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='زمن استدعاء API الوهمي بالثواني')
+    parser.add_argument('--flood-every', type=int, default=0, help='رد 429 على كل طلب رسالة رقم n')
+    parser.add_argument('--real-limits', action='store_true', help='إبقاء حدود الإرسال الحقيقية')
+    parser.add_argument('--json', help='حفظ النتائج في ملف JSON للمقارنة لاحقاً')
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""قياس زمن إرسال الاختبار المباشر لكل الفصل: حلقة متتالية مقابل fan_out
+
+الإرسال يمر عبر OutboundLimiter بحدوده الحقيقية (RATE_LIMIT_GLOBAL رسالة في
+الثانية) وواجهة Bot API وهمية بزمن شبكة محاكى. الحلقة المتتالية تنتظر ذهاب كل
+طلب وعودته، بينما fan_out يبقي عدة طلبات معلقة فيصبح الحد الكلي هو القيد الوحيد.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_live_exam --students 300 --api-latency 0.1
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fake_telegram import FakeBotAPI
+
+
+async def benchmark(args):
+    from telegram.ext import ApplicationBuilder
+
+    from live_exam import fan_out
+    from rate_limiter import BULK_SEND, OutboundLimiter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    students = [100000 + i for i in range(args.students)]
+
+    async def measure(deliver):
+        application = (
+            ApplicationBuilder().token('1:bench').request(FakeBotAPI(args.api_latency))
+            .rate_limiter(OutboundLimiter()).build()
+        )
+        async with application:
+            async def send(student_id):
+                await application.bot.send_message(
+                    chat_id=student_id, text='سؤال', rate_limit_args=BULK_SEND
+                )
+
+            started = time.perf_counter()
+            await deliver(send)
+            return time.perf_counter() - started
+
+    async def serial(send):
+        for student_id in students:
+            await send(student_id)
+
+    async def concurrent(send):
+        await fan_out(send, students, args.concurrency)
+
+    return {'serial': await measure(serial), 'fan_out': await measure(concurrent)}
+
+
+def main(args):
+    from config import RATE_LIMIT_GLOBAL
+
+    results = asyncio.run(benchmark(args))
+    print(f"students={args.students} api_latency={args.api_latency}s "
+          f"concurrency={args.concurrency} global_limit={RATE_LIMIT_GLOBAL}/s")
+    print(f"{'sender':<10}{'seconds':>10}{'msg/s':>10}")
+    for name, seconds in results.items():
+        print(f"{name:<10}{seconds:>10.2f}{args.students / seconds:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--api-latency', type=float, default=0.1, help='زمن استدعاء API الوهمي بالثواني')
+    parser.add_argument('--concurrency', type=int, default=32)
+    main(parser.parse_args())
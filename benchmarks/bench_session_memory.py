@@ -0,0 +1,119 @@
+"""قياس ذاكرة جلسات الاختبار الجارية: القواميس السابقة مقابل QuizSession
+
+لكل شكل تُنشأ آلاف الجلسات في منتصف الاختبار (أُجيب عن نصف الأسئلة) ويُقاس
+ما تحجزه بـ tracemalloc، وحجم JSON لكل جلسة كما يُخزن في مخزن حالة SQLite.
+الأشكال:
+  dict_copies - القاموس السابق بنسخ كاملة من الأسئلة (كما يُقرأ من مخزن SQLite)
+  dict_shared - القاموس السابق بمراجع لأسئلة الفهرس المشتركة (مخزن الذاكرة)
+  session     - QuizSession بمعرفات الأسئلة وإجابات Answer
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_session_memory --sessions 10000
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from models import Answer, QuizSession
+
+
+def make_questions(count):
+    questions = []
+    for i in range(count):
+        question = {
+            'id': f"q{i:08d}abcdef_1000",
+            'type': 'multiple_choice' if i % 2 else 'true_false',
+            'question': f"ما ناتج العملية الحسابية رقم {i} في درس الكسور العشرية للصف الخامس؟",
+            'photo': '',
+            'photo_file_id': '',
+            'correct_answer': 'ب' if i % 2 else 'صح',
+            'teacher_name': 'معلم الرياضيات',
+            'teacher_id': '1000',
+            'created_at': '2024-01-01T10:00:00.000000'
+        }
+        if i % 2:
+            question['options'] = "أ) 0.5\nب) 0.25\nج) 0.75\nد) 1.5"
+        questions.append(question)
+    return questions
+
+
+def answer_fields(question):
+    return {
+        'question_id': question['id'],
+        'question_type': question['type'],
+        'user_answer': 'true',
+        'correct_answer': question['correct_answer'],
+        'is_correct': True,
+        'elapsed': 3.25
+    }
+
+
+def dict_session(questions, answered, copies):
+    now = time.time()
+    return {
+        'action': 'taking_quiz',
+        'questions': json.loads(json.dumps(questions)) if copies else list(questions),
+        'current_question': answered,
+        'answers': [answer_fields(q) for q in questions[:answered]],
+        'score': answered,
+        'started_at': now,
+        'deadline': None,
+        'question_shown_at': now,
+        'question_deadline': None
+    }
+
+
+def slotted_session(questions, answered):
+    now = time.time()
+    return QuizSession(
+        question_ids=tuple(q['id'] for q in questions),
+        started_at=now,
+        current=answered,
+        score=answered,
+        answers=[Answer(**answer_fields(q)) for q in questions[:answered]],
+        question_shown_at=now
+    )
+
+
+def measure(build, sessions):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    store = {user_id: build() for user_id in range(sessions)}
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return store, allocated / sessions
+
+
+def main(args):
+    bank = make_questions(args.bank)
+    pick = lambda: random.sample(bank, args.quiz_size)
+    answered = args.quiz_size // 2
+
+    shapes = {
+        'dict_copies': lambda: dict_session(pick(), answered, copies=True),
+        'dict_shared': lambda: dict_session(pick(), answered, copies=False),
+        'session': lambda: slotted_session(pick(), answered)
+    }
+
+    print(f"sessions={args.sessions} quiz_size={args.quiz_size} answered={answered}")
+    print(f"{'shape':<14}{'bytes/session':>15}{'MB total':>10}{'json bytes':>12}")
+    for name, build in shapes.items():
+        store, per_session = measure(build, args.sessions)
+        sample = next(iter(store.values()))
+        encoded = sample.to_dict() if isinstance(sample, QuizSession) else sample
+        json_size = len(json.dumps(encoded, ensure_ascii=False).encode())
+        print(f"{name:<14}{per_session:>15.0f}{per_session * args.sessions / 1e6:>10.1f}{json_size:>12}")
+        del store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--quiz-size', type=int, default=5)
+    parser.add_argument('--bank', type=int, default=500, help='عدد الأسئلة في الفهرس المشترك')
+    main(parser.parse_args())
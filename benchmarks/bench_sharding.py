@@ -0,0 +1,164 @@
+"""قياس معدل معالجة التحديثات في التشغيل الموزع بعدد مختلف من العمليات العاملة
+
+كل عامل عملية مستقلة تشغّل المعالجات الحقيقية من bot.py على قاعدة SQLite
+مشتركة، مع واجهة Bot API وهمية داخل العملية بدل خوادم تيليجرام. العملية
+الأم توزع التحديثات عبر ShardRouter كما تفعل العملية الأمامية (دون طبقة HTTP).
+كل طالب يختار دوره ثم يبدأ اختباراً ويجيب عن كل أسئلته.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_sharding --shards 1 2 4 --students 500
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeBotAPI, callback_update
+
+
+def worker_main(index, socket_dir, api_latency, processed):
+    """عملية عاملة: نفس run_shard_worker لكن مع الواجهة الوهمية وعداد للتحديثات"""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    import bot
+    from sharding import ShardServer, socket_path
+    from webhook import run_with_server
+
+    async def count(update, context):
+        with processed.get_lock():
+            processed.value += 1
+
+    application = bot.build_application(request=FakeBotAPI(api_latency))
+    application.add_handler(TypeHandler(Update, count), group=1)
+    asyncio.run(run_with_server(application, ShardServer(application, socket_path(index, socket_dir))))
+
+
+def student_updates(students, quiz_size):
+    """تحديثات كل الطلاب متداخلة: الخطوة i لكل الطلاب ثم الخطوة i+1"""
+    steps = ['role_student', 'start_quiz'] + ['ans_true'] * quiz_size
+    return [
+        callback_update(100000 + student, data)
+        for data in steps
+        for student in range(students)
+    ]
+
+
+async def wait_for(counter, target, timeout):
+    deadline = time.perf_counter() + timeout
+    while counter.value < target:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"تمت معالجة {counter.value} من {target} تحديث فقط")
+        await asyncio.sleep(0.01)
+
+
+async def drive(router, updates, processed, shards, timeout):
+    from sharding import jump_hash
+
+    await router.start()
+
+    # تحديث تمهيدي لكل عامل حتى يُستبعد زمن تشغيل العمليات من القياس
+    warmup_users = {}
+    for user_id in itertools.count(1):
+        warmup_users.setdefault(jump_hash(user_id, shards), user_id)
+        if len(warmup_users) == shards:
+            break
+    for user_id in warmup_users.values():
+        router.dispatch(callback_update(user_id, 'my_results'))
+    await wait_for(processed, shards, timeout)
+
+    started = time.perf_counter()
+    for update in updates:
+        router.dispatch(update)
+    await wait_for(processed, shards + len(updates), timeout)
+    elapsed = time.perf_counter() - started
+
+    await router.stop()
+    return elapsed
+
+
+def run(shards, args):
+    from sharding import ShardRouter
+    from sqlite_database import SQLiteDatabase
+
+    with tempfile.TemporaryDirectory() as directory:
+        # مسارات التخزين الافتراضية نسبية، فكل تشغيل يبدأ بقاعدة جديدة
+        previous = os.getcwd()
+        os.chdir(directory)
+        try:
+            return run_in_directory(shards, args, ShardRouter, SQLiteDatabase)
+        finally:
+            os.chdir(previous)
+
+
+def run_in_directory(shards, args, ShardRouter, SQLiteDatabase):
+    database = SQLiteDatabase('quiz.db')
+    database.add_teacher(1, 'teacher', 'معلم')
+    database.add_questions(1, [
+        {'type': 'true_false', 'question': f'سؤال {i}', 'correct_answer': 'صح',
+         'photo': '', 'photo_file_id': '', 'teacher_name': 'معلم'}
+        for i in range(args.questions)
+    ])
+    database.close()
+
+    socket_dir = 'shards'
+    os.makedirs(socket_dir)
+    context = multiprocessing.get_context('fork')
+    processed = context.Value('q', 0)
+    workers = [
+        context.Process(target=worker_main, args=(index, socket_dir, args.api_latency, processed))
+        for index in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    updates = student_updates(args.students, args.quiz_size)
+    router = ShardRouter(shards, socket_dir, queue_size=len(updates) + shards)
+    try:
+        elapsed = asyncio.run(drive(router, updates, processed, shards, args.timeout))
+    finally:
+        for worker in workers:
+            os.kill(worker.pid, signal.SIGTERM)
+        for worker in workers:
+            worker.join()
+
+    database = SQLiteDatabase('quiz.db')
+    saved = database._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+    database.close()
+    return len(updates), elapsed, saved
+
+
+def main(args):
+    # الإعدادات تُقرأ عند الاستيراد، فتُضبط قبل استيراد أي وحدة من المشروع
+    os.environ.update({
+        'STORAGE_BACKEND': 'sqlite',
+        'STATE_BACKEND': 'memory',
+        'ANSWER_FEEDBACK_DELAY': '0',
+        'QUIZ_SIZE': str(args.quiz_size),
+        'QUIZ_MIX': '',
+        'SQLITE_PATH': 'quiz.db',
+        # حدود الإرسال تُرفع حتى يُقاس زمن المعالجة لا انتظار الدلاء
+        'RATE_LIMIT_GLOBAL': '1000000',
+        'RATE_LIMIT_CHAT': '1000000'
+    })
+
+    print(f"{'shards':>7}{'updates':>9}{'seconds':>10}{'upd/s':>10}{'results':>9}")
+    for shards in args.shards:
+        total, elapsed, saved = run(shards, args)
+        print(f"{shards:>7}{total:>9}{elapsed:>10.2f}{total / elapsed:>10.0f}{saved:>9}")
+    print(f"(أنوية المعالج المتاحة: {os.cpu_count()})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--quiz-size', type=int, default=5)
+    parser.add_argument('--questions', type=int, default=100, help='عدد الأسئلة في البنك')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='زمن استدعاء API الوهمي بالثواني')
+    parser.add_argument('--timeout', type=float, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""قياس زمن التشغيل: استيراد bot وأول طلب مع التحميل المسبق وبدونه
+
+كل قياس يعمل في عملية جديدة داخل مجلد مؤقت فيه بنك أسئلة وطلاب بحجم
+محدد، حتى تكون الاستيرادات والملفات باردة كما في أول تشغيل على الخادم.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_startup --questions 20000 --students 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import bot
+imported = time.perf_counter() - started
+
+async def main():
+    warm = 0.0
+    if {warm}:
+        began = time.perf_counter()
+        await bot.db.warm()
+        warm = time.perf_counter() - began
+    began = time.perf_counter()
+    await bot.db.sample_questions(5)
+    await bot.db.get_student_summary('100')
+    first = time.perf_counter() - began
+    print(json.dumps({{'import': imported, 'warm': warm, 'first_request': first}}))
+
+asyncio.run(main())
+"""
+
+
+def make_data(directory, questions, students):
+    bank = {
+        f"q{i:08d}_1000": {
+            'id': f"q{i:08d}_1000",
+            'type': 'true_false',
+            'question': f"هل العبارة رقم {i} صحيحة؟",
+            'correct_answer': 'صح',
+            'teacher_id': '1000',
+            'teacher_name': 'معلم',
+            'created_at': '2024-01-01T10:00:00'
+        }
+        for i in range(questions)
+    }
+    roster = {
+        str(100 + i): {'name': f"طالب {i}", 'quizzes_taken': 3, 'total_score': 12}
+        for i in range(students)
+    }
+    for name, data in (('questions.json', bank), ('students.json', roster)):
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+
+def run(directory, warm):
+    env = {**os.environ, 'PYTHONPATH': ROOT, 'BOT_TOKEN': os.getenv('BOT_TOKEN', '1:bench')}
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(warm=warm)],
+        cwd=directory, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        make_data(directory, args.questions, args.students)
+        print(f"questions={args.questions} students={args.students} runs={args.runs}")
+        print(f"{'mode':<10}{'import ms':>12}{'warm ms':>10}{'first ms':>10}")
+        for mode, warm in (('cold', False), ('warm', True)):
+            results = [run(directory, warm) for _ in range(args.runs)]
+            best = {key: min(result[key] for result in results) * 1000 for key in results[0]}
+            print(f"{mode:<10}{best['import']:>12.1f}{best['warm']:>10.1f}{best['first_request']:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20000)
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""واجهة Bot API وهمية داخل العملية لقياس المعالجات دون خوادم تيليجرام
+
+تُمرر إلى bot.build_application(request=FakeBotAPI()) فتمر كل طلبات البوت
+عبر مكتبة python-telegram-bot كاملة (التحويل إلى JSON والتحقق من الرد)
+ما عدا الشبكة. تحاكي زمن الشبكة وردود 429 عند الطلب وتعد الطلبات حسب النوع.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+
+
+class FakeBotAPI(BaseRequest):
+    """رد ناجح على كل طلب Bot API
+
+    latency: زمن الشبكة المحاكى لكل طلب بالثواني
+    flood_every: رد 429 على كل طلب رسالة رقم n (0 = أبداً)، مع retry_after ثانية
+    """
+
+    def __init__(self, latency=0.0, flood_every=0, retry_after=1):
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.floods = 0
+        self._message_ids = itertools.count(1000)
+        self._message_calls = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters, text_key='text'):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(parameters.get('chat_id', 1)), 'type': 'private'},
+            'from': BOT_USER
+        }
+        if text_key == 'caption':
+            message['photo'] = [{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}]
+            message['caption'] = parameters.get('caption') or ''
+        else:
+            message['text'] = parameters.get('text') or ''
+        return message
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        name = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        self.calls[name] += 1
+
+        if self.flood_every and name.startswith(('send', 'edit')):
+            if next(self._message_calls) % self.flood_every == 0:
+                self.floods += 1
+                return 429, json.dumps({
+                    'ok': False, 'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after}
+                }).encode()
+
+        if name == 'getMe':
+            result = BOT_USER
+        elif name in ('sendMessage', 'editMessageText'):
+            result = self._message(parameters)
+        elif name in ('sendPhoto', 'editMessageCaption'):
+            result = self._message(parameters, 'caption')
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+_update_ids = itertools.count(1)
+
+
+def user(user_id, first_name='طالب'):
+    return {'id': user_id, 'is_bot': False, 'first_name': first_name}
+
+
+def callback_update(user_id, data, message_id=1):
+    """ضغط زر من رسالة البوت message_id كما يرسله تيليجرام"""
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': 'bench', 'data': data,
+            'from': user(user_id),
+            'message': {
+                'message_id': message_id, 'date': 0, 'text': 'x',
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER
+            }
+        }
+    }
+
+
+def message_update(user_id, text):
+    """رسالة نصية من المستخدم (أوامر مثل /start تُرسل كما هي)"""
+    update_id = next(_update_ids)
+    message = {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': user(user_id)
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
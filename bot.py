@@ -1,12 +1,30 @@
 import os
+import sys
+import time
+import asyncio
 import logging
+from apscheduler.jobstores.base import JobLookupError
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
     CallbackQueryHandler, ContextTypes, filters
 )
-from config import BOT_TOKEN, QUESTION_TYPES
-from database import Database
+from config import (
+    BOT_TOKEN, QUESTION_TYPES, ANSWER_FEEDBACK_DELAY, ANSWER_FEEDBACK_MODE,
+    CONCURRENT_UPDATES, BOT_MODE, QUIZ_SIZE, QUIZ_MIX, MAX_IMPORT_SIZE, QUESTIONS_PAGE_SIZE,
+    SHARD_INDEX, SHARDS, RATE_LIMIT_GLOBAL, METRICS_PORT, WEBHOOK_LISTEN,
+    QUIZ_TIME_LIMIT, QUESTION_TIME_LIMIT, LIVE_EXAM_TIME_LIMIT, ALLOWED_UPDATES
+)
+from concurrency import PerUserUpdateProcessor, user_locks
+from models import Answer, Question, QuizSession
+import metrics
+import startup
+from question_render import check_answer, render_cache
+from rate_limiter import OutboundLimiter
+from database import AsyncDatabase, create_database
+from state_store import create_state_store
 import json
 
 # إعداد التسجيل
@@ -16,15 +34,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# تهيئة قاعدة البيانات
-db = Database()
+startup.mark('imports')
+
+# تهيئة قاعدة البيانات (الملفات تُقرأ عند أول استخدام أو في التحميل المسبق)
+db = AsyncDatabase(create_database())
 
-# حالة المستخدمين
-user_states = {}
+# حالة المستخدمين (تُعاد كتابة الحالة بعد كل تعديل حتى تُحفظ في المخازن الدائمة)
+user_states = create_state_store()
+quiz_sessions = create_state_store('quiz_sessions', QuizSession)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """بدء البوت وتحديد نوع المستخدم"""
     user = update.effective_user
+    
+    # رابط الانضمام لفصل معلم: t.me/<bot>?start=join_<teacher_id>
+    if context.args and context.args[0].startswith('join_'):
+        await handle_join_link(update, context, context.args[0][len('join_'):])
+        return
+    
     keyboard = [
         [InlineKeyboardButton("👨‍🏫 معلم", callback_data='role_teacher')],
         [InlineKeyboardButton("👨‍🎓 طالب", callback_data='role_student')]
@@ -37,6 +64,43 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
+async def handle_join_link(update: Update, context: ContextTypes.DEFAULT_TYPE, teacher_id):
+    """تسجيل الطالب في فصل المعلم صاحب رابط الانضمام"""
+    user = update.effective_user
+    
+    if not teacher_id.isdecimal() or int(teacher_id) == user.id or not await db.join_class(int(teacher_id), user.id):
+        await update.message.reply_text("❌ رابط الانضمام غير صالح.")
+        return
+    
+    # الانضمام لفصل يعني دور الطالب
+    await db.add_student(user.id, user.username, user.full_name)
+    keyboard = [
+        [InlineKeyboardButton("📝 بدء الاختبار", callback_data='start_quiz')],
+        [InlineKeyboardButton("📊 نتائجي", callback_data='my_results')]
+    ]
+    await update.message.reply_text(
+        "✅ انضممت إلى فصل معلمك!\n"
+        "ستصلك الاختبارات المباشرة التي يرسلها للفصل.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def class_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """رابط انضمام الطلاب إلى فصل المعلم وعددهم الحالي"""
+    query = update.callback_query
+    await query.answer()
+    
+    teacher_id = query.from_user.id
+    roster = await db.get_class_roster(teacher_id)
+    link = f"https://t.me/{context.bot.username}?start=join_{teacher_id}"
+    
+    keyboard = [[InlineKeyboardButton("رجوع", callback_data='teacher_menu')]]
+    await query.edit_message_text(
+        text=f"🔗 شارك هذا الرابط مع طلابك لينضموا إلى فصلك:\n{link}\n\n"
+             f"👥 عدد الطلاب في الفصل: {len(roster)}\n"
+             "الاختبار المباشر يُرسل لطلاب فصلك فقط.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
 async def handle_role_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة اختيار الدور"""
     query = update.callback_query
@@ -46,16 +110,19 @@ async def handle_role_selection(update: Update, context: ContextTypes.DEFAULT_TY
     role = query.data.split('_')[1]
     
     if role == 'teacher':
-        db.add_teacher(user_id, query.from_user.username, query.from_user.full_name)
+        await db.add_teacher(user_id, query.from_user.username, query.from_user.full_name)
         keyboard = [
             [InlineKeyboardButton("➕ إضافة سؤال", callback_data='add_question')],
+            [InlineKeyboardButton("📥 استيراد أسئلة من ملف", callback_data='import_questions')],
             [InlineKeyboardButton("📋 عرض الأسئلة", callback_data='view_questions')],
+            [InlineKeyboardButton("📡 اختبار مباشر للفصل", callback_data='live_start')],
+            [InlineKeyboardButton("🔗 رابط الانضمام للفصل", callback_data='class_link')],
             [InlineKeyboardButton("📊 إحصائيات", callback_data='teacher_stats')]
         ]
         text = "مرحباً أيها المعلم! 👨‍🏫\nماذا تريد أن تفعل؟"
     
     else:  # طالب
-        db.add_student(user_id, query.from_user.username, query.from_user.full_name)
+        await db.add_student(user_id, query.from_user.username, query.from_user.full_name)
         keyboard = [
             [InlineKeyboardButton("📝 بدء الاختبار", callback_data='start_quiz')],
             [InlineKeyboardButton("📊 نتائجي", callback_data='my_results')]
@@ -87,7 +154,7 @@ async def handle_question_type(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    question_type = query.data.split('_')[1]
+    question_type = query.data.split('_', 1)[1]
     user_id = query.from_user.id
     
     # حفظ حالة المستخدم
@@ -102,27 +169,72 @@ async def handle_question_type(update: Update, context: ContextTypes.DEFAULT_TYP
              "الآن أرسل السؤال كصورة أو كرسالة نصية:"
     )
 
+async def download_question_photo(context: ContextTypes.DEFAULT_TYPE, question_id, file_id):
+    """تحميل نسخة محلية احتياطية من صورة السؤال بعد تصغيرها ثم ربط مسارها بالسؤال
+    
+    تعمل في الخلفية بعد حفظ السؤال، فلا ينتظر المعلم التحميل والتصغير.
+    """
+    # Pillow ومجمع خيوطه لا يُحملان إلا عند أول صورة
+    from image_pipeline import store_question_photo
+    
+    try:
+        photo_file = await context.bot.get_file(file_id)
+        data = await photo_file.download_as_bytearray()
+        
+        # التصغير وإعادة الضغط وحساب البصمة خارج حلقة الأحداث
+        photo_path = await store_question_photo(bytes(data))
+    except (OSError, TelegramError) as e:
+        logger.warning(f"تعذر تحميل صورة السؤال {question_id}: {e}")
+        return
+    
+    await db.update_question(question_id, {'photo': photo_path})
+
+async def send_question_photo(context: ContextTypes.DEFAULT_TYPE, chat_id, question, caption, reply_markup):
+    """إرسال صورة السؤال بمعرف file_id المخزن، أو رفعها من الملف المحلي مرة واحدة فقط"""
+    file_id = question.get('photo_file_id')
+    if file_id:
+        try:
+            return await context.bot.send_photo(
+                chat_id=chat_id,
+                photo=file_id,
+                caption=caption,
+                reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            logger.warning(f"معرف الصورة غير صالح للسؤال {question.get('id')}: {e}")
+    
+    with open(question['photo'], 'rb') as photo:
+        message = await context.bot.send_photo(
+            chat_id=chat_id,
+            photo=photo,
+            caption=caption,
+            reply_markup=reply_markup
+        )
+    
+    # حفظ المعرف الناتج عن الرفع لاستخدامه في المرات القادمة
+    file_id = message.photo[-1].file_id
+    question['photo_file_id'] = file_id
+    if question.get('id'):
+        await db.update_question(question['id'], {'photo_file_id': file_id})
+    return message
+
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة الصور (للأسئلة)"""
     user_id = update.effective_user.id
     
-    if user_id in user_states and user_states[user_id]['action'] == 'adding_question':
-        # حفظ الصورة
-        photo_file = await update.message.photo[-1].get_file()
-        
-        # إنشاء مجلد للصور إذا لم يكن موجوداً
-        os.makedirs('questions', exist_ok=True)
-        
-        # حفظ الصورة
-        photo_path = f"questions/{user_id}_{update.message.message_id}.jpg"
-        await photo_file.download_to_drive(photo_path)
+    state = user_states.get(user_id)
+    
+    if state and state['action'] == 'adding_question':
+        # معرف الصورة على خوادم تيليجرام يكفي لإعادة إرسالها دون رفع،
+        # والنسخة المحلية الاحتياطية تُحمَّل في الخلفية بعد حفظ السؤال
+        photo = update.message.photo[-1]
         
-        # حفظ المسار في حالة المستخدم
-        user_states[user_id]['photo_path'] = photo_path
-        user_states[user_id]['step'] = 'waiting_for_answer'
+        # حفظ المعرف في حالة المستخدم
+        state['photo_file_id'] = photo.file_id
+        state['step'] = 'waiting_for_answer'
         
         # طلب الإجابة بناءً على نوع السؤال
-        question_type = user_states[user_id]['type']
+        question_type = state['type']
         
         if question_type == 'true_false':
             keyboard = [
@@ -147,21 +259,30 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "د) الخيار الرابع\n\n"
                 "ثم أرسل الحرف الصحيح (مثل: أ)"
             )
-            user_states[user_id]['step'] = 'waiting_for_options'
+            state['step'] = 'waiting_for_options'
+        
+        # إعادة الحفظ ضرورية للمخازن الدائمة
+        user_states[user_id] = state
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة الرسائل النصية"""
     user_id = update.effective_user.id
     text = update.message.text
     
-    if user_id in user_states:
-        state = user_states[user_id]
-        
+    # إجابة مكتوبة عن سؤال بلا أزرار في اختبار جارٍ
+    session = quiz_sessions.get(user_id)
+    if session is not None and session.waiting_for_text:
+        await handle_quiz_text_answer(update, context, session)
+        return
+    
+    state = user_states.get(user_id)
+    
+    if state:
         if state['action'] == 'adding_question':
             if state['step'] == 'waiting_for_question':
                 # حفظ السؤال النصي
-                user_states[user_id]['question_text'] = text
-                user_states[user_id]['step'] = 'waiting_for_answer'
+                state['question_text'] = text
+                state['step'] = 'waiting_for_answer'
                 
                 # طلب الإجابة بناءً على نوع السؤال
                 question_type = state['type']
@@ -189,32 +310,39 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         "د) الخيار الرابع\n\n"
                         "ثم أرسل الحرف الصحيح (مثل: أ)"
                     )
-                    user_states[user_id]['step'] = 'waiting_for_options'
+                    state['step'] = 'waiting_for_options'
+                
+                user_states[user_id] = state
             
-            elif state['step'] == 'waiting_for_options':
+            elif state['step'] in ('waiting_for_options', 'waiting_for_correct_option'):
                 # حفظ الخيارات
-                if 'options' not in user_states[user_id]:
-                    user_states[user_id]['options'] = text
-                    user_states[user_id]['step'] = 'waiting_for_correct_option'
+                if 'options' not in state:
+                    state['options'] = text
+                    state['step'] = 'waiting_for_correct_option'
+                    user_states[user_id] = state
                     await update.message.reply_text(
                         "تم حفظ الخيارات!\n"
                         "الآن أرسل الحرف الصحيح (مثل: أ):"
                     )
                 else:
                     # حفظ الإجابة الصحيحة
-                    user_states[user_id]['correct_answer'] = text.strip().lower()
+                    state['correct_answer'] = text.strip().lower()
                     
                     # حفظ السؤال في قاعدة البيانات
-                    question_data = {
-                        'type': state['type'],
-                        'question': state.get('question_text', ''),
-                        'photo': state.get('photo_path', ''),
-                        'options': state.get('options', ''),
-                        'correct_answer': state['correct_answer'],
-                        'teacher_name': update.effective_user.full_name
-                    }
+                    question = Question(
+                        type=state['type'],
+                        question=state.get('question_text', ''),
+                        photo_file_id=state.get('photo_file_id', ''),
+                        options=state.get('options', ''),
+                        correct_answer=state['correct_answer'],
+                        teacher_name=update.effective_user.full_name
+                    )
                     
-                    question_id = db.add_question(user_id, question_data)
+                    question_id = await db.add_question(user_id, question.to_dict())
+                    if question.photo_file_id:
+                        context.application.create_task(
+                            download_question_photo(context, question_id, question.photo_file_id)
+                        )
                     
                     # تنظيف حالة المستخدم
                     del user_states[user_id]
@@ -224,6 +352,82 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         f"رقم السؤال: {question_id}\n"
                         f"يمكنك العودة للقائمة الرئيسية بـ /start"
                     )
+        
+        elif state['action'] == 'searching_questions':
+            # كلمة البحث تبقى في الحالة للتنقل بين صفحات النتائج
+            search = text.strip()
+            user_states[user_id] = {'action': 'browsing_questions', 'search': search}
+            reply_text, reply_markup = await questions_page(user_id, 0, state.get('type'), search)
+            await update.message.reply_text(reply_text, reply_markup=reply_markup)
+
+async def import_questions_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """بدء استيراد الأسئلة من ملف"""
+    query = update.callback_query
+    await query.answer()
+    
+    user_states[query.from_user.id] = {'action': 'importing_questions'}
+    
+    keyboard = [[InlineKeyboardButton("رجوع", callback_data='teacher_menu')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await query.edit_message_text(
+        text="أرسل ملف CSV أو JSON أو JSONL بالأعمدة:\n"
+             "type, question, options, correct_answer\n\n"
+             "• type: true_false أو multiple_choice أو short_answer\n"
+             "• options: الخيارات مفصولة بـ | مثل: أ) 4|ب) 5\n"
+             "• correct_answer: صح/خطأ أو حرف الخيار الصحيح أو نص الإجابة القصيرة",
+        reply_markup=reply_markup
+    )
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """استيراد الأسئلة من الملف المرسل دفعة واحدة
+    
+    الملف يُنزل إلى ملف مؤقت لا إلى الذاكرة، و CSV و JSONL تُقرأ منه صفاً صفاً.
+    ملف JSON العادي مصفوفة واحدة فيُحلل كاملاً في الذاكرة، وحجمه محدود بـ MAX_IMPORT_SIZE.
+    """
+    user_id = update.effective_user.id
+    state = user_states.get(user_id)
+    
+    if not state or state['action'] != 'importing_questions':
+        return
+    
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_IMPORT_SIZE:
+        await update.message.reply_text(f"⚠️ الملف أكبر من الحد المسموح ({MAX_IMPORT_SIZE // 1024} كيلوبايت).")
+        return
+    
+    import csv
+    import tempfile
+    from question_import import parse_questions_file
+    
+    fd, path = tempfile.mkstemp(prefix='import-')
+    os.close(fd)
+    try:
+        await (await document.get_file()).download_to_drive(path)
+        # التحليل والتحقق خارج حلقة الأحداث
+        questions, errors = await asyncio.to_thread(
+            parse_questions_file, path, document.file_name or '', update.effective_user.full_name
+        )
+    except (ValueError, csv.Error) as e:
+        await update.message.reply_text(f"❌ تعذرت قراءة الملف: {e}")
+        return
+    finally:
+        os.remove(path)
+    
+    # كل الصفوف الصالحة في عملية كتابة واحدة
+    question_ids = await db.add_questions(user_id, questions) if questions else []
+    del user_states[user_id]
+    
+    text = f"✅ تم استيراد {len(question_ids)} سؤال.\n"
+    if errors:
+        text += f"⚠️ {len(errors)} صف لم يُستورد:\n"
+        for row_number, error in errors[:20]:
+            text += f"   الصف {row_number}: {error}\n"
+        if len(errors) > 20:
+            text += f"   ... و{len(errors) - 20} أخطاء أخرى\n"
+    
+    keyboard = [[InlineKeyboardButton("🏠 قائمة المعلم", callback_data='teacher_menu')]]
+    await update.message.reply_text(text[:4000], reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة اختيار الإجابة (صح/خطأ)"""
@@ -232,24 +436,27 @@ async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_
     
     user_id = query.from_user.id
     
-    if user_id in user_states:
-        state = user_states[user_id]
-        
+    state = user_states.get(user_id)
+    
+    if state:
         if state['action'] == 'adding_question' and state['step'] == 'waiting_for_answer':
             # حفظ الإجابة
             correct_answer = 'صح' if query.data == 'answer_true' else 'خطأ'
-            user_states[user_id]['correct_answer'] = correct_answer
             
             # حفظ السؤال في قاعدة البيانات
-            question_data = {
-                'type': state['type'],
-                'question': state.get('question_text', ''),
-                'photo': state.get('photo_path', ''),
-                'correct_answer': correct_answer,
-                'teacher_name': query.from_user.full_name
-            }
+            question = Question(
+                type=state['type'],
+                question=state.get('question_text', ''),
+                photo_file_id=state.get('photo_file_id', ''),
+                correct_answer=correct_answer,
+                teacher_name=query.from_user.full_name
+            )
             
-            question_id = db.add_question(user_id, question_data)
+            question_id = await db.add_question(user_id, question.to_dict())
+            if question.photo_file_id:
+                context.application.create_task(
+                    download_question_photo(context, question_id, question.photo_file_id)
+                )
             
             # تنظيف حالة المستخدم
             del user_states[user_id]
@@ -265,108 +472,182 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    # جلب جميع الأسئلة
-    all_questions = list(db.get_all_questions().values())
+    # سحب أسئلة عشوائية من فهرس الأسئلة (أو سحب طبقي حسب QUIZ_MIX)
+    quiz_questions = await db.sample_questions(QUIZ_SIZE, mix=QUIZ_MIX)
     
-    if not all_questions:
+    if not quiz_questions:
         await query.edit_message_text("⚠️ لا توجد أسئلة متاحة حالياً.")
         return
     
-    # اختيار 5 أسئلة عشوائية
-    import random
-    quiz_questions = random.sample(all_questions, min(5, len(all_questions)))
-    
-    # حفظ الاختبار في حالة المستخدم
+    # الجلسة تحفظ معرفات الأسئلة فقط، والأسئلة نفسها تبقى في مخزن الأسئلة المشترك
     user_id = query.from_user.id
-    user_states[user_id] = {
-        'action': 'taking_quiz',
-        'questions': quiz_questions,
-        'current_question': 0,
-        'answers': [],
-        'score': 0
-    }
+    started_at = time.time()
+    user_states.pop(user_id, None)
+    quiz_sessions[user_id] = QuizSession(
+        question_ids=tuple(q['id'] for q in quiz_questions),
+        started_at=started_at,
+        deadline=started_at + QUIZ_TIME_LIMIT if QUIZ_TIME_LIMIT else None,
+        chat_id=query.message.chat_id
+    )
     
     # عرض السؤال الأول
-    await show_next_question(update, context)
+    await show_next_question(context, user_id, query.message.chat_id, query.message)
 
-async def show_next_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """عرض السؤال التالي"""
-    query = update.callback_query
-    user_id = query.from_user.id if query else update.effective_user.id
+async def edit_or_send(context: ContextTypes.DEFAULT_TYPE, chat_id, message, text, reply_markup=None):
+    """تعديل رسالة البوت الحالية إلى النص الجديد، أو إرسال رسالة جديدة إن تعذر التعديل"""
+    if message is not None:
+        try:
+            if not message.photo:
+                return await message.edit_text(text=text, reply_markup=reply_markup)
+            # رسالة الصورة لا تتحول إلى نص، فتُحذف ويُرسل بدلها
+            await message.delete()
+        except BadRequest as e:
+            logger.warning(f"تعذر تعديل الرسالة: {e}")
+    
+    return await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+
+async def show_next_question(context: ContextTypes.DEFAULT_TYPE, user_id, chat_id, message=None, prefix=''):
+    """عرض السؤال التالي
     
-    if user_id not in user_states or user_states[user_id]['action'] != 'taking_quiz':
-        return
+    message هي رسالة البوت الحالية التي تُستبدل بالسؤال، و prefix نص يسبق السؤال
+    (مثل نتيجة الإجابة السابقة في الوضع المدمج).
+    """
+    session = quiz_sessions.get(user_id)
     
-    state = user_states[user_id]
-    current_idx = state['current_question']
+    if session is None:
+        return
     
-    if current_idx >= len(state['questions']):
+    if session.current >= session.total:
         # انتهاء الاختبار
-        await finish_quiz(update, context, user_id)
+        await finish_quiz(context, user_id, chat_id, message, prefix)
         return
     
-    question = state['questions'][current_idx]
-    
-    # بناء نص السؤال
-    text = f"السؤال {current_idx + 1} من {len(state['questions'])}\n\n"
+    question = await db.get_question(session.current_question_id)
+    
+    # بطاقة السؤال (النص والأزرار) تُبنى مرة واحدة وتُحفظ في الذاكرة
+    card = render_cache.get(question)
+    header = f"السؤال {session.current + 1} من {session.total}"
+    reply_markup = card.reply_markup
+    
+    session.waiting_for_text = card.expects_text
+    
+    # بداية حساب زمن الإجابة لتحليلات المعلم
+    now = time.time()
+    session.question_shown_at = now
+    session.question_deadline = now + QUESTION_TIME_LIMIT if QUESTION_TIME_LIMIT else None
+    quiz_sessions[user_id] = session
+    
+    deadline = session.nearest_deadline()
+    if deadline is not None:
+        header += f" - ⏱ {int(deadline - now)} ثانية"
+    text = prefix + header + "\n\n" + card.body
+    
+    sent = None
+    if question.get('photo_file_id') or question.get('photo'):
+        # إذا كان هناك صورة، أرسلها ثم احذف الرسالة السابقة
+        try:
+            sent = await send_question_photo(context, chat_id, question, text, reply_markup)
+            if message is not None:
+                await message.delete()
+        except (OSError, TelegramError) as e:
+            logger.warning(f"تعذر إرسال صورة السؤال {question.get('id')}: {e}")
+    
+    if sent is None:
+        sent = await edit_or_send(context, chat_id, message, text, reply_markup)
+    schedule_quiz_timer(context.job_queue, user_id, chat_id, session, sent)
+
+async def show_next_question_job(context: ContextTypes.DEFAULT_TYPE):
+    """مهمة مجدولة تعرض السؤال التالي بعد انتهاء مهلة عرض النتيجة"""
+    data = context.job.data
+    async with user_locks.hold(data['user_id']):
+        await show_next_question(context, data['user_id'], data['chat_id'], data['message'])
+
+# مؤقت واحد لكل اختبار جارٍ على JobQueue (كومة APScheduler مرتبة بموعد التنفيذ)،
+# فلا يُفحص أي اختبار دورياً مهما كثرت الاختبارات المتزامنة
+quiz_timers = {}
+
+def schedule_quiz_timer(job_queue, user_id, chat_id, session, message=None):
+    """استبدال مؤقت الطالب بمؤقت لأقرب مهلة في اختباره
     
-    if question['question']:
-        text += f"{question['question']}\n\n"
+    message رسالة السؤال التي تُستبدل عند انتهاء المهلة، وبدونها يُرسل السؤال
+    التالي أو النتيجة كرسالة جديدة.
+    """
+    cancel_quiz_timer(user_id)
+    deadline = session.nearest_deadline()
+    if deadline is None:
+        return
+    quiz_timers[user_id] = job_queue.run_once(
+        quiz_timer_job,
+        max(0, deadline - time.time()),
+        data={'user_id': user_id, 'chat_id': chat_id, 'message': message, 'started_at': session.started_at},
+        name=f"quiz_timer_{user_id}"
+    )
+
+def restore_quiz_timers(job_queue):
+    """جدولة مؤقتات الاختبارات المستعادة من مخزن الحالة بعد إعادة التشغيل
     
-    # بناء الخيارات حسب نوع السؤال
-    if question['type'] == 'true_false':
-        keyboard = [
-            [InlineKeyboardButton("صح", callback_data='ans_true'),
-             InlineKeyboardButton("خطأ", callback_data='ans_false')]
-        ]
-        text += "اختر الإجابة الصحيحة:"
-    
-    elif question['type'] == 'multiple_choice' and question.get('options'):
-        options = question['options'].split('\n')
-        keyboard = []
-        for option in options[:4]:  # الحد الأقصى 4 خيارات
-            if option.strip():
-                option_letter = option.split(')')[0] if ')' in option else option[0]
-                keyboard.append([InlineKeyboardButton(option.strip(), callback_data=f'ans_{option_letter}')])
-        
-        text += "اختر الإجابة الصحيحة:"
+    المؤقتات تعيش في JobQueue فقط فتعود الجلسة المحفوظة بلا مؤقت. المهلة التي
+    انتهت أثناء التوقف يطبقها المؤقت فور التشغيل، ورسالة السؤال القديمة غير
+    معروفة فيُرسل ما بعدها كرسالة جديدة.
+    """
+    for user_id in quiz_sessions:
+        session = quiz_sessions.get(user_id)
+        if session is not None:
+            # الجلسات المحفوظة قبل حقل chat_id كانت في المحادثة الخاصة بالطالب
+            schedule_quiz_timer(job_queue, user_id, session.chat_id or user_id, session)
+    return len(quiz_timers)
+
+def cancel_quiz_timer(user_id):
+    job = quiz_timers.pop(user_id, None)
+    if job is not None:
+        try:
+            job.schedule_removal()
+        except JobLookupError:
+            # المؤقت انطلق للتو وينتظر قفل المستخدم، وسيجد أن مهلته لم تعد قائمة
+            pass
+
+async def quiz_timer_job(context: ContextTypes.DEFAULT_TYPE):
+    """مهمة مجدولة عند أقرب مهلة لاختبار الطالب"""
+    data = context.job.data
+    user_id = data['user_id']
+    if quiz_timers.get(user_id) is context.job:
+        del quiz_timers[user_id]
+    
+    async with user_locks.hold(user_id):
+        session = quiz_sessions.get(user_id)
+        # الاختبار انتهى أو بدأ الطالب اختباراً جديداً
+        if session is None or session.started_at != data['started_at']:
+            return
+        if not await apply_quiz_deadline(context, user_id, data['chat_id'], session, data['message']):
+            # المهلة التي جُدول لها المؤقت أُلغيت (أجاب الطالب)، فيُجدول للمهلة التالية
+            schedule_quiz_timer(context.job_queue, user_id, data['chat_id'], session, data['message'])
+
+async def apply_quiz_deadline(context: ContextTypes.DEFAULT_TYPE, user_id, chat_id, session, message=None):
+    """تطبيق المهلة المنتهية إن وجدت، ويعيد False إذا لم تنته أي مهلة بعد
     
+    انتهاء مهلة السؤال يحتسبه خطأ وينتقل للتالي، وانتهاء مدة الاختبار يسلّمه
+    عبر finish_quiz (الأسئلة التي لم يُجب عنها تُحتسب خطأ).
+    """
+    now = time.time()
+    quiz_expired = bool(session.deadline) and now >= session.deadline
+    question_expired = bool(session.question_deadline) and now >= session.question_deadline
+    if not (quiz_expired or question_expired):
+        return False
+    
+    if session.question_deadline:
+        # السؤال المعروض حالياً يُسجل بلا إجابة
+        question = await db.get_question(session.current_question_id)
+        session.answers.append(Answer.for_question(question, None, False, session.question_shown_at, now))
+        session.current += 1
+        session.question_deadline = None
+        session.waiting_for_text = False
+    quiz_sessions[user_id] = session
+    
+    if quiz_expired:
+        await finish_quiz(context, user_id, chat_id, message, prefix="⏰ انتهى وقت الاختبار!\n\n")
     else:
-        text += "أرسل إجابتك:"
-        user_states[user_id]['waiting_for_text'] = True
-    
-    reply_markup = InlineKeyboardMarkup(keyboard) if 'keyboard' in locals() else None
-    
-    if query:
-        if question.get('photo'):
-            # إذا كان هناك صورة، أرسلها أولاً
-            try:
-                with open(question['photo'], 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=query.message.chat_id,
-                        photo=photo,
-                        caption=text,
-                        reply_markup=reply_markup
-                    )
-                await query.delete_message()
-            except:
-                await query.edit_message_text(text=text, reply_markup=reply_markup)
-        else:
-            await query.edit_message_text(text=text, reply_markup=reply_markup)
-    else:
-        if question.get('photo'):
-            try:
-                with open(question['photo'], 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.effective_chat.id,
-                        photo=photo,
-                        caption=text,
-                        reply_markup=reply_markup
-                    )
-            except:
-                await update.message.reply_text(text=text, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(text=text, reply_markup=reply_markup)
+        await show_next_question(context, user_id, chat_id, message, prefix="⏰ انتهى وقت السؤال!\n\n")
+    return True
 
 async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة إجابة الطالب"""
@@ -374,74 +655,93 @@ async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = query.from_user.id
+    session = quiz_sessions.get(user_id)
     
-    if user_id not in user_states or user_states[user_id]['action'] != 'taking_quiz':
+    if session is None:
         return
     
-    state = user_states[user_id]
-    current_idx = state['current_question']
-    question = state['questions'][current_idx]
+    # الإجابة بعد انتهاء المهلة لا تُقبل حتى لو سبقت المؤقت
+    if await apply_quiz_deadline(context, user_id, query.message.chat_id, session, query.message):
+        return
+    
+    # السؤال الحالي يُجاب بنص مكتوب، فالزر من رسالة سؤال سابق
+    if session.waiting_for_text:
+        return
+    
+    question = await db.get_question(session.current_question_id)
     
     # استخراج الإجابة
     if query.data.startswith('ans_'):
         user_answer = query.data[4:]  # إزالة 'ans_'
     
-    # التحقق من الإجابة
-    correct_answer = question.get('correct_answer', '').lower()
-    is_correct = False
+    await record_quiz_answer(context, user_id, query.message.chat_id, session, question, user_answer, query.message)
+
+async def handle_quiz_text_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    """معالجة إجابة الطالب المكتوبة عن سؤال إجابة قصيرة"""
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
     
-    if question['type'] == 'true_false':
-        correct_map = {'صح': 'true', 'خطأ': 'false'}
-        user_map = {'صح': 'true', 'خطأ': 'false'}
-        is_correct = user_map.get(user_answer, '') == correct_map.get(correct_answer, '')
-    elif question['type'] == 'multiple_choice':
-        is_correct = user_answer.lower() == correct_answer.lower()
+    # رسالة الطالب جاءت بعد رسالة السؤال، فالنتيجة والسؤال التالي يُرسلان كرسالة جديدة
+    if await apply_quiz_deadline(context, user_id, chat_id, session):
+        return
     
-    # حفظ النتيجة
-    state['answers'].append({
-        'question_id': question.get('id'),
-        'user_answer': user_answer,
-        'correct_answer': correct_answer,
-        'is_correct': is_correct
-    })
+    question = await db.get_question(session.current_question_id)
+    await record_quiz_answer(context, user_id, chat_id, session, question, update.message.text)
+
+async def record_quiz_answer(context: ContextTypes.DEFAULT_TYPE, user_id, chat_id, session, question, user_answer, message=None):
+    """تسجيل إجابة السؤال الحالي وإعلام الطالب ثم الانتقال للسؤال التالي"""
+    # التحقق من الإجابة وحفظ النتيجة
+    is_correct = check_answer(question, user_answer)
+    session.answers.append(Answer.for_question(question, user_answer, is_correct, session.question_shown_at, time.time()))
     
     if is_correct:
-        state['score'] += 1
+        session.score += 1
     
-    # الانتقال للسؤال التالي
-    state['current_question'] += 1
+    # الانتقال للسؤال التالي (مهلة السؤال تبدأ من جديد عند عرضه)
+    session.current += 1
+    session.question_deadline = None
+    session.waiting_for_text = False
+    quiz_sessions[user_id] = session
     
     # إعلام المستخدم بالإجابة
     feedback = "✅ إجابة صحيحة!" if is_correct else "❌ إجابة خاطئة!"
-    await query.edit_message_text(feedback + "\n\nجاري تحميل السؤال التالي...")
     
-    # عرض السؤال التالي بعد ثانية
-    import asyncio
-    await asyncio.sleep(1)
-    await show_next_question(update, context)
+    if ANSWER_FEEDBACK_MODE == 'combined':
+        # النتيجة والسؤال التالي في رسالة واحدة
+        await show_next_question(context, user_id, chat_id, message, prefix=feedback + "\n\n")
+        return
+    
+    message = await edit_or_send(context, chat_id, message, feedback + "\n\nجاري تحميل السؤال التالي...")
+    
+    # جدولة السؤال التالي بدلاً من الانتظار داخل المعالج
+    if ANSWER_FEEDBACK_DELAY > 0:
+        context.job_queue.run_once(
+            show_next_question_job,
+            ANSWER_FEEDBACK_DELAY,
+            data={'user_id': user_id, 'chat_id': chat_id, 'message': message},
+            name=f"next_question_{user_id}"
+        )
+    else:
+        await show_next_question(context, user_id, chat_id, message)
 
-async def finish_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+async def finish_quiz(context: ContextTypes.DEFAULT_TYPE, user_id, chat_id, message=None, prefix=''):
     """إنهاء الاختبار وعرض النتائج"""
-    state = user_states[user_id]
+    session = quiz_sessions[user_id]
+    score, total = session.score, session.total
     
     # حفظ النتيجة
-    db.save_result(
-        user_id,
-        state['answers'],
-        state['score'],
-        len(state['questions'])
-    )
+    await db.save_result(user_id, [answer.to_dict() for answer in session.answers], score, total)
     
     # بناء رسالة النتيجة
-    text = f"🏁 انتهى الاختبار!\n\n"
-    text += f"🎯 النتيجة: {state['score']}/{len(state['questions'])}\n"
-    text += f"📊 النسبة: {state['score']/len(state['questions'])*100:.1f}%\n\n"
+    text = prefix + f"🏁 انتهى الاختبار!\n\n"
+    text += f"🎯 النتيجة: {score}/{total}\n"
+    text += f"📊 النسبة: {score/total*100:.1f}%\n\n"
     
-    if state['score'] == len(state['questions']):
+    if score == total:
         text += "🎉 ممتاز! إجابات صحيحة كلها!\n"
-    elif state['score'] >= len(state['questions']) * 0.7:
+    elif score >= total * 0.7:
         text += "👍 جيد جداً!\n"
-    elif state['score'] >= len(state['questions']) * 0.5:
+    elif score >= total * 0.5:
         text += "😊 ليس سيئاً!\n"
     else:
         text += "📚 تحتاج للمزيد من المذاكرة!\n"
@@ -453,71 +753,266 @@ async def finish_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE, user_i
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    # تنظيف حالة المستخدم
-    del user_states[user_id]
+    # تنظيف جلسة الاختبار ومؤقتها
+    del quiz_sessions[user_id]
+    cancel_quiz_timer(user_id)
     
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
-    else:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=text,
-            reply_markup=reply_markup
-        )
+    await edit_or_send(context, chat_id, message, text, reply_markup)
 
-async def view_questions(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """عرض الأسئلة للمعلم"""
+# الاختبارات المباشرة الجارية حسب معرف المعلم (اختبار واحد لكل معلم في نفس الوقت)
+live_exams = {}
+
+LIVE_EXAM_KEYBOARD = InlineKeyboardMarkup([[InlineKeyboardButton("⏹ إنهاء الاختبار", callback_data='live_end')]])
+
+async def live_exam_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """إرسال اختبار واحد لكل طلاب الفصل في نفس اللحظة ومتابعة تقدمهم"""
+    from live_exam import LiveExam, ThrottledMessage, deliver
+    
     query = update.callback_query
     await query.answer()
     
-    user_id = query.from_user.id
-    questions = db.get_questions_by_teacher(user_id)
+    teacher_id = query.from_user.id
+    exam = live_exams.get(teacher_id)
+    if exam is not None:
+        await query.edit_message_text(exam.progress_text(), reply_markup=LIVE_EXAM_KEYBOARD)
+        return
+    
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("رجوع", callback_data='teacher_menu')]])
     
+    # أسئلة الأزرار فقط: الاختبار المباشر لا يستقبل إجابات نصية ولا يرسل صوراً
+    candidates = await db.sample_questions(QUIZ_SIZE * 4, teacher_id=teacher_id)
+    questions = [
+        q for q in candidates
+        if render_cache.get(q).options and not q.get('photo') and not q.get('photo_file_id')
+    ][:QUIZ_SIZE]
     if not questions:
-        await query.edit_message_text("📭 لم تقم بإضافة أي أسئلة بعد.")
+        await query.edit_message_text("⚠️ لا توجد لديك أسئلة صح/خطأ أو اختيار من متعدد.", reply_markup=keyboard)
+        return
+    
+    # طلاب فصل المعلم فقط (من انضموا عبر رابطه)، لا كل طلاب البوت
+    roster = await db.get_class_roster(teacher_id)
+    if not roster:
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔗 رابط الانضمام للفصل", callback_data='class_link')],
+            [InlineKeyboardButton("رجوع", callback_data='teacher_menu')]
+        ])
+        await query.edit_message_text(
+            "⚠️ لا يوجد طلاب في فصلك بعد. شارك رابط الانضمام مع طلابك أولاً.", reply_markup=keyboard
+        )
         return
     
-    text = f"📚 لديك {len(questions)} سؤال:\n\n"
+    exam = live_exams[teacher_id] = LiveExam(teacher_id, questions, roster)
+    exam.message = await query.edit_message_text(exam.progress_text(), reply_markup=LIVE_EXAM_KEYBOARD)
     
-    for i, q in enumerate(questions[:10], 1):  # عرض أول 10 أسئلة فقط
-        text += f"{i}. {q.get('question', 'سؤال بصورة')[:30]}...\n"
-        text += f"   النوع: {QUESTION_TYPES.get(q['type'], q['type'])}\n"
-        text += f"   الإجابة: {q.get('correct_answer', 'غير محددة')}\n\n"
+    async def publish():
+        await exam.message.edit_text(exam.progress_text(), reply_markup=LIVE_EXAM_KEYBOARD)
     
-    keyboard = [[InlineKeyboardButton("رجوع", callback_data='teacher_menu')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # رسالة المعلم تُحدث كل LIVE_PROGRESS_INTERVAL ثانية على الأكثر مهما كثرت الإجابات
+    exam.progress = ThrottledMessage(publish)
+    # الإرسال للفصل يستمر في الخلفية حتى لا يحجز قفل المعلم طوال مدته
+    exam.delivery = context.application.create_task(deliver(context.bot, exam, exam.progress.touch))
+    exam.timer = context.job_queue.run_once(
+        live_exam_timeout_job, LIVE_EXAM_TIME_LIMIT, data=teacher_id, name=f"live_exam_{teacher_id}"
+    )
+
+async def live_exam_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """إنهاء المعلم للاختبار المباشر"""
+    query = update.callback_query
+    await query.answer()
+    
+    if query.from_user.id not in live_exams:
+        await query.edit_message_text(
+            "⏹ لا يوجد اختبار مباشر جارٍ.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 قائمة المعلم", callback_data='teacher_menu')]])
+        )
+        return
+    await end_live_exam(context, query.from_user.id)
+
+async def live_exam_timeout_job(context: ContextTypes.DEFAULT_TYPE):
+    """مهمة مجدولة تنهي الاختبار المباشر بعد LIVE_EXAM_TIME_LIMIT ثانية"""
+    await end_live_exam(context, context.job.data)
+
+async def end_live_exam(context: ContextTypes.DEFAULT_TYPE, teacher_id):
+    """حفظ نتائج المشاركين وإرسالها لهم وعرض الملخص للمعلم"""
+    from live_exam import announce_results
+    
+    exam = live_exams.pop(teacher_id, None)
+    if exam is None:
+        return
+    
+    if context.job is not exam.timer:
+        exam.timer.schedule_removal()
+    exam.delivery.cancel()
+    await exam.progress.close()
+    
+    await asyncio.gather(*(
+        db.save_result(
+            student_id, [answer.to_dict() for answer in participant.answers], participant.score, len(exam.questions)
+        )
+        for student_id, participant in exam.participants.items()
+        if participant.answers
+    ))
+    
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🏠 قائمة المعلم", callback_data='teacher_menu')]])
+    try:
+        await exam.message.edit_text(exam.summary_text(), reply_markup=keyboard)
+    except TelegramError as e:
+        logger.warning(f"تعذر إرسال ملخص الاختبار المباشر للمعلم {teacher_id}: {e}")
+    
+    await announce_results(context.bot, exam)
+
+async def handle_live_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """إجابة طالب في الاختبار المباشر: live:<teacher_id>:<index>:<answer>"""
+    query = update.callback_query
+    _, teacher_id, index, answer = query.data.split(':', 3)
+    
+    exam = live_exams.get(int(teacher_id))
+    if exam is None:
+        await query.answer("⏹ انتهى هذا الاختبار")
+        return
+    
+    await query.answer()
+    participant = exam.record(query.from_user.id, int(index), answer)
+    if participant is None:
+        # ضغطة مكررة أو زر سؤال سابق
+        return
+    exam.progress.touch()
     
+    if participant.current < len(exam.questions):
+        text, reply_markup = exam.question_view(participant.current)
+    else:
+        text, reply_markup = "✅ تم تسليم إجاباتك، ستصلك النتيجة عند انتهاء الاختبار.", None
+    await query.edit_message_text(text, reply_markup=reply_markup)
+    
+    if exam.complete:
+        # الإنهاء يرسل لكل الطلاب، فلا يُنتظر داخل معالج هذا الطالب
+        context.application.create_task(end_live_exam(context, exam.teacher_id))
+
+async def questions_page(user_id, offset=0, question_type=None, search=None):
+    """نص صفحة من أسئلة المعلم وأزرارها (السابق/التالي، التصفية حسب النوع، البحث)"""
+    questions, total = await db.get_questions_page(
+        user_id, offset, QUESTIONS_PAGE_SIZE, question_type, search
+    )
+    type_key = question_type or 'all'
+    
+    if not total:
+        text = "🔍 لا توجد أسئلة مطابقة." if question_type or search else "📭 لم تقم بإضافة أي أسئلة بعد."
+        shown = 0
+    else:
+        text = f"📚 لديك {total} سؤال"
+        if question_type:
+            text += f" من نوع {QUESTION_TYPES.get(question_type, question_type)}"
+        if search:
+            text += f" تحتوي على «{search[:50]}»"
+        text += f" (من {offset + 1}):\n\n"
+        
+        shown = 0
+        for i, q in enumerate(questions, offset + 1):
+            entry = (
+                f"{i}. {(q.get('question') or 'سؤال بصورة')[:30]}...\n"
+                f"   النوع: {QUESTION_TYPES.get(q['type'], q['type'])}\n"
+                f"   الإجابة: {str(q.get('correct_answer', 'غير محددة'))[:50]}\n\n"
+            )
+            # الرسالة لا تتجاوز حد تيليجرام؛ ما لا يتسع ينتقل إلى الصفحة التالية
+            if len(text) + len(entry) > MessageLimit.MAX_TEXT_LENGTH:
+                break
+            text += entry
+            shown += 1
+    
+    keyboard = []
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ السابق", callback_data=f'vq:{max(0, offset - QUESTIONS_PAGE_SIZE)}:{type_key}'
+        ))
+    if offset + shown < total:
+        navigation.append(InlineKeyboardButton("التالي ➡️", callback_data=f'vq:{offset + shown}:{type_key}'))
+    if navigation:
+        keyboard.append(navigation)
+    
+    keyboard.append([
+        InlineKeyboardButton(("• " if key == type_key else "") + name, callback_data=f'vq:0:{key}')
+        for key, name in [('all', 'الكل'), *QUESTION_TYPES.items()]
+    ])
+    keyboard.append([InlineKeyboardButton("🔍 بحث", callback_data=f'vq_search:{type_key}')])
+    if search:
+        keyboard[-1].append(InlineKeyboardButton("✖️ إلغاء البحث", callback_data='view_questions'))
+    keyboard.append([InlineKeyboardButton("رجوع", callback_data='teacher_menu')])
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def view_questions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """عرض أسئلة المعلم صفحة صفحة
+    
+    view_questions تفتح الصفحة الأولى دون تصفية، و vq:<الموضع>:<النوع> تنتقل بين
+    الصفحات. كلمة البحث تُحفظ في حالة المستخدم لأنها قد تتجاوز حد بيانات الزر.
+    """
+    query = update.callback_query
+    await query.answer()
+    
+    user_id = query.from_user.id
+    state = user_states.get(user_id)
+    browsing = state is not None and state['action'] in ('browsing_questions', 'searching_questions')
+    
+    if query.data == 'view_questions':
+        offset, question_type = 0, None
+        if browsing:
+            del user_states[user_id]
+        search = None
+    else:
+        _, offset, type_key = query.data.split(':')
+        offset = int(offset)
+        question_type = None if type_key == 'all' else type_key
+        search = state.get('search') if browsing else None
+    
+    text, reply_markup = await questions_page(user_id, offset, question_type, search)
     await query.edit_message_text(text=text, reply_markup=reply_markup)
 
+async def search_questions_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """طلب كلمة البحث في أسئلة المعلم"""
+    query = update.callback_query
+    await query.answer()
+    
+    type_key = query.data.split(':')[1]
+    user_states[query.from_user.id] = {
+        'action': 'searching_questions',
+        'type': None if type_key == 'all' else type_key
+    }
+    
+    keyboard = [[InlineKeyboardButton("رجوع", callback_data='view_questions')]]
+    await query.edit_message_text(
+        text="🔍 أرسل كلمة أو جزءاً من نص السؤال:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
 async def my_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """عرض نتائج الطالب"""
     query = update.callback_query
     await query.answer()
     
     user_id = query.from_user.id
-    results = db.get_student_results(user_id)
+    # الملخص التراكمي يُحدَّث مع كل نتيجة، فلا حاجة لقراءة سجل النتائج
+    summary = await db.get_student_summary(user_id)
     
-    if not results:
+    if not summary or not summary.get('quizzes_taken'):
         await query.edit_message_text("📭 لم تأخذ أي اختبارات بعد.")
         return
     
-    text = f"📊 نتائجك ({len(results)} اختبار):\n\n"
-    
-    total_score = 0
-    total_possible = 0
+    text = f"📊 نتائجك ({summary['quizzes_taken']} اختبار):\n\n"
     
-    for i, r in enumerate(results[:10], 1):  # عرض أول 10 نتائج
+    for i, r in enumerate(summary.get('recent', []), 1):  # آخر النتائج، الأحدث أولاً
         date = r['date'].split('T')[0]
         text += f"{i}. تاريخ: {date}\n"
         text += f"   النتيجة: {r['score']}/{r['total']}\n"
         text += f"   النسبة: {r['percentage']:.1f}%\n\n"
-        
-        total_score += r['score']
-        total_possible += r['total']
     
-    if total_possible > 0:
-        avg_percentage = total_score / total_possible * 100
-        text += f"📈 المعدل العام: {avg_percentage:.1f}%"
+    if summary.get('total_possible'):
+        avg_percentage = summary['total_score'] / summary['total_possible'] * 100
+        text += f"📈 المعدل العام: {avg_percentage:.1f}%\n"
+        text += f"🏆 أفضل نسبة: {summary.get('best_percentage', 0):.1f}%\n"
+    
+    for q_type, (correct, total) in summary.get('type_stats', {}).items():
+        text += f"   {QUESTION_TYPES.get(q_type, q_type)}: {correct}/{total} ({correct / total * 100:.0f}%)\n"
     
     keyboard = [[InlineKeyboardButton("رجوع", callback_data='student_menu')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -531,7 +1026,10 @@ async def teacher_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     keyboard = [
         [InlineKeyboardButton("➕ إضافة سؤال", callback_data='add_question')],
+        [InlineKeyboardButton("📥 استيراد أسئلة من ملف", callback_data='import_questions')],
         [InlineKeyboardButton("📋 عرض الأسئلة", callback_data='view_questions')],
+        [InlineKeyboardButton("📡 اختبار مباشر للفصل", callback_data='live_start')],
+        [InlineKeyboardButton("🔗 رابط الانضمام للفصل", callback_data='class_link')],
         [InlineKeyboardButton("📊 إحصائيات", callback_data='teacher_stats')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -563,20 +1061,31 @@ async def teacher_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    questions = db.get_questions_by_teacher(user_id)
+    # العدادات محسوبة مسبقاً مع كل نتيجة، فلا حاجة لقراءة سجل النتائج
+    stats = await db.get_teacher_stats(user_id)
     
     text = f"📊 إحصائياتك:\n\n"
-    text += f"📚 عدد الأسئلة: {len(questions)}\n"
+    text += f"📚 عدد الأسئلة: {stats['questions']}\n"
     
-    # عد الأسئلة حسب النوع
-    type_count = {}
-    for q in questions:
-        q_type = q['type']
-        type_count[q_type] = type_count.get(q_type, 0) + 1
-    
-    for t, count in type_count.items():
+    for t, count in stats['type_counts'].items():
         text += f"   {QUESTION_TYPES.get(t, t)}: {count}\n"
     
+    if stats['attempts']:
+        text += f"\n✍️ عدد الإجابات: {stats['attempts']}\n"
+        text += f"✅ نسبة الإجابات الصحيحة: {stats['percent_correct']:.1f}%\n"
+        
+        # الأسئلة الأصعب أولاً
+        text += "\n🔍 الأسئلة الأصعب:\n"
+        hardest = sorted(stats['items'], key=lambda item: item['percent_correct'])[:5]
+        for i, item in enumerate(hardest, 1):
+            text += f"{i}. {(item['question'] or 'سؤال بصورة')[:30]}\n"
+            text += f"   الصحيح: {item['percent_correct']:.0f}% من {item['attempts']} محاولة\n"
+            if item['avg_time'] is not None:
+                text += f"   متوسط الزمن: {item['avg_time']:.1f} ث\n"
+            if item['top_wrong']:
+                wrong = '، '.join(f"{answer} ({count})" for answer, count in item['top_wrong'])
+                text += f"   أكثر الإجابات الخاطئة: {wrong}\n"
+    
     keyboard = [[InlineKeyboardButton("رجوع", callback_data='teacher_menu')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -594,6 +1103,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     2. استخدم "إضافة سؤال" لرفع أسئلة جديدة
     3. يمكنك رفع الصور أو كتابة الأسئلة نصياً
     4. اختر نوع السؤال (صح/خطأ أو اختيار من متعدد)
+    5. شارك "رابط الانضمام للفصل" مع طلابك لتصلهم الاختبارات المباشرة
     
     👨‍🎓 **للطالب:**
     1. اختر "طالب" عند بدء البوت
@@ -612,18 +1122,84 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة الأخطاء"""
-    logger.error(f"حدث خطأ: {context.error}")
+    logger.error(f"حدث خطأ: {context.error}", exc_info=context.error)
+    
+    # تجاوز حد الإرسال أو حظر المستخدم للبوت: رسالة الخطأ ستفشل بدورها
+    if isinstance(context.error, (RetryAfter, Forbidden)):
+        return
     
     if update and update.effective_user:
-        await context.bot.send_message(
-            chat_id=update.effective_user.id,
-            text="❌ حدث خطأ ما. يرجى المحاولة مرة أخرى."
-        )
+        try:
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="❌ حدث خطأ ما. يرجى المحاولة مرة أخرى."
+            )
+        except TelegramError as e:
+            logger.warning(f"تعذر إبلاغ المستخدم بالخطأ: {e}")
 
-def main():
-    """الدالة الرئيسية لتشغيل البوت"""
-    # إنشاء التطبيق
-    application = Application.builder().token(BOT_TOKEN).build()
+async def warm_up():
+    """تحميل فهرس الأسئلة والإحصائيات مسبقاً في الخلفية ثم إعلان الجاهزية"""
+    try:
+        await db.warm()
+    except Exception:
+        # الطلبات تحمّل ما تحتاجه بنفسها، فالفشل هنا يبطئ أولها فقط
+        logger.exception("تعذر التحميل المسبق")
+    startup.mark('warm')
+    startup.set_ready()
+
+async def on_startup(application: Application):
+    """بدء التحميل المسبق واستعادة مؤقتات الاختبارات، وتشغيل خادم المقاييس المستقل إذا حُدد METRICS_PORT"""
+    startup.mark('initialized')
+    application.bot_data['warm_up'] = asyncio.create_task(warm_up())
+    
+    restored = restore_quiz_timers(application.job_queue)
+    if restored:
+        logger.info(f"استعادة مؤقتات {restored} اختبار جارٍ")
+    
+    if METRICS_PORT:
+        from http_server import HTTPServer
+        server = HTTPServer(WEBHOOK_LISTEN, METRICS_PORT + (SHARD_INDEX or 0))
+        metrics.add_routes(server)
+        server.route('GET', '/health', startup.health)
+        await server.start()
+        application.bot_data['metrics_server'] = server
+
+async def on_shutdown(application: Application):
+    """حفظ البيانات المؤجلة قبل الإيقاف"""
+    warm_task = application.bot_data.pop('warm_up', None)
+    if warm_task is not None:
+        await warm_task
+    server = application.bot_data.pop('metrics_server', None)
+    if server is not None:
+        await server.stop()
+    await db.close()
+    user_states.close()
+    quiz_sessions.close()
+
+def storage_file_sizes():
+    """حجم كل ملف تخزين موجود، لمقياس bot_storage_file_bytes"""
+    return {
+        (os.path.basename(path),): os.path.getsize(path)
+        for path in db.storage_files if os.path.exists(path)
+    }
+
+def build_application(request=None):
+    """إنشاء التطبيق وتسجيل المعالجات"""
+    # الحد الكلي لتيليجرام يخص البوت كله، فيُقسم على العمليات العاملة
+    global_rate = RATE_LIMIT_GLOBAL / (SHARDS if SHARD_INDEX is not None else 1)
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        # معالجة متوازية مع الحفاظ على ترتيب تحديثات كل مستخدم
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        # جدولة الرسائل الصادرة ضمن حدود تيليجرام
+        .rate_limiter(OutboundLimiter(global_rate=global_rate))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
     
     # إضافة handlers
     application.add_handler(CommandHandler("start", start))
@@ -631,10 +1207,16 @@ def main():
     application.add_handler(CallbackQueryHandler(handle_role_selection, pattern='^role_'))
     application.add_handler(CallbackQueryHandler(add_question_start, pattern='^add_question$'))
     application.add_handler(CallbackQueryHandler(handle_question_type, pattern='^type_'))
+    application.add_handler(CallbackQueryHandler(import_questions_start, pattern='^import_questions$'))
     application.add_handler(CallbackQueryHandler(handle_answer_selection, pattern='^answer_'))
     application.add_handler(CallbackQueryHandler(start_quiz, pattern='^start_quiz$'))
     application.add_handler(CallbackQueryHandler(handle_quiz_answer, pattern='^ans_'))
-    application.add_handler(CallbackQueryHandler(view_questions, pattern='^view_questions$'))
+    application.add_handler(CallbackQueryHandler(view_questions, pattern='^(view_questions$|vq:)'))
+    application.add_handler(CallbackQueryHandler(search_questions_start, pattern='^vq_search:'))
+    application.add_handler(CallbackQueryHandler(live_exam_start, pattern='^live_start$'))
+    application.add_handler(CallbackQueryHandler(class_link, pattern='^class_link$'))
+    application.add_handler(CallbackQueryHandler(live_exam_end, pattern='^live_end$'))
+    application.add_handler(CallbackQueryHandler(handle_live_answer, pattern=r'^live:\d+:\d+:'))
     application.add_handler(CallbackQueryHandler(my_results, pattern='^my_results$'))
     application.add_handler(CallbackQueryHandler(teacher_menu, pattern='^teacher_menu$'))
     application.add_handler(CallbackQueryHandler(student_menu, pattern='^student_menu$'))
@@ -642,14 +1224,40 @@ def main():
     
     # معالجة الرسائل
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     
     # معالجة الأخطاء
     application.add_error_handler(error_handler)
     
+    # المقاييس: زمن كل معالج، وقيم لحظية تُحسب عند قراءة /metrics
+    metrics.instrument_handlers(application)
+    metrics.user_states.set_function(lambda: len(user_states) + len(quiz_sessions))
+    metrics.storage_file_bytes.set_function(storage_file_sizes)
+    
+    startup.mark('application')
+    return application
+
+def main():
+    """الدالة الرئيسية لتشغيل البوت"""
+    if BOT_MODE == 'sharded' and SHARD_INDEX is None:
+        # العملية الأمامية لا تحتاج ما أنشأه هذا الملف، فتُستبدل بـ sharding.py
+        # (python sharding.py مباشرة يتجنب إنشاءه أصلاً)
+        sharding_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sharding.py')
+        os.execv(sys.executable, [sys.executable, sharding_path])
+    
+    application = build_application()
+    
     # تشغيل البوت
     print("🤖 البوت يعمل...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if SHARD_INDEX is not None:
+        from sharding import run_shard_worker
+        asyncio.run(run_shard_worker(application, SHARD_INDEX))
+    elif BOT_MODE == 'webhook':
+        from webhook import run_webhook
+        asyncio.run(run_webhook(application, ALLOWED_UPDATES))
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     # التحقق من وجود التوكن
@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserLocks:
+    """أقفال لكل مستخدم تُنشأ عند الحاجة وتُحذف عند عدم وجود منتظرين"""
+
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, user_id):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+# أقفال مشتركة بين معالجة التحديثات والمهام المجدولة
+user_locks = UserLocks()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """معالجة التحديثات بالتوازي مع الحفاظ على ترتيب تحديثات المستخدم الواحد
+
+    process_update في المكتبة نهائية وتأخذ مقعدها قبل do_process_update،
+    لذلك يصبح حدها (max_pending) حداً لعدد التحديثات المقبولة فقط، بينما
+    يُؤخذ مقعد التنفيذ (max_concurrent_updates) هنا بعد قفل المستخدم، فتحديثات
+    مستخدم ينتظر دوره لا تحجز مقاعد تنفيذ على حساب بقية المستخدمين.
+    """
+
+    def __init__(self, max_concurrent_updates, locks=user_locks, max_pending=None):
+        super().__init__(max_pending or max_concurrent_updates * 16)
+        self.locks = locks
+        self.handler_limit = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            async with self._running:
+                await coroutine
+            return
+
+        async with self.locks.hold(user.id):
+            async with self._running:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -15,3 +15,122 @@ QUESTION_TYPES = {
     'multiple_choice': 'اختيار من متعدد',
     'short_answer': 'إجابة قصيرة'
 }
+
+# نوع التخزين: json (قراءة وكتابة الملف في كل عملية) أو memory (ذاكرة مع كتابة مؤجلة) أو sqlite
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+
+# الفاصل الزمني بالثواني لحفظ التعديلات المؤجلة على القرص
+FLUSH_INTERVAL = float(os.getenv('FLUSH_INTERVAL', '5'))
+
+# مسار قاعدة SQLite (عند STORAGE_BACKEND=sqlite)
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'quiz.db')
+
+# عدد الخيوط المخصصة لعمليات التخزين خارج حلقة الأحداث
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))
+
+# مخزن حالة المحادثات: memory أو sqlite (يبقى بعد إعادة التشغيل)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'states.db')
+
+# مدة بقاء الجلسة المهملة بالثواني قبل حذفها
+STATE_TTL = int(os.getenv('STATE_TTL', '7200'))
+
+# مهلة عرض نتيجة الإجابة قبل السؤال التالي بالثواني (0 = فوراً)
+ANSWER_FEEDBACK_DELAY = float(os.getenv('ANSWER_FEEDBACK_DELAY', '1'))
+
+# separate: رسالة النتيجة ثم السؤال التالي، combined: النتيجة والسؤال التالي في رسالة واحدة
+ANSWER_FEEDBACK_MODE = os.getenv('ANSWER_FEEDBACK_MODE', 'separate')
+
+# مدة الاختبار كاملاً بالثواني، يُسلَّم تلقائياً عند انتهائها (0 = بلا حد)
+QUIZ_TIME_LIMIT = int(os.getenv('QUIZ_TIME_LIMIT', '0'))
+
+# مهلة السؤال الواحد بالثواني، يُحتسب خطأ عند انتهائها (0 = بلا حد)
+QUESTION_TIME_LIMIT = int(os.getenv('QUESTION_TIME_LIMIT', '0'))
+
+# مدة الاختبار المباشر للفصل بالثواني قبل إنهائه تلقائياً
+LIVE_EXAM_TIME_LIMIT = int(os.getenv('LIVE_EXAM_TIME_LIMIT', '1800'))
+
+# طلبات الإرسال المعلقة معاً عند نشر الاختبار المباشر (المعدل الفعلي تحدده حدود الإرسال)
+LIVE_EXAM_CONCURRENCY = int(os.getenv('LIVE_EXAM_CONCURRENCY', '32'))
+
+# أقل فاصل بالثواني بين تحديثات رسالة تقدم الاختبار المباشر عند المعلم
+LIVE_PROGRESS_INTERVAL = float(os.getenv('LIVE_PROGRESS_INTERVAL', '2'))
+
+# الحد الأقصى للتحديثات المعالجة في نفس الوقت (تحديثات المستخدم الواحد تبقى بالترتيب)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+# طريقة استقبال التحديثات: polling أو webhook أو sharded (webhook موزع على عدة عمليات)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# أنواع التحديثات التي يعالجها البوت فقط
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+# إعدادات webhook (Render يوفر PORT و RENDER_EXTERNAL_URL تلقائياً)
+PORT = int(os.getenv('PORT', '8080'))
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', os.getenv('RENDER_EXTERNAL_URL', ''))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# عدد أسئلة الاختبار
+QUIZ_SIZE = int(os.getenv('QUIZ_SIZE', '5'))
+
+# توزيع الأسئلة حسب النوع (اختياري)، مثال: multiple_choice:3,true_false:2
+QUIZ_MIX = {
+    name.strip(): int(count)
+    for name, count in (
+        item.split(':') for item in os.getenv('QUIZ_MIX', '').split(',') if item.strip()
+    )
+}
+
+# عدد بطاقات الأسئلة الجاهزة للعرض المحفوظة في الذاكرة
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '2000'))
+
+# عدد آخر النتائج المحفوظة في ملخص كل طالب
+RECENT_RESULTS = int(os.getenv('RECENT_RESULTS', '10'))
+
+# سياسة مزامنة سجل النتائج مع القرص: always أو interval (كل ثانية في خيط خلفي) أو never
+JOURNAL_FSYNC = os.getenv('JOURNAL_FSYNC', 'always')
+
+# عدد السجلات قبل دمج سجل النتائج في لقطة results.json
+JOURNAL_COMPACT_EVERY = int(os.getenv('JOURNAL_COMPACT_EVERY', '1000'))
+
+# الحد الأقصى لحجم ملف استيراد الأسئلة بالبايت
+MAX_IMPORT_SIZE = int(os.getenv('MAX_IMPORT_SIZE', str(5 * 1024 * 1024)))
+
+# معالجة صور الأسئلة: أكبر بُعد بالبكسل وجودة JPEG وعدد خيوط المعالجة
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1280'))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '80'))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+# التشغيل الموزع (BOT_MODE=sharded، والعملية الأمامية python sharding.py): عدد العمليات العاملة ومجلد مقابس التواصل معها
+SHARDS = int(os.getenv('SHARDS', str(os.cpu_count() or 1)))
+SHARD_SOCKET_DIR = os.getenv('SHARD_SOCKET_DIR', 'shards')
+
+# رقم العملية العاملة، تضبطه العملية الأمامية لكل عامل تشغّله
+SHARD_INDEX = int(os.environ['SHARD_INDEX']) if os.getenv('SHARD_INDEX') else None
+
+# حدود الإرسال إلى تيليجرام (رسالة في الثانية): الكلي، لكل محادثة خاصة مع دفعة قصيرة، ولكل مجموعة
+RATE_LIMIT_GLOBAL = float(os.getenv('RATE_LIMIT_GLOBAL', '30'))
+RATE_LIMIT_CHAT = float(os.getenv('RATE_LIMIT_CHAT', '1'))
+RATE_LIMIT_CHAT_BURST = int(os.getenv('RATE_LIMIT_CHAT_BURST', '3'))
+RATE_LIMIT_GROUP = float(os.getenv('RATE_LIMIT_GROUP', str(20 / 60)))
+
+# عدد مرات إعادة الطلب بعد RetryAfter قبل إظهار الخطأ
+RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', '3'))
+
+# أقصى توقف لكل الإرسال (بالثواني) عند RetryAfter لمحادثة واحدة
+RATE_LIMIT_COOLDOWN = float(os.getenv('RATE_LIMIT_COOLDOWN', '1'))
+
+# منفذ خادم /metrics المستقل في وضع polling وللعمال (العامل i على المنفذ + i)؛
+# 0 = المقاييس على خادم webhook فقط
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# رمز اختياري لحماية /metrics (ترويسة Authorization: Bearer <الرمز>)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# تفعيل المحلل بالعينات على /debug/profile?seconds=10
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# عدد الأسئلة في كل صفحة من قائمة أسئلة المعلم
+QUESTIONS_PAGE_SIZE = int(os.getenv('QUESTIONS_PAGE_SIZE', '10'))
@@ -1,130 +1,709 @@
+import asyncio
+import copy
+import functools
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from config import (
+    STORAGE_BACKEND, FLUSH_INTERVAL, DB_WORKERS, RECENT_RESULTS,
+    JOURNAL_FSYNC, JOURNAL_COMPACT_EVERY
+)
+from ids import question_ids, result_ids
+from journal import Journal, iter_journal
+from metrics import db_call_seconds, db_wait_seconds, storage_read_bytes, storage_written_bytes
+from question_index import QuestionIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def _read_json(file_name):
+    """قراءة ملف JSON؛ الملف يُنشأ عند أول حفظ فغيابه يعني مجموعة فارغة"""
+    try:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            storage_read_bytes.inc(os.fstat(f.fileno()).st_size, file=os.path.basename(file_name))
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _atomic_write(file_name, text):
+    """كتابة الملف عبر ملف مؤقت ثم إعادة تسمية حتى لا يبقى الملف نصف مكتوب"""
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+            size = os.fstat(f.fileno()).st_size
+        os.replace(tmp_path, file_name)
+        storage_written_bytes.inc(size, file=os.path.basename(file_name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def apply_result_to_stats(stats, result, recent_size=RECENT_RESULTS):
+    """تحديث إحصائيات الطالب التراكمية بنتيجة اختبار واحدة في O(1)"""
+    stats['quizzes_taken'] = stats.get('quizzes_taken', 0) + 1
+    stats['total_score'] = stats.get('total_score', 0) + result['score']
+    stats['total_possible'] = stats.get('total_possible', 0) + result['total']
+    stats['best_percentage'] = max(stats.get('best_percentage', 0), result['percentage'])
+
+    # آخر N نتائج فقط، الأحدث أولاً
+    recent = stats.get('recent', [])
+    recent.insert(0, {
+        'score': result['score'],
+        'total': result['total'],
+        'percentage': result['percentage'],
+        'date': result['date']
+    })
+    stats['recent'] = recent[:recent_size]
+
+    # دقة الإجابة حسب نوع السؤال: {النوع: [صحيحة، الكل]}
+    type_stats = stats.setdefault('type_stats', {})
+    for answer in result['quiz_data']:
+        question_type = answer.get('question_type')
+        if question_type:
+            counts = type_stats.setdefault(question_type, [0, 0])
+            counts[0] += 1 if answer.get('is_correct') else 0
+            counts[1] += 1
+    return stats
+
+
+def apply_result_to_student(student, result_id, result):
+    """نسخة جديدة من الطالب مع النتيجة ومعرفها كآخر نتيجة محسوبة (stats_through)
+
+    لا يُعدَّل القاموس القديم، فتبقى اللقطة التي أُخذت منه للكتابة صحيحة.
+    """
+    student = copy.deepcopy(student)
+    apply_result_to_stats(student, result)
+    student['stats_through'] = result_id
+    return student
+
+
+def replay_student_stats(students, records):
+    """إضافة نتائج السجل التي لم تُحسب بعد في إحصائيات كل طالب
+
+    كل طالب يحفظ معرف آخر نتيجة حُسبت له (stats_through)، فتُعاد له النتائج
+    التي بعدها في السجل فقط، أو كل نتائجه فيه إن لم يكن المعرف فيه (دُمج
+    في اللقطة أو لا نتائج له بعد). ويعيد عدد النتائج المضافة.
+    """
+    pending = {}
+    for record in records:
+        user_id = record['student_id']
+        student = students.get(user_id)
+        if student is None or 'stats_through' not in student:
+            continue
+        if record['id'] == student['stats_through']:
+            pending.pop(user_id, None)
+        else:
+            pending.setdefault(user_id, []).append(record)
+
+    for user_id, user_records in pending.items():
+        for record in user_records:
+            students[user_id] = apply_result_to_student(students[user_id], record['id'], record)
+    return sum(len(user_records) for user_records in pending.values())
+
+
+def needs_stats_backfill(student):
+    """طالب له اختبارات سابقة حُفظت قبل الإحصائيات التراكمية"""
+    return bool(student.get('quizzes_taken')) and 'total_possible' not in student
+
+
+def rebuild_student_stats(student, results):
+    """إعادة حساب إحصائيات الطالب التراكمية من سجل نتائجه (ترحيل لمرة واحدة)
+
+    إذا لم تُوجد نتائج في السجل تبقى العدادات القديمة كما هي.
+    """
+    results = sorted(results, key=lambda result: result['date'])
+    if not results:
+        return student
+
+    for name in ('quizzes_taken', 'total_score', 'total_possible', 'best_percentage', 'recent', 'type_stats'):
+        student.pop(name, None)
+    for result in results:
+        apply_result_to_stats(student, result)
+    return student
+
+
+def apply_answer_to_item_stats(stats, answer):
+    """تحديث عدادات سؤال واحد بإجابة طالب: المحاولات والصحيح والزمن والخيارات الخاطئة"""
+    stats['attempts'] = stats.get('attempts', 0) + 1
+    if answer.get('is_correct'):
+        stats['correct'] = stats.get('correct', 0) + 1
+    elif answer.get('user_answer') is not None:
+        wrong_answers = stats.setdefault('wrong_answers', {})
+        wrong_answers[answer['user_answer']] = wrong_answers.get(answer['user_answer'], 0) + 1
+
+    if answer.get('elapsed') is not None:
+        stats['timed_attempts'] = stats.get('timed_attempts', 0) + 1
+        stats['total_time'] = stats.get('total_time', 0) + answer['elapsed']
+    return stats
+
+
+def add_result_to_item_stats(question_stats, quiz_data, get_question):
+    """إضافة إجابات نتيجة واحدة إلى عدادات أسئلتها في O(عدد الإجابات)"""
+    for answer in quiz_data:
+        question = get_question(answer.get('question_id'))
+        if question is not None:
+            # نسخة جديدة بدل التعديل في المكان، فتبقى النسخة المأخوذة للقطة صحيحة
+            stats = question_stats.get(answer['question_id'])
+            stats = copy.deepcopy(stats) if stats else {'teacher_id': question['teacher_id']}
+            question_stats[answer['question_id']] = apply_answer_to_item_stats(stats, answer)
+    return question_stats
+
+
+def replay_item_stats(snapshot, records, get_question):
+    """عدادات الأسئلة من لقطة question_stats.json وسجلات النتائج التي لم تُدمج فيها
+
+    اللقطة {'compacted_through': آخر نتيجة مدمجة، 'questions': العدادات}، فتُعاد
+    من السجل النتائج التي بعد تلك النتيجة فقط (أو كلها إن لم تكن فيه بعد التفريغ).
+    الصيغة الأقدم (العدادات مباشرة) كانت تُكتب مع كل نتيجة فتشمل السجل كله.
+    """
+    if snapshot and 'questions' not in snapshot:
+        return snapshot
+
+    question_stats = snapshot.get('questions', {})
+    pending = []
+    for record in records:
+        if record['id'] == snapshot.get('compacted_through'):
+            pending.clear()
+        else:
+            pending.append(record)
+
+    for record in pending:
+        add_result_to_item_stats(question_stats, record['quiz_data'], get_question)
+    return question_stats
+
+
+def build_teacher_report(questions, get_item_stats):
+    """تقرير المعلم من أسئلته والعدادات المحسوبة مسبقاً، دون المرور على النتائج"""
+    type_counts = {}
+    items = []
+    attempts = correct = 0
+
+    for question in questions:
+        type_counts[question['type']] = type_counts.get(question['type'], 0) + 1
+
+        stats = get_item_stats(question['id'])
+        if not stats or not stats.get('attempts'):
+            continue
+
+        attempts += stats['attempts']
+        correct += stats.get('correct', 0)
+        wrong_answers = stats.get('wrong_answers', {})
+        items.append({
+            'id': question['id'],
+            'question': question.get('question', ''),
+            'type': question['type'],
+            'attempts': stats['attempts'],
+            'percent_correct': stats.get('correct', 0) / stats['attempts'] * 100,
+            'avg_time': (stats['total_time'] / stats['timed_attempts']) if stats.get('timed_attempts') else None,
+            'top_wrong': sorted(wrong_answers.items(), key=lambda item: item[1], reverse=True)[:3]
+        })
+
+    return {
+        'questions': sum(type_counts.values()),
+        'type_counts': type_counts,
+        'attempts': attempts,
+        'percent_correct': (correct / attempts * 100) if attempts else None,
+        'items': items
+    }
+
+
 class Database:
     def __init__(self):
         self.teachers_file = 'teachers.json'
         self.students_file = 'students.json'
         self.questions_file = 'questions.json'
         self.results_file = 'results.json'
-        self.init_files()
-    
-    def init_files(self):
-        """تهيئة ملفات JSON إذا لم تكن موجودة"""
-        files = [
-            (self.teachers_file, {}),
-            (self.students_file, {}),
-            (self.questions_file, {}),
-            (self.results_file, {})
-        ]
-        
-        for file_name, default_data in files:
-            if not os.path.exists(file_name):
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    json.dump(default_data, f, ensure_ascii=False, indent=2)
-    
+        self.question_stats_file = 'question_stats.json'
+        self.classes_file = 'classes.json'
+        self._lock = threading.RLock()
+        self._index = None
+        self._item_stats = None
+        self._item_stats_through = None
+        self._students = None
+        self._students_write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+
+        # النتائج الجديدة تُضاف إلى سجل results.jsonl، و results.json لقطة تُحدَّث عند الدمج
+        self.results_journal = Journal('results.jsonl', fsync_policy=JOURNAL_FSYNC)
+
+        # الملفات التي يُعرض حجمها في المقاييس
+        self.storage_files = (
+            self.teachers_file, self.students_file, self.questions_file,
+            self.results_file, self.question_stats_file, self.classes_file, self.results_journal.path
+        )
+
+    # === القراءة والكتابة ===
+    def _load(self, file_name):
+        return _read_json(file_name)
+
+    def _save(self, file_name, data):
+        _atomic_write(file_name, _dumps(data))
+
+    def _save_students(self):
+        """كتابة students.json من نسخة سطحية تحت القفل، والتحويل والكتابة خارجه
+
+        قفل الكتابة يرتب الكتابات فلا تُكتب نسخة أقدم فوق أحدث، لذا لا تُستدعى
+        والقفل العام مأخوذ.
+        """
+        with self._students_write_lock:
+            with self._lock:
+                students = dict(self._load_students())
+            _atomic_write(self.students_file, _dumps(students))
+
+    def flush(self):
+        """لا شيء مؤجل في التخزين المباشر"""
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        self.flush()
+        self.results_journal.close()
+
     # === إدارة المعلمين ===
     def add_teacher(self, user_id, username, name):
-        with open(self.teachers_file, 'r', encoding='utf-8') as f:
-            teachers = json.load(f)
-        
-        teachers[str(user_id)] = {
-            'username': username,
-            'name': name,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        with open(self.teachers_file, 'w', encoding='utf-8') as f:
-            json.dump(teachers, f, ensure_ascii=False, indent=2)
-    
+        with self._lock:
+            teachers = self._load(self.teachers_file)
+
+            teachers[str(user_id)] = {
+                'username': username,
+                'name': name,
+                'created_at': datetime.now().isoformat()
+            }
+
+            self._save(self.teachers_file, teachers)
+
     def is_teacher(self, user_id):
-        with open(self.teachers_file, 'r', encoding='utf-8') as f:
-            teachers = json.load(f)
-        return str(user_id) in teachers
-    
+        with self._lock:
+            return str(user_id) in self._load(self.teachers_file)
+
     # === إدارة الطلاب ===
     def add_student(self, user_id, username, name):
-        with open(self.students_file, 'r', encoding='utf-8') as f:
-            students = json.load(f)
-        
-        students[str(user_id)] = {
-            'username': username,
-            'name': name,
-            'created_at': datetime.now().isoformat(),
-            'quizzes_taken': 0,
-            'total_score': 0
-        }
-        
-        with open(self.students_file, 'w', encoding='utf-8') as f:
-            json.dump(students, f, ensure_ascii=False, indent=2)
-    
+        with self._lock:
+            students = self._load_students()
+
+            # الحفاظ على الإحصائيات عند إعادة اختيار الدور
+            if str(user_id) in students:
+                students[str(user_id)] = {**students[str(user_id)], 'username': username, 'name': name}
+            else:
+                students[str(user_id)] = {
+                    'username': username,
+                    'name': name,
+                    'created_at': datetime.now().isoformat(),
+                    'quizzes_taken': 0,
+                    'total_score': 0,
+                    'stats_through': None
+                }
+
+        self._save_students()
+
     def is_student(self, user_id):
-        with open(self.students_file, 'r', encoding='utf-8') as f:
-            students = json.load(f)
-        return str(user_id) in students
-    
+        with self._lock:
+            return str(user_id) in self._load_students()
+
+    # === فصول المعلمين ===
+    def join_class(self, teacher_id, student_id):
+        """انضمام الطالب إلى فصل المعلم، ويعيد False إذا لم يكن المعلم مسجلاً"""
+        with self._lock:
+            if str(teacher_id) not in self._load(self.teachers_file):
+                return False
+
+            classes = self._load(self.classes_file)
+            members = classes.get(str(teacher_id), {})
+            if str(student_id) not in members:
+                classes[str(teacher_id)] = {**members, str(student_id): datetime.now().isoformat()}
+                self._save(self.classes_file, classes)
+            return True
+
+    def get_class_roster(self, teacher_id):
+        """معرفات طلاب فصل المعلم: من انضموا عبر رابط الانضمام فقط"""
+        with self._lock:
+            return [int(student_id) for student_id in self._load(self.classes_file).get(str(teacher_id), {})]
+
+    def _load_students(self):
+        """الطلاب في الذاكرة، تُقرأ مرة وتُكمل إحصائياتهم من سجل النتائج
+
+        الطالب الذي لا يحمل stats_through كُتب قبل هذه العلامة، حين كانت
+        الإحصائيات تُحفظ مع كل نتيجة فتشمل كل نتائجه: يأخذ معرف آخر نتيجة له،
+        وتُحسب إحصائياته من السجل إن سبقت نتائجه الإحصائيات التراكمية.
+        """
+        if self._students is not None:
+            return self._students
+
+        students = self._load(self.students_file)
+        unmarked = {user_id for user_id, student in students.items() if 'stats_through' not in student}
+        if unmarked:
+            history = {}
+            for result_id, result in self._iter_results():
+                if result['student_id'] in unmarked:
+                    history.setdefault(result['student_id'], []).append((result_id, result))
+            for user_id in unmarked:
+                results = history.get(user_id, [])
+                if needs_stats_backfill(students[user_id]):
+                    rebuild_student_stats(students[user_id], [result for _, result in results])
+                students[user_id]['stats_through'] = results[-1][0] if results else None
+
+            # الترحيل يُكتب فوراً: نتيجة جديدة قبل كتابته ستُحسب له من السجل
+            _atomic_write(self.students_file, _dumps(students))
+
+        # نتائج السجل التي سبقت انقطاع التشغيل قبل حفظ الإحصائيات
+        if replay_student_stats(students, self.results_journal):
+            self._save(self.students_file, students)
+        self._students = students
+        return students
+
     # === إدارة الأسئلة ===
     def add_question(self, teacher_id, question_data):
-        with open(self.questions_file, 'r', encoding='utf-8') as f:
-            questions = json.load(f)
-        
-        question_id = f"q{len(questions) + 1}_{teacher_id}"
-        questions[question_id] = {
-            **question_data,
-            'id': question_id,
-            'teacher_id': str(teacher_id),
-            'created_at': datetime.now().isoformat()
-        }
-        
-        with open(self.questions_file, 'w', encoding='utf-8') as f:
-            json.dump(questions, f, ensure_ascii=False, indent=2)
-        
-        return question_id
-    
+        return self.add_questions(teacher_id, [question_data])[0]
+
+    def add_questions(self, teacher_id, questions_data):
+        """إضافة عدة أسئلة بكتابة واحدة للملف، ويعيد معرفاتها"""
+        with self._lock:
+            questions = self._load(self.questions_file)
+
+            question_ids_added = []
+            for question_data in questions_data:
+                question_id = question_ids.new(teacher_id)
+                question = {
+                    **question_data,
+                    'id': question_id,
+                    'teacher_id': str(teacher_id),
+                    'created_at': datetime.now().isoformat()
+                }
+                questions[question_id] = question
+                question_ids_added.append(question_id)
+                if self._index is not None:
+                    self._index.add(dict(question))
+
+            self._save(self.questions_file, questions)
+            return question_ids_added
+
+    def update_question(self, question_id, fields):
+        """تحديث حقول سؤال موجود، ويعيد False إذا لم يوجد"""
+        with self._lock:
+            questions = self._load(self.questions_file)
+            if question_id not in questions:
+                return False
+
+            questions[question_id] = {**questions[question_id], **fields}
+            self._save(self.questions_file, questions)
+            if self._index is not None:
+                self._index.update(question_id, fields)
+            return True
+
     def get_questions_by_teacher(self, teacher_id):
-        with open(self.questions_file, 'r', encoding='utf-8') as f:
-            questions = json.load(f)
-        
-        return [q for q in questions.values() if q['teacher_id'] == str(teacher_id)]
-    
+        with self._lock:
+            questions = self._load(self.questions_file)
+            return [q for q in questions.values() if q['teacher_id'] == str(teacher_id)]
+
     def get_all_questions(self):
-        with open(self.questions_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
+        with self._lock:
+            return dict(self._load(self.questions_file))
+
+    def warm(self):
+        """بناء فهرس الأسئلة وقراءة الإحصائيات التراكمية مسبقاً عند التشغيل
+
+        حتى لا يدفع أول طلب ثمن تحليل الملفات: التخزين المؤجل يبقيها في
+        الذاكرة، والتخزين المباشر يجد صفحاتها في ذاكرة نظام الملفات.
+        """
+        with self._lock:
+            self._question_index()
+            self._load_students()
+            self._question_stats()
+            self._load(self.teachers_file)
+
+    # === فهرس الأسئلة ===
+    def _question_index(self):
+        """بناء الفهرس مرة واحدة من كل الأسئلة ثم تحديثه مع كل إضافة"""
+        if self._index is None:
+            self._index = QuestionIndex(dict(q) for q in self.get_all_questions().values())
+        return self._index
+
+    def get_question(self, question_id):
+        with self._lock:
+            return self._question_index().get(question_id)
+
+    def _question_stats(self):
+        """عدادات الأسئلة في الذاكرة، تُبنى مرة من اللقطة والسجل ثم تُحدَّث مع كل نتيجة
+
+        لا تُكتب مع كل نتيجة: إجاباتها محفوظة في سجل النتائج، واللقطة تُكتب عند الضغط.
+        """
+        if self._item_stats is None:
+            snapshot = self._load(self.question_stats_file)
+            self._item_stats = replay_item_stats(snapshot, self.results_journal, self._question_index().get)
+            self._item_stats_through = self._last_journal_id() or snapshot.get('compacted_through')
+            if snapshot and 'questions' not in snapshot:
+                # تحويل الصيغة الأقدم حتى لا تُعد نتائج السجل الحالية مرة أخرى
+                self._write_question_stats()
+        return self._item_stats
+
+    def _last_journal_id(self):
+        last_id = None
+        for record in self.results_journal:
+            last_id = record['id']
+        return last_id
+
+    def _write_question_stats(self):
+        _atomic_write(self.question_stats_file, _dumps(self._question_stats_snapshot()))
+
+    def _question_stats_snapshot(self):
+        """العدادات مع معرف آخر نتيجة حُسبت فيها، وتُعاد نتائج السجل التي بعده عند التحميل"""
+        return {'compacted_through': self._item_stats_through, 'questions': dict(self._item_stats)}
+
+    def get_questions_page(self, teacher_id, offset=0, limit=10, question_type=None, search=None):
+        """صفحة من أسئلة المعلم من الفهرس، ويعيد (نسخ الأسئلة، العدد الكلي)"""
+        with self._lock:
+            questions, total = self._question_index().page(teacher_id, offset, limit, question_type, search)
+            return [dict(q) for q in questions], total
+
+    def sample_questions(self, k, teacher_id=None, question_type=None, mix=None):
+        """سحب أسئلة عشوائية من الفهرس، أو سحب طبقي حسب mix مثل {'true_false': 2}"""
+        with self._lock:
+            index = self._question_index()
+            if mix:
+                return index.sample_mix(mix, teacher_id)
+            return index.sample(k, teacher_id, question_type)
+
     # === إدارة النتائج ===
     def save_result(self, student_id, quiz_data, score, total):
-        with open(self.results_file, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        result_id = f"r{len(results) + 1}_{student_id}"
-        results[result_id] = {
-            'student_id': str(student_id),
-            'quiz_data': quiz_data,
-            'score': score,
-            'total': total,
-            'percentage': (score / total * 100) if total > 0 else 0,
-            'date': datetime.now().isoformat()
-        }
-        
-        with open(self.results_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        
-        # تحديث إحصائيات الطالب
-        with open(self.students_file, 'r', encoding='utf-8') as f:
-            students = json.load(f)
-        
-        if str(student_id) in students:
-            students[str(student_id)]['quizzes_taken'] += 1
-            students[str(student_id)]['total_score'] += score
-        
-        with open(self.students_file, 'w', encoding='utf-8') as f:
-            json.dump(students, f, ensure_ascii=False, indent=2)
-        
-        return result_id
-    
+        with self._lock:
+            result_id = result_ids.new(student_id)
+            result = {
+                'student_id': str(student_id),
+                'quiz_data': quiz_data,
+                'score': score,
+                'total': total,
+                'percentage': (score / total * 100) if total > 0 else 0,
+                'date': datetime.now().isoformat()
+            }
+            # قراءة الطلاب والعدادات قبل إضافة النتيجة حتى لا يحسبها الترحيل أو الإعادة مرتين
+            students = self._load_students()
+            question_stats = self._question_stats()
+
+            # إضافة سطر واحد للسجل بدلاً من إعادة كتابة كل النتائج
+            self.results_journal.append({'id': result_id, **result})
+
+            # إحصائيات الطالب وعدادات الأسئلة تُحدَّث في الذاكرة فقط: السجل يحفظ
+            # النتيجة، وتُعاد منه عند التحميل إلى أن تُكتب اللقطات عند الدمج
+            if str(student_id) in students:
+                students[str(student_id)] = apply_result_to_student(students[str(student_id)], result_id, result)
+            add_result_to_item_stats(question_stats, quiz_data, self._question_index().get)
+            self._item_stats_through = result_id
+
+            if self.results_journal.count >= JOURNAL_COMPACT_EVERY:
+                self._start_compaction()
+            return result_id
+
+    def _iter_results(self):
+        """كل النتائج: اللقطة أولاً ثم السجل، دون تحميل السجل في الذاكرة
+
+        تُستهلك والقفل مأخوذ حتى لا يُحذف ملف الدمج أثناء قراءته، ونتائجه
+        التي كُتبت في اللقطة قبل حذفه تُتخطى.
+        """
+        results = _read_json(self.results_file)
+        yield from results.items()
+        for record in self.results_journal:
+            result = dict(record)
+            result_id = result.pop('id')
+            if result_id not in results:
+                yield result_id, result
+
     def get_student_results(self, student_id):
-        with open(self.results_file, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        return [r for r in results.values() if r['student_id'] == str(student_id)]
+        with self._lock:
+            return [r for _, r in self._iter_results() if r['student_id'] == str(student_id)]
+
+    def _start_compaction(self):
+        """الدمج في خيط خلفي حتى لا تنتظره بقية العمليات، ودمج واحد في كل مرة"""
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(
+                target=self._compact_in_background, name='results-compactor', daemon=True
+            )
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact_results()
+        except OSError as e:
+            # ملف الدمج يبقى فيُدمج في المرة التالية
+            logger.error(f"تعذر دمج سجل النتائج وستُعاد المحاولة: {e}")
+
+    def compact_results(self):
+        """دمج السجل في لقطات results.json و question_stats.json و students.json ثم حذفه
+
+        تحت القفل يُنقل السجل إلى ملف الدمج وتؤخذ نسخة من العدادات فقط، أما
+        قراءة results.json وكتابة اللقطات فخارجه. اللقطات تُكتب قبل حذف ملف
+        الدمج؛ إن انقطع التشغيل بينهما فالنتائج المكررة تُدمج بالمعرف نفسه،
+        والعدادات والطلاب يحفظون آخر نتيجة حُسبت فيهم فلا تتكرر.
+        """
+        with self._compact_lock:
+            with self._lock:
+                # الإحصائيات تُبنى من السجل قبل نقله إن لم تكن بُنيت بعد
+                self._load_students()
+                self._question_stats()
+                # ملف دمج متبقٍ من دمج لم يكتمل يُدمج وحده، والسجل الحالي في الدمج التالي
+                if not os.path.exists(self.results_journal.compacting_path):
+                    self.results_journal.rotate()
+                question_stats = self._question_stats_snapshot()
+
+            results = _read_json(self.results_file)
+            for record in iter_journal(self.results_journal.compacting_path):
+                result = dict(record)
+                results[result.pop('id')] = result
+            _atomic_write(self.results_file, _dumps(results))
+            _atomic_write(self.question_stats_file, _dumps(question_stats))
+            self._save_students()
+            self.flush()
+
+            with self._lock:
+                self.results_journal.discard_compacted()
+
+    def get_teacher_stats(self, teacher_id):
+        """إحصائيات أسئلة المعلم: العدد حسب النوع ونسبة الإجابة الصحيحة والزمن لكل سؤال"""
+        with self._lock:
+            questions = self._question_index().by_teacher(teacher_id)
+            return build_teacher_report(questions, self._question_stats().get)
+
+    def get_student_summary(self, student_id):
+        """الإحصائيات التراكمية للطالب دون قراءة سجل النتائج"""
+        with self._lock:
+            student = self._load_students().get(str(student_id))
+            return json.loads(json.dumps(student)) if student else None
+
+
+class BufferedDatabase(Database):
+    """تخزين في الذاكرة مع كتابة مؤجلة (write-behind)
+
+    تُحمَّل كل مجموعة مرة واحدة عند أول استخدام وتُخدم القراءات من الذاكرة،
+    بينما تُجمع التعديلات وتُكتب على القرص دورياً أو عند الإغلاق.
+
+    التعديلات تستبدل عناصر المجموعة بنسخ جديدة ولا تغيّرها في مكانها، فتكفي
+    الكتابة نسخة سطحية تحت القفل ويجري التحويل إلى JSON خارجه.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self._cache = {}
+        self._dirty = set()
+        self._flush_lock = threading.Lock()
+        self.flush_interval = flush_interval
+        super().__init__()
+
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='db-flusher', daemon=True)
+        self._flusher.start()
+
+    def _load(self, file_name):
+        data = self._cache.get(file_name)
+        if data is None:
+            data = super()._load(file_name)
+            self._cache[file_name] = data
+        return data
+
+    def _save(self, file_name, data):
+        self._cache[file_name] = data
+        self._dirty.add(file_name)
+
+    def _save_students(self):
+        with self._lock:
+            self._save(self.students_file, self._load_students())
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                # الملفات الفاشلة ما زالت معلّمة كمعدلة، فتُعاد في الدورة التالية
+                logger.error(f"تعذرت الكتابة المؤجلة وستُعاد المحاولة: {e}")
+
+    def flush(self):
+        """كتابة المجموعات المعدلة على القرص"""
+        # قفل الكتابة يمنع تداخل دفعتين فتُكتب نسخة أقدم فوق أحدث
+        with self._flush_lock:
+            with self._lock:
+                pending = [(f, dict(self._cache[f])) for f in self._dirty]
+                self._dirty.clear()
+
+            # فشل ملف لا يوقف بقية الدفعة، وكل ملف فاشل يُعاد في الدفعة التالية
+            errors = []
+            for file_name, data in pending:
+                try:
+                    _atomic_write(file_name, _dumps(data))
+                except OSError as e:
+                    errors.append(e)
+                    with self._lock:
+                        self._dirty.add(file_name)
+
+            if errors:
+                raise errors[0]
+
+    def close(self):
+        self._stop_event.set()
+        self._flusher.join()
+        super().close()
+
+
+def create_database():
+    """إنشاء قاعدة البيانات حسب STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'memory':
+        return BufferedDatabase()
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase()
+    return Database()
+
+
+class AsyncDatabase:
+    """واجهة غير متزامنة لقاعدة البيانات
+
+    كل دالة في التخزين الأصلي تصبح دالة await تُنفَّذ في مجمع خيوط محدود،
+    فلا تتوقف حلقة الأحداث أثناء قراءة الملفات أو تحليل JSON.
+    """
+
+    def __init__(self, backend, max_workers=DB_WORKERS):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+        if not callable(method) or name.startswith('_'):
+            return method
+
+        def timed(submitted, args, kwargs):
+            # الانتظار يكشف تشبع مجمع الخيوط، والتنفيذ يكشف الدالة البطيئة نفسها
+            started = time.perf_counter()
+            db_wait_seconds.observe(started - submitted, method=name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                db_call_seconds.observe(time.perf_counter() - started, method=name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, timed, time.perf_counter(), args, kwargs
+            )
+
+        # حفظ الدالة المغلفة حتى لا تُنشأ من جديد في كل استدعاء
+        setattr(self, name, call)
+        return call
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.backend.close)
+        self._executor.shutdown(wait=True)
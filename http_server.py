@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+IDLE_TIMEOUT = 75
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes = b''
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b''
+    content_type: str = 'text/plain; charset=utf-8'
+    headers: dict = field(default_factory=dict)
+
+
+class HTTPServer:
+    """خادم HTTP/1.1 بسيط فوق asyncio
+
+    يكفي لاستقبال webhook من تيليجرام وفحوص الصحة دون مكتبات إضافية،
+    ويدعم إبقاء الاتصال مفتوحاً حتى لا يُفتح اتصال جديد لكل تحديث.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self._server = None
+
+    def route(self, method, path, handler):
+        """تسجيل دالة async تستقبل Request وتعيد Response"""
+        self.routes[(method, path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"خادم HTTP يستمع على {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                if isinstance(request, Response):
+                    await self._write_response(writer, request, keep_alive=False)
+                    break
+
+                response = await self._dispatch(request)
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return Response(HTTPStatus.BAD_REQUEST)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                return Response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            return Response(HTTPStatus.BAD_REQUEST)
+        if length > MAX_BODY_SIZE:
+            return Response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+    async def _dispatch(self, request):
+        method = 'GET' if request.method == 'HEAD' else request.method
+        handler = self.routes.get((method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return Response(HTTPStatus.METHOD_NOT_ALLOWED)
+            return Response(HTTPStatus.NOT_FOUND)
+
+        try:
+            response = await handler(request)
+        except Exception:
+            logger.exception(f"خطأ أثناء معالجة {request.method} {request.path}")
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        if request.method == 'HEAD':
+            response.headers['content-length'] = str(len(response.body))
+            response.body = b''
+        return response
+
+    async def _write_response(self, writer, response, keep_alive):
+        status = HTTPStatus(response.status)
+        body = response.body.encode('utf-8') if isinstance(response.body, str) else response.body
+        headers = {
+            'content-type': response.content_type,
+            'content-length': str(len(body)),
+            'connection': 'keep-alive' if keep_alive else 'close',
+            **response.headers
+        }
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
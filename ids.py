@@ -0,0 +1,65 @@
+import os
+import random
+import string
+import threading
+import time
+
+_ALPHABET = string.digits + string.ascii_lowercase
+
+
+def _base36(number, width):
+    digits = []
+    while number:
+        number, remainder = divmod(number, 36)
+        digits.append(_ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+class IdAllocator:
+    """مولد معرفات مرتبة زمنياً دون عد المجموعة
+
+    الشكل: <بادئة><زمن بالملي ثانية><عداد><رمز العملية>_<المالك>
+    العداد يفصل المعرفات داخل الملي ثانية نفسها، ورمز العملية (أحرف فقط)
+    يفصل بين العمليات المتوازية، فلا يتطابق معرف جديد مع آخر.
+
+    المعرفات القديمة (q<رقم>_<المالك> و r<رقم>_<المالك>) تبقى صالحة كما هي
+    دون ترحيل: الجديدة تحتوي دائماً على أحرف فلا يمكن أن تتطابق معها.
+    """
+
+    def __init__(self, prefix, node=None):
+        self.prefix = prefix
+        self.node = node or self._new_node()
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._seq = 0
+
+        # العملية الناتجة عن fork تحتاج رمزاً مختلفاً عن العملية الأم
+        if node is None:
+            os.register_at_fork(after_in_child=self._reset_node)
+
+    @staticmethod
+    def _new_node():
+        return ''.join(random.SystemRandom().choices(string.ascii_lowercase, k=5))
+
+    def _reset_node(self):
+        self.node = self._new_node()
+        self._lock = threading.Lock()
+
+    def new(self, owner):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._seq = 0
+            else:
+                # نفس الملي ثانية أو رجوع الساعة: نكمل من آخر زمن
+                self._seq += 1
+                if self._seq >= 36 ** 2:
+                    self._last_ms += 1
+                    self._seq = 0
+            stamp = _base36(self._last_ms, 9) + _base36(self._seq, 2)
+        return f"{self.prefix}{stamp}{self.node}_{owner}"
+
+
+question_ids = IdAllocator('q')
+result_ids = IdAllocator('r')
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from config import IMAGE_MAX_DIMENSION, IMAGE_QUALITY, IMAGE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# عمليات Pillow الثقيلة (فك الضغط والتصغير والضغط) تحرر الـ GIL، فتكفي الخيوط
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image')
+
+
+def process_image(data, max_dimension=IMAGE_MAX_DIMENSION, quality=IMAGE_QUALITY):
+    """تصغير الصورة إلى max_dimension وإعادة ضغطها، ويعيد (البايتات، بصمة SHA-256)"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow غير مثبتة، تُحفظ الصورة كما هي")
+        return data, hashlib.sha256(data).hexdigest()
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        processed = output.getvalue()
+
+    # لا فائدة من نسخة أكبر من الأصل إذا كان الأصل ضمن الحدود
+    if len(processed) >= len(data) and data[:2] == b'\xff\xd8':
+        with Image.open(io.BytesIO(data)) as original:
+            if max(original.size) <= max_dimension:
+                processed = data
+
+    return processed, hashlib.sha256(processed).hexdigest()
+
+
+def _write_once(path, data):
+    """كتابة الملف إن لم يكن موجوداً؛ الصورة المكررة تُخزن مرة واحدة"""
+    if os.path.exists(path):
+        return False
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # ملف مؤقت فريد لكل كتابة، فرفعان متزامنان لنفس الصورة لا يتشاركان ملفاً واحداً
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.jpg', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+async def store_question_photo(data, directory='questions'):
+    """معالجة الصورة في مجمع العمال وحفظها باسم بصمتها، ويعيد المسار"""
+    loop = asyncio.get_running_loop()
+    processed, digest = await loop.run_in_executor(_executor, process_image, data)
+
+    path = os.path.join(directory, f"{digest[:32]}.jpg")
+    written = await loop.run_in_executor(_executor, _write_once, path, processed)
+    logger.info(
+        f"صورة سؤال {path}: {len(data)} ← {len(processed)} بايت"
+        + ("" if written else " (موجودة مسبقاً)")
+    )
+    return path
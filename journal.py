@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+
+from metrics import storage_read_bytes, storage_written_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def iter_journal(path):
+    """قراءة سجلات الملف سطراً سطراً دون تحميله كاملاً
+
+    السطر الأخير الناقص (انقطاع أثناء الكتابة) يُتجاهل.
+    """
+    if not os.path.exists(path):
+        return
+
+    file_label = os.path.basename(path)
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                logger.warning(f"تجاهل سطر ناقص في نهاية {path}")
+                break
+            storage_read_bytes.inc(len(line), file=file_label)
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"تجاهل سطر تالف في {path}")
+
+
+def compacting_path(path):
+    """الملف الذي يُنقل إليه السجل أثناء دمجه في اللقطة"""
+    return f"{path}.compacting"
+
+
+def iter_pending(path):
+    """السجلات التي لم تُحذف بعد الدمج: السجل قيد الدمج أولاً ثم السجل الحالي"""
+    yield from iter_journal(compacting_path(path))
+    yield from iter_journal(path)
+
+
+class Journal:
+    """سجل JSON Lines يُضاف إليه فقط
+
+    كل سجل سطر مستقل، فتكلفة الإضافة ثابتة ولا يمكن لانقطاع أثناء الكتابة
+    أن يفسد السجلات السابقة. سياسة fsync:
+      always   - مزامنة القرص بعد كل سجل (الأكثر أماناً)
+      interval - خيط خلفي يزامن كل fsync_interval ثانية إن أُضيف شيء، فلا يُفقد
+                 أكثر من آخر fsync_interval ثانية حتى إن توقفت الإضافة
+      never    - الاعتماد على نظام التشغيل
+
+    الدمج ينقل السجل إلى compacting_path ويبدأ سجلاً جديداً (rotate)، فتُكتب
+    اللقطة دون إيقاف الإضافة، ثم يُحذف الملف المنقول (discard_compacted).
+    """
+
+    def __init__(self, path, fsync_policy='always', fsync_interval=1.0):
+        self.path = path
+        self.compacting_path = compacting_path(path)
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._repair()
+        self.count = self._count_records()
+        self._file = open(path, 'ab')
+        self._unsynced = False
+
+        self._stop_event = threading.Event()
+        self._syncer = None
+        if fsync_policy == 'interval':
+            self._syncer = threading.Thread(target=self._sync_loop, name='journal-fsync', daemon=True)
+            self._syncer.start()
+
+    def _count_records(self):
+        """عدد السجلات بعد القص: سطر لكل سجل، فيكفي عد الأسطر دون تحليل JSON"""
+        if not os.path.exists(self.path):
+            return 0
+
+        count = 0
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                count += chunk.count(b'\n')
+                storage_read_bytes.inc(len(chunk), file=os.path.basename(self.path))
+        return count
+
+    def _repair(self):
+        """قص السطر الناقص من النهاية حتى لا تلتصق به الإضافة التالية"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+
+            # البحث عن آخر سطر كامل
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    break
+            else:
+                f.truncate(0)
+        logger.warning(f"تم قص سطر ناقص من نهاية {self.path}")
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync_policy == 'always':
+                os.fsync(self._file.fileno())
+            else:
+                self._unsynced = True
+            self.count += 1
+        storage_written_bytes.inc(len(line), file=os.path.basename(self.path))
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.fsync_interval):
+            try:
+                with self._lock:
+                    if self._unsynced and not self._file.closed:
+                        os.fsync(self._file.fileno())
+                        self._unsynced = False
+            except OSError as e:
+                logger.error(f"تعذرت مزامنة {self.path} وستُعاد المحاولة: {e}")
+
+    def __iter__(self):
+        return iter_pending(self.path)
+
+    def rotate(self):
+        """نقل السجل إلى compacting_path وبدء سجل فارغ للإضافات التالية"""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.path, self.compacting_path)
+            self._file = open(self.path, 'ab')
+            self._unsynced = False
+            self.count = 0
+
+    def discard_compacted(self):
+        """حذف السجل المنقول بعد حفظ محتواه في اللقطة"""
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+
+    def close(self):
+        self._stop_event.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
+
+from config import LIVE_EXAM_CONCURRENCY, LIVE_PROGRESS_INTERVAL
+from models import Answer
+from question_render import check_answer, render_cache
+from rate_limiter import BULK_SEND
+
+logger = logging.getLogger(__name__)
+
+
+async def fan_out(send, recipients, concurrency=LIVE_EXAM_CONCURRENCY):
+    """تنفيذ send(recipient) لكل المستلمين بالتوازي، ويعيد {المستلم: الخطأ} لما تعذر
+
+    عدد محدود من العمال يسحب من نفس القائمة، فيبقى الدلو الكلي في OutboundLimiter
+    مشغولاً دون انتظار ذهاب كل طلب وعودته ودون آلاف الطلبات المعلقة في الذاكرة.
+    """
+    failures = {}
+    pending = iter(recipients)
+
+    async def worker():
+        for recipient in pending:
+            try:
+                await send(recipient)
+            except TelegramError as e:
+                failures[recipient] = e
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(recipients))))))
+    return failures
+
+
+class ThrottledMessage:
+    """رسالة تُعدل بحد أقصى مرة كل interval ثانية مهما كثرت التغييرات
+
+    touch() تعلم أن المحتوى تغير فقط؛ مهمة واحدة تنشر آخر محتوى عند حلول الموعد.
+    """
+
+    def __init__(self, publish, interval=LIVE_PROGRESS_INTERVAL):
+        self.publish = publish
+        self.interval = interval
+        self._dirty = False
+        self._published_at = 0.0
+        self._task = None
+
+    def touch(self):
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._dirty:
+            wait = self._published_at + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty = False
+            self._published_at = time.monotonic()
+            try:
+                await self.publish()
+            except TelegramError as e:
+                logger.warning(f"تعذر تحديث رسالة التقدم: {e}")
+
+    async def close(self):
+        """إيقاف التحديثات المؤجلة (الرسالة النهائية تُرسل بعدها مباشرة)"""
+        self._dirty = False
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+@dataclass(slots=True)
+class Participant:
+    """طالب في الاختبار المباشر: رسالته وموقعه وإجاباته"""
+    message_id: int = None
+    current: int = 0
+    score: int = 0
+    shown_at: float = 0.0
+    answers: list = field(default_factory=list)
+
+
+class LiveExam:
+    """اختبار واحد يُرسل لكل طلاب الفصل في نفس اللحظة، وتُجمع إجاباته في الذاكرة
+
+    كل الطلاب يرون نفس الأسئلة بنفس الترتيب ويتقدم كل منهم بسرعته. أزرار
+    الإجابة تحمل معرف المعلم ورقم السؤال: live:<teacher_id>:<index>:<answer>
+    """
+
+    def __init__(self, teacher_id, questions, roster):
+        self.teacher_id = teacher_id
+        self.questions = questions
+        self.participants = {student_id: Participant() for student_id in roster}
+        self.roster_size = len(self.participants)
+        self.started_at = time.time()
+        self.delivered = 0
+        self.failed = 0
+        self.finished = 0
+        self.answer_counts = [Counter() for _ in questions]
+        self.correct_counts = [0] * len(questions)
+        self._keyboards = [self._keyboard(index) for index in range(len(questions))]
+        # تضبطها المعالجات عند البدء: رسالة المعلم وتحديثها المؤجل ومهمة الإرسال ومؤقت الإنهاء
+        self.message = None
+        self.progress = None
+        self.delivery = None
+        self.timer = None
+
+    def _keyboard(self, index):
+        question = self.questions[index]
+        buttons = [
+            InlineKeyboardButton(label, callback_data=f"live:{self.teacher_id}:{index}:{value}")
+            for label, value in render_cache.get(question).options
+        ]
+        rows = [buttons] if question['type'] == 'true_false' else [[button] for button in buttons]
+        return InlineKeyboardMarkup(rows)
+
+    def question_view(self, index):
+        """نص السؤال index وأزراره (نفس الكائن لكل الطلاب)"""
+        body = render_cache.get(self.questions[index]).body
+        return f"📡 اختبار مباشر\nالسؤال {index + 1} من {len(self.questions)}\n\n{body}", self._keyboards[index]
+
+    def record(self, student_id, index, answer):
+        """تسجيل إجابة الطالب عن السؤال index، ويعيد الطالب أو None لزر قديم أو مكرر"""
+        participant = self.participants.get(student_id)
+        if participant is None or participant.current != index or index >= len(self.questions):
+            return None
+
+        question = self.questions[index]
+        is_correct = check_answer(question, answer)
+        participant.answers.append(Answer.for_question(question, answer, is_correct, participant.shown_at, time.time()))
+        self.answer_counts[index][answer] += 1
+        if is_correct:
+            participant.score += 1
+            self.correct_counts[index] += 1
+
+        participant.current += 1
+        participant.shown_at = time.time()
+        if participant.current == len(self.questions):
+            self.finished += 1
+        return participant
+
+    def drop(self, student_id):
+        """استبعاد طالب تعذر الإرسال إليه (حظر البوت مثلاً)"""
+        if self.participants.pop(student_id, None) is not None:
+            self.failed += 1
+
+    @property
+    def complete(self):
+        """أنهى كل من وصله الاختبار كل الأسئلة"""
+        return self.delivered + self.failed == self.roster_size and self.finished == len(self.participants)
+
+    def progress_text(self):
+        started = sum(1 for participant in self.participants.values() if participant.answers)
+        text = f"📡 اختبار مباشر - {len(self.questions)} أسئلة\n\n"
+        text += f"👥 الطلاب: {self.roster_size}\n"
+        text += f"📨 وصل إلى: {self.delivered}"
+        if self.failed:
+            text += f" (تعذر: {self.failed})"
+        text += f"\n✍️ بدأوا: {started} | أنهوا: {self.finished}\n"
+        text += f"⏱ منذ {int(time.time() - self.started_at)} ثانية\n\n"
+        text += self.question_summary()
+        return text
+
+    def question_summary(self):
+        lines = []
+        for index, counts in enumerate(self.answer_counts):
+            answered = sum(counts.values())
+            if answered:
+                lines.append(f"السؤال {index + 1}: ✅ {self.correct_counts[index]}/{answered}")
+            else:
+                lines.append(f"السؤال {index + 1}: -")
+        return '\n'.join(lines)
+
+    def result_text(self, participant):
+        total = len(self.questions)
+        text = "🏁 انتهى الاختبار المباشر!\n\n"
+        text += f"🎯 النتيجة: {participant.score}/{total}\n"
+        text += f"📊 النسبة: {participant.score / total * 100:.1f}%\n"
+        if participant.current < total:
+            text += f"⚠️ أجبت عن {participant.current} من {total} أسئلة\n"
+        return text
+
+    def summary_text(self):
+        answered = [participant for participant in self.participants.values() if participant.answers]
+        text = "🏁 انتهى الاختبار المباشر!\n\n"
+        text += f"👥 شارك: {len(answered)} من {self.roster_size}\n"
+        if answered:
+            average = sum(participant.score for participant in answered) / len(answered)
+            text += f"🎯 متوسط الدرجة: {average:.1f}/{len(self.questions)}\n"
+        text += "\n" + self.question_summary()
+        return text
+
+
+async def deliver(bot, exam, on_progress):
+    """إرسال السؤال الأول لكل الطلاب بالتوازي كإرسال جماعي لا يزاحم الردود التفاعلية"""
+    text, reply_markup = exam.question_view(0)
+
+    async def send(student_id):
+        message = await bot.send_message(
+            chat_id=student_id, text=text, reply_markup=reply_markup, rate_limit_args=BULK_SEND
+        )
+        participant = exam.participants.get(student_id)
+        if participant is not None:
+            participant.message_id = message.message_id
+            participant.shown_at = time.time()
+        exam.delivered += 1
+        on_progress()
+
+    failures = await fan_out(send, list(exam.participants))
+    for student_id, error in failures.items():
+        logger.info(f"تعذر إرسال الاختبار المباشر إلى {student_id}: {error}")
+        exam.drop(student_id)
+    on_progress()
+
+
+async def announce_results(bot, exam):
+    """تعديل رسالة كل طالب وصله الاختبار إلى نتيجته"""
+    recipients = [
+        student_id for student_id, participant in exam.participants.items()
+        if participant.message_id is not None
+    ]
+
+    async def send(student_id):
+        participant = exam.participants[student_id]
+        await bot.edit_message_text(
+            chat_id=student_id, message_id=participant.message_id,
+            text=exam.result_text(participant), rate_limit_args=BULK_SEND
+        )
+
+    await fan_out(send, recipients)
@@ -0,0 +1,186 @@
+import bisect
+import functools
+import hmac
+import threading
+import time
+from http import HTTPStatus
+
+from config import METRICS_TOKEN, PROFILER_ENABLED
+from http_server import Response
+
+# حدود فئات المدرجات بالثواني (من 1 ملي ثانية إلى 10 ثوانٍ)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value, *extra in self._samples():
+            lines.append(f"{name}{_format_labels(self.labels, key, *extra)} {value}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """قيمة لحظية؛ set_function تحسبها عند كل قراءة لـ /metrics بدل تحديثها باستمرار
+
+    الدالة تعيد رقماً، أو قاموساً {(قيم التسميات): رقم} إذا كان للمقياس تسميات.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+        value = self._function()
+        values = value if isinstance(value, dict) else {(): value}
+        return [(self.name, key, item) for key, item in values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # عدادات كل فئة (غير تراكمية) ثم المجموع
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, cumulative, (('le', bound),)))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+# === مقاييس البوت ===
+handler_seconds = Histogram('bot_handler_seconds', 'زمن تنفيذ معالج التحديث', ['handler'])
+handler_errors = Counter('bot_handler_errors_total', 'استثناءات المعالجات', ['handler'])
+db_call_seconds = Histogram('bot_db_call_seconds', 'زمن تنفيذ دالة التخزين في خيط التخزين', ['method'])
+db_wait_seconds = Histogram('bot_db_wait_seconds', 'انتظار خيط تخزين متاح', ['method'])
+storage_read_bytes = Counter('bot_storage_read_bytes_total', 'بايتات مقروءة من ملفات التخزين', ['file'])
+storage_written_bytes = Counter('bot_storage_written_bytes_total', 'بايتات مكتوبة في ملفات التخزين', ['file'])
+storage_file_bytes = Gauge('bot_storage_file_bytes', 'حجم ملفات التخزين على القرص', ['file'])
+api_request_seconds = Histogram('bot_api_request_seconds', 'زمن طلبات Bot API', ['endpoint'])
+api_wait_seconds = Histogram('bot_api_rate_limit_wait_seconds', 'انتظار حدود الإرسال', ['priority'])
+api_retry_after = Counter('bot_api_retry_after_total', 'ردود 429 من تيليجرام', ['endpoint'])
+user_states = Gauge('bot_user_states', 'عدد جلسات المستخدمين في مخزن الحالة')
+shard_updates = Counter('bot_shard_updates_total', 'التحديثات الموجهة إلى كل عامل', ['shard'])
+startup_seconds = Gauge('bot_startup_seconds', 'زمن انتهاء كل مرحلة تشغيل منذ بدء العملية', ['phase'])
+ready_gauge = Gauge('bot_ready', 'اكتمل التحميل المسبق والبوت جاهز (1) أو ما زال يبدأ (0)')
+
+REGISTRY = [
+    handler_seconds, handler_errors, db_call_seconds, db_wait_seconds,
+    storage_read_bytes, storage_written_bytes, storage_file_bytes,
+    api_request_seconds, api_wait_seconds, api_retry_after, user_states, shard_updates,
+    startup_seconds, ready_gauge
+]
+
+
+def render():
+    """كل المقاييس بصيغة Prometheus النصية"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+def instrument_handlers(application):
+    """قياس زمن كل معالج مسجل وعدد استثناءاته حسب اسم دالته"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = _timed_handler(handler.callback)
+
+
+def _timed_handler(callback):
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def timed(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, handler=name)
+    return timed
+
+
+def add_routes(server):
+    """تسجيل /metrics (و /debug/profile إذا كان المحلل مفعلاً) في خادم HTTP"""
+    def authorized(request):
+        if not METRICS_TOKEN:
+            return True
+        expected = f"Bearer {METRICS_TOKEN}"
+        return hmac.compare_digest(request.headers.get('authorization', '').encode(), expected.encode())
+
+    async def metrics(request):
+        if not authorized(request):
+            return Response(HTTPStatus.UNAUTHORIZED)
+        return Response(HTTPStatus.OK, render(), 'text/plain; version=0.0.4; charset=utf-8')
+
+    server.route('GET', '/metrics', metrics)
+
+    if PROFILER_ENABLED:
+        from profiler import profile_handler
+        server.route('GET', '/debug/profile', profile_handler(authorized))
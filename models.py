@@ -0,0 +1,87 @@
+from dataclasses import dataclass, field, fields
+
+
+def _to_dict(record):
+    return {item.name: getattr(record, item.name) for item in fields(record)}
+
+
+@dataclass(slots=True)
+class Question:
+    """سؤال جديد قبل حفظه؛ يُخزن كقاموس JSON عبر to_dict()"""
+    type: str
+    question: str = ''
+    correct_answer: str = ''
+    options: str = ''
+    photo: str = ''
+    photo_file_id: str = ''
+    teacher_name: str = ''
+
+    def to_dict(self):
+        return _to_dict(self)
+
+
+@dataclass(slots=True)
+class Answer:
+    """إجابة الطالب عن سؤال واحد كما تُحفظ في سجل النتائج"""
+    question_id: str
+    question_type: str
+    user_answer: str
+    correct_answer: str
+    is_correct: bool
+    elapsed: float = None
+
+    @classmethod
+    def for_question(cls, question, user_answer, is_correct, shown_at, now):
+        """إجابة user_answer (أو None عند انتهاء المهلة) عن السؤال المعروض منذ shown_at"""
+        return cls(
+            question_id=question.get('id'),
+            question_type=question['type'],
+            user_answer=user_answer,
+            correct_answer=question.get('correct_answer', ''),
+            is_correct=is_correct,
+            elapsed=round(now - shown_at, 2) if shown_at else None
+        )
+
+    def to_dict(self):
+        return _to_dict(self)
+
+
+@dataclass(slots=True)
+class QuizSession:
+    """اختبار جارٍ لطالب: معرفات الأسئلة فقط، وتُقرأ الأسئلة نفسها من مخزن الأسئلة المشترك"""
+    question_ids: tuple
+    started_at: float
+    deadline: float = None
+    current: int = 0
+    score: int = 0
+    answers: list = field(default_factory=list)
+    question_shown_at: float = None
+    question_deadline: float = None
+    waiting_for_text: bool = False
+    chat_id: int = None
+
+    @property
+    def total(self):
+        return len(self.question_ids)
+
+    @property
+    def current_question_id(self):
+        return self.question_ids[self.current]
+
+    def nearest_deadline(self):
+        """أقرب مهلة: نهاية السؤال المعروض أو نهاية الاختبار كله، أو None"""
+        deadlines = [d for d in (self.deadline, self.question_deadline) if d]
+        return min(deadlines) if deadlines else None
+
+    def to_dict(self):
+        data = _to_dict(self)
+        data['answers'] = [answer.to_dict() for answer in self.answers]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{
+            **data,
+            'question_ids': tuple(data['question_ids']),
+            'answers': [Answer(**answer) for answer in data['answers']]
+        })
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+
+from http_server import Response
+
+# أطول مدة مسموحة لجلسة تحليل واحدة بالثواني
+MAX_SECONDS = 60
+
+# جلسة تحليل واحدة في نفس الوقت
+_running = threading.Lock()
+
+
+def sample_stacks(seconds, interval=0.005):
+    """أخذ عينات دورية من مكدسات كل الخيوط
+
+    يعيد Counter بالمكدسات المطوية (الخيط;الدالة الخارجية;...;الداخلية)،
+    وهي الصيغة التي يقرؤها flamegraph.pl و speedscope مباشرة.
+    """
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    current = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == current:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stacks[';'.join([names.get(ident, str(ident)), *reversed(parts)])] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def profile_handler(authorized):
+    """معالج /debug/profile?seconds=N يعيد المكدسات المطوية مع عدد عيناتها"""
+    async def profile(request):
+        if not authorized(request):
+            return Response(HTTPStatus.UNAUTHORIZED)
+
+        try:
+            seconds = min(float(request.query.get('seconds', ['10'])[0]), MAX_SECONDS)
+        except ValueError:
+            return Response(HTTPStatus.BAD_REQUEST)
+
+        if not _running.acquire(blocking=False):
+            return Response(HTTPStatus.CONFLICT, 'جلسة تحليل أخرى قيد التشغيل')
+        try:
+            # العينات تؤخذ من خيط منفصل حتى تظهر حلقة الأحداث كما هي
+            stacks = await asyncio.to_thread(sample_stacks, seconds)
+        finally:
+            _running.release()
+
+        return Response(HTTPStatus.OK, '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()))
+    return profile
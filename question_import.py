@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import os
+
+from config import QUESTION_TYPES
+from models import Question
+
+# قبول اسم النوع بالعربية أيضاً، مثل "صح أو خطأ"
+_TYPE_NAMES = {**{key: key for key in QUESTION_TYPES}, **{name: key for key, name in QUESTION_TYPES.items()}}
+
+_TRUE_FALSE = {
+    'صح': 'صح', 'true': 'صح', '1': 'صح', 'نعم': 'صح',
+    'خطأ': 'خطأ', 'false': 'خطأ', '0': 'خطأ', 'لا': 'خطأ'
+}
+
+
+class RowError(ValueError):
+    """صف غير صالح في ملف الاستيراد (أو ملف غير صالح كلياً)"""
+
+
+def iter_rows(stream, file_name):
+    """قراءة صفوف الملف واحداً تلو الآخر مع رقم كل صف
+
+    CSV و JSON Lines تُقرأ كتدفق؛ ملف JSON العادي يجب أن يكون مصفوفة،
+    ويُحلل كاملاً في الذاكرة (حجم الملف محدود بـ MAX_IMPORT_SIZE).
+    """
+    extension = os.path.splitext(file_name.lower())[1]
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if extension == '.csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif extension in ('.jsonl', '.ndjson'):
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+    elif extension == '.json':
+        data = json.load(text)
+        if not isinstance(data, list):
+            raise RowError("ملف JSON يجب أن يحتوي على قائمة أسئلة")
+        for row_number, row in enumerate(data, 1):
+            yield row_number, row
+    else:
+        raise RowError("صيغة غير مدعومة، استخدم CSV أو JSON أو JSONL")
+
+
+def _option_letter(option):
+    return option.split(')')[0] if ')' in option else option[0]
+
+
+def validate_row(row):
+    """تحويل صف إلى سؤال بنفس شكل الأسئلة المضافة من المحادثة"""
+    if not isinstance(row, dict):
+        raise RowError("صف غير صالح")
+
+    row = {str(key).strip().lower(): ('' if value is None else str(value).strip()) for key, value in row.items()}
+
+    question_type = _TYPE_NAMES.get(row.get('type', ''))
+    if question_type is None:
+        raise RowError(f"نوع غير معروف: {row.get('type', '')}")
+
+    question = row.get('question', '')
+    photo_file_id = row.get('photo_file_id', '')
+    if not question and not photo_file_id:
+        raise RowError("نص السؤال فارغ")
+
+    correct_answer = row.get('correct_answer', '')
+    question_data = Question(type=question_type, question=question, photo_file_id=photo_file_id)
+
+    if question_type == 'true_false':
+        correct = _TRUE_FALSE.get(correct_answer.lower())
+        if correct is None:
+            raise RowError("الإجابة يجب أن تكون صح أو خطأ")
+        question_data.correct_answer = correct
+
+    elif question_type == 'multiple_choice':
+        # الخيارات في سطور منفصلة أو مفصولة بـ |
+        options = row.get('options', '')
+        if '\n' not in options:
+            options = options.replace('|', '\n')
+        lines = [line.strip() for line in options.split('\n') if line.strip()]
+        if not 2 <= len(lines) <= 4:
+            raise RowError("يجب أن يكون عدد الخيارات بين 2 و 4")
+
+        correct = correct_answer.lower()
+        if correct not in {_option_letter(line).lower() for line in lines}:
+            raise RowError(f"الإجابة {correct_answer} ليست من حروف الخيارات")
+        question_data.options = '\n'.join(lines)
+        question_data.correct_answer = correct
+
+    else:
+        if not correct_answer:
+            raise RowError("الإجابة الصحيحة فارغة")
+        question_data.correct_answer = correct_answer.lower()
+
+    return question_data
+
+
+def parse_questions(stream, file_name, teacher_name=''):
+    """قراءة الملف والتحقق من كل صف، ويعيد (الأسئلة الصالحة، [(رقم الصف، الخطأ)])"""
+    questions = []
+    errors = []
+    for row_number, row in iter_rows(stream, file_name):
+        try:
+            question_data = validate_row(row)
+        except RowError as e:
+            errors.append((row_number, str(e)))
+            continue
+        question_data.teacher_name = teacher_name
+        questions.append(question_data.to_dict())
+    return questions, errors
+
+
+def parse_questions_file(path, file_name, teacher_name=''):
+    """parse_questions من ملف على القرص، و file_name الاسم الأصلي لمعرفة الصيغة"""
+    with open(path, 'rb') as stream:
+        return parse_questions(stream, file_name, teacher_name)
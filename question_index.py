@@ -0,0 +1,96 @@
+import random
+from collections import defaultdict
+
+
+class QuestionIndex:
+    """فهرس الأسئلة في الذاكرة للسحب العشوائي
+
+    يحتفظ بقوائم معرفات حسب النوع والمعلم، فيكلف سحب k سؤال O(k)
+    بدلاً من قراءة بنك الأسئلة كاملاً في كل اختبار.
+    """
+
+    def __init__(self, questions=()):
+        self._questions = {}
+        self._ids = []
+        self._by_type = defaultdict(list)
+        self._by_teacher = defaultdict(list)
+        self._by_teacher_type = defaultdict(list)
+        for question in questions:
+            self.add(question)
+
+    def add(self, question):
+        question_id = question['id']
+        if question_id in self._questions:
+            self._questions[question_id] = question
+            return
+
+        teacher_id = str(question.get('teacher_id'))
+        question_type = question.get('type')
+        self._questions[question_id] = question
+        self._ids.append(question_id)
+        self._by_type[question_type].append(question_id)
+        self._by_teacher[teacher_id].append(question_id)
+        self._by_teacher_type[(teacher_id, question_type)].append(question_id)
+
+    def update(self, question_id, fields):
+        question = self._questions.get(question_id)
+        if question is not None:
+            question.update(fields)
+
+    def get(self, question_id):
+        return self._questions.get(question_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _pool(self, teacher_id=None, question_type=None):
+        if teacher_id is None and question_type is None:
+            return self._ids
+        if teacher_id is None:
+            return self._by_type.get(question_type, [])
+        if question_type is None:
+            return self._by_teacher.get(str(teacher_id), [])
+        return self._by_teacher_type.get((str(teacher_id), question_type), [])
+
+    def count(self, teacher_id=None, question_type=None):
+        return len(self._pool(teacher_id, question_type))
+
+    def by_teacher(self, teacher_id):
+        """أسئلة المعلم بترتيب الإضافة"""
+        return [self._questions[qid] for qid in self._by_teacher.get(str(teacher_id), [])]
+
+    def page(self, teacher_id, offset=0, limit=10, question_type=None, search=None):
+        """شريحة من أسئلة المعلم بترتيب الإضافة، ويعيد (الأسئلة، العدد الكلي)
+
+        دون بحث تكلف الصفحة O(limit) مهما كبر بنك الأسئلة؛ البحث يمر على
+        أسئلة المعلم (من النوع المطلوب فقط) مرة واحدة.
+        """
+        ids = self._pool(teacher_id, question_type)
+        if search:
+            needle = search.casefold()
+            ids = [qid for qid in ids if needle in (self._questions[qid].get('question') or '').casefold()]
+        return [self._questions[qid] for qid in ids[offset:offset + limit]], len(ids)
+
+    def sample(self, k, teacher_id=None, question_type=None, exclude=()):
+        """سحب حتى k سؤال عشوائي دون تكرار"""
+        pool = self._pool(teacher_id, question_type)
+        wanted = min(len(pool), k + len(exclude))
+        picked = [qid for qid in random.sample(pool, wanted) if qid not in exclude]
+        return [self._questions[qid] for qid in picked[:k]]
+
+    def sample_mix(self, counts, teacher_id=None):
+        """سحب طبقي حسب النوع، مثل {'multiple_choice': 3, 'true_false': 2}
+
+        إذا لم يكفِ نوع ما يُكمل العدد من بقية الأسئلة.
+        """
+        chosen = []
+        for question_type, k in counts.items():
+            chosen.extend(self.sample(k, teacher_id, question_type))
+
+        missing = sum(counts.values()) - len(chosen)
+        if missing > 0:
+            exclude = {q['id'] for q in chosen}
+            chosen.extend(self.sample(missing, teacher_id, exclude=exclude))
+
+        random.shuffle(chosen)
+        return chosen
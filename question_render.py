@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import re
+import threading
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import RENDER_CACHE_SIZE
+
+
+@dataclass(frozen=True)
+class RenderedQuestion:
+    """بطاقة السؤال الجاهزة للعرض: النص دون رأس "السؤال i من n" ولوحة الأزرار"""
+    body: str
+    options: tuple
+    reply_markup: InlineKeyboardMarkup = None
+    expects_text: bool = False
+
+
+def compile_question(question):
+    """تحويل سجل السؤال إلى بطاقة عرض ثابتة"""
+    body = f"{question['question']}\n\n" if question.get('question') else ''
+
+    if question['type'] == 'true_false':
+        options = (('صح', 'true'), ('خطأ', 'false'))
+        keyboard = [[InlineKeyboardButton(label, callback_data=f'ans_{value}') for label, value in options]]
+        return RenderedQuestion(body + "اختر الإجابة الصحيحة:", options, InlineKeyboardMarkup(keyboard))
+
+    if question['type'] == 'multiple_choice' and question.get('options'):
+        options = []
+        for option in question['options'].split('\n')[:4]:  # الحد الأقصى 4 خيارات
+            if option.strip():
+                option_letter = option.split(')')[0] if ')' in option else option[0]
+                options.append((option.strip(), option_letter))
+        keyboard = [[InlineKeyboardButton(label, callback_data=f'ans_{letter}')] for label, letter in options]
+        return RenderedQuestion(body + "اختر الإجابة الصحيحة:", tuple(options), InlineKeyboardMarkup(keyboard))
+
+    return RenderedQuestion(body + "أرسل إجابتك:", (), None, expects_text=True)
+
+
+# التشكيل والتطويل لا يغيران الإجابة المكتوبة، وكذلك أشكال الألف والياء
+_DIACRITICS = re.compile('[\u064b-\u0652\u0640]')
+_LETTER_FORMS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي'})
+
+
+def normalize_text_answer(text):
+    """توحيد الإجابة المكتوبة قبل مقارنتها: المسافات وحالة الأحرف والتشكيل"""
+    text = _DIACRITICS.sub('', text).translate(_LETTER_FORMS)
+    return ' '.join(text.split()).casefold()
+
+
+def check_answer(question, user_answer):
+    """هل user_answer (قيمة الزر أو النص المكتوب) هي الإجابة الصحيحة للسؤال"""
+    correct_answer = question.get('correct_answer', '').lower()
+
+    if question['type'] == 'true_false':
+        # الأزرار ترسل true/false بينما الإجابة المحفوظة صح/خطأ
+        correct_map = {'صح': 'true', 'خطأ': 'false'}
+        return user_answer == correct_map.get(correct_answer, '')
+    if question['type'] == 'multiple_choice' and question.get('options'):
+        return user_answer.lower() == correct_answer
+    # الأسئلة بلا أزرار (expects_text) تُجاب بنص مكتوب
+    return bool(correct_answer) and normalize_text_answer(user_answer) == normalize_text_answer(correct_answer)
+
+
+def _card_source(question):
+    """الحقول التي تُبنى منها البطاقة؛ تغير أي منها يعني بطاقة جديدة"""
+    return question['type'], question.get('question'), question.get('options')
+
+
+class RenderCache:
+    """ذاكرة LRU محدودة الحجم لبطاقات الأسئلة حسب معرف السؤال
+
+    كل بطاقة تُحفظ مع الحقول التي بُنيت منها، فالسؤال المعدل (من أي مسار أو
+    عملية أخرى) يُبنى من جديد عند طلبه دون حاجة لإبطال صريح.
+    """
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question):
+        question_id = question.get('id')
+        if question_id is None:
+            return compile_question(question)
+
+        source = _card_source(question)
+        with self._lock:
+            entry = self._cards.get(question_id)
+            if entry is not None and entry[0] == source:
+                self._cards.move_to_end(question_id)
+                return entry[1]
+
+        card = compile_question(question)
+        with self._lock:
+            self._cards[question_id] = (source, card)
+            self._cards.move_to_end(question_id)
+            while len(self._cards) > self.maxsize:
+                self._cards.popitem(last=False)
+        return card
+
+    def __len__(self):
+        return len(self._cards)
+
+
+render_cache = RenderCache()
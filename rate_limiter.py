@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    RATE_LIMIT_GLOBAL, RATE_LIMIT_CHAT, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_GROUP, RATE_LIMIT_RETRIES,
+    RATE_LIMIT_COOLDOWN
+)
+from metrics import api_request_seconds, api_retry_after, api_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+# أولوية الطلب: الردود على المستخدم أولاً ثم الإرسال الجماعي
+INTERACTIVE = 0
+BULK = 1
+
+# تُمرر عبر rate_limit_args للإرسال الجماعي حتى لا يزاحم الردود
+BULK_SEND = {'priority': BULK}
+
+_PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+# طلبات الرسائل فقط هي الخاضعة لحدود تيليجرام (لا answerCallbackQuery ولا getFile)
+_LIMITED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+
+class TokenBucket:
+    """دلو رموز: rate رمز في الثانية بحد أقصى capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """الزمن المتبقي حتى يتوفر رمز (0 إذا كان متاحاً الآن)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class _PendingEdit:
+    """تعديل ينتظر دوره؛ successor هو التعديل الأحدث للرسالة نفسها إن وصل"""
+    __slots__ = ('future', 'successor')
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.successor = None
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """جدولة كل طلبات الرسائل الصادرة إلى تيليجرام
+
+    - دلو رموز كلي ودلو لكل محادثة (المجموعات بحد أقل من المحادثات الخاصة)
+    - الطلبات التفاعلية تسبق الإرسال الجماعي (rate_limit_args=BULK_SEND)
+    - عند RetryAfter يُوقف دلو المحادثة المدة المطلوبة والدلو الكلي مهلة قصيرة
+      (global_cooldown بحد أقصى)، فتتراجع العملية كلها إن كان التجاوز للحد الكلي
+    - تعديلات الرسالة نفسها المنتظرة تُدمج: يُرسل الأحدث فقط ويأخذ الأقدم نتيجته
+    """
+
+    def __init__(self, global_rate=RATE_LIMIT_GLOBAL, chat_rate=RATE_LIMIT_CHAT,
+                 chat_burst=RATE_LIMIT_CHAT_BURST, group_rate=RATE_LIMIT_GROUP,
+                 max_retries=RATE_LIMIT_RETRIES, global_cooldown=RATE_LIMIT_COOLDOWN, max_chats=4096):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.global_cooldown = global_cooldown
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._waiting = [0, 0]
+        self._edits = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        if chat_id is None:
+            return None
+
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # دلاء المحادثات الخاملة ممتلئة، فحذفها لا يغير شيئاً
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle(now)}
+
+            # معرفات المجموعات والقنوات سالبة أو @اسم
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (TokenBucket(self.group_rate, 1) if is_group
+                      else TokenBucket(self.chat_rate, self.chat_burst))
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority, superseded):
+        """انتظار رمز من الدلو الكلي ودلو المحادثة، ويعيد False إذا حل تعديل أحدث محله"""
+        self._waiting[priority] += 1
+        try:
+            while True:
+                if superseded():
+                    return False
+
+                chat_bucket = self._chat_bucket(chat_id)
+                now = time.monotonic()
+                wait = self._global.delay(now)
+                if chat_bucket is not None:
+                    wait = max(wait, chat_bucket.delay(now))
+                if wait <= 0 and priority == BULK and self._waiting[INTERACTIVE]:
+                    wait = 1 / self._global.rate
+
+                if wait <= 0:
+                    self._global.take()
+                    if chat_bucket is not None:
+                        chat_bucket.take()
+                    return True
+                await asyncio.sleep(wait)
+        finally:
+            self._waiting[priority] -= 1
+
+    @staticmethod
+    async def _call(callback, args, kwargs, endpoint):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        finally:
+            api_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(_LIMITED_PREFIXES):
+            return await self._call(callback, args, kwargs, endpoint)
+
+        priority = (rate_limit_args or {}).get('priority', INTERACTIVE)
+        chat_id = data.get('chat_id')
+
+        edit_key = edit = None
+        if endpoint.startswith('edit'):
+            edit_key = (endpoint, chat_id, data.get('message_id'), data.get('inline_message_id'))
+            edit = _PendingEdit()
+            previous = self._edits.get(edit_key)
+            if previous is not None:
+                previous.successor = edit
+            self._edits[edit_key] = edit
+
+        def superseded():
+            return edit is not None and edit.successor is not None
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                waiting_since = time.perf_counter()
+                acquired = await self._acquire(chat_id, priority, superseded)
+                api_wait_seconds.observe(time.perf_counter() - waiting_since, priority=_PRIORITY_NAMES[priority])
+                if not acquired:
+                    # التعديل الأحدث يحمل المحتوى النهائي للرسالة
+                    result = await edit.successor.future
+                    break
+
+                try:
+                    result = await self._call(callback, args, kwargs, endpoint)
+                    break
+                except RetryAfter as e:
+                    api_retry_after.inc(endpoint=endpoint)
+                    # الإيقاف حتى عند نفاد المحاولات، فالطلبات التالية تخضع للحد نفسه
+                    chat_bucket = self._chat_bucket(chat_id)
+                    if chat_bucket is not None:
+                        chat_bucket.pause(e.retry_after)
+                    # لا يُعرف هل التجاوز لحد المحادثة أم للحد الكلي، فتتوقف بقية المحادثات
+                    # مهلة قصيرة، أو المدة كلها إن لم تكن هناك محادثة
+                    self._global.pause(e.retry_after if chat_bucket is None
+                                       else min(e.retry_after, self.global_cooldown))
+                    if attempt == self.max_retries:
+                        raise
+                    logger.warning(f"تجاوز حد الإرسال ({endpoint} إلى {chat_id})، انتظار {e.retry_after} ثانية")
+
+            if edit is not None:
+                edit.future.set_result(result)
+            return result
+
+        except BaseException as e:
+            if edit is not None and not edit.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    edit.future.cancel()
+                else:
+                    edit.future.set_exception(e)
+                    # لا ينتظر هذه النتيجة إلا التعديلات الأقدم المدمجة إن وجدت
+                    edit.future.exception()
+            raise
+
+        finally:
+            if edit is not None and self._edits.get(edit_key) is edit:
+                del self._edits[edit_key]
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import subprocess
+import sys
+
+from telegram import Bot, Update
+
+from config import (
+    ALLOWED_UPDATES, BOT_TOKEN, SHARDS, SHARD_SOCKET_DIR, STORAGE_BACKEND, WEBHOOK_URL, WEBHOOK_SECRET
+)
+from http_server import MAX_BODY_SIZE
+from metrics import shard_updates
+from startup import set_ready
+from webhook import create_update_server, run_with_server, stop_signal, webhook_url
+
+logger = logging.getLogger(__name__)
+
+# أنواع التحديثات التي تحمل المستخدم في from (أو user في poll_answer)
+_UPDATE_KINDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member',
+    'chat_member', 'chat_join_request', 'channel_post', 'edited_channel_post'
+)
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping و Veach)
+
+    يوزع المفاتيح بالتساوي، وعند زيادة العمال من n إلى n+1 ينتقل
+    1/(n+1) فقط من المستخدمين إلى العامل الجديد.
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def routing_key(data):
+    """معرف المستخدم صاحب التحديث، أو المحادثة إن لم يوجد مستخدم
+
+    إجابات الاختبار المباشر (live:<teacher_id>:...) تُوجه إلى عامل المعلم
+    لأن الاختبار وإجاباته في ذاكرة ذلك العامل. البيانات المزورة التي لا تحمل
+    معرفاً صالحاً تُوجه حسب المرسل كأي تحديث آخر، ولا يطابقها معالج الإجابة.
+    """
+    callback_data = (data.get('callback_query') or {}).get('data') or ''
+    if callback_data.startswith('live:'):
+        try:
+            return int(callback_data.split(':')[1])
+        except ValueError:
+            pass
+    for kind in _UPDATE_KINDS:
+        payload = data.get(kind)
+        if not isinstance(payload, dict):
+            continue
+        sender = payload.get('from') or payload.get('user')
+        if sender:
+            return int(sender['id'])
+        chat = payload.get('chat')
+        if chat:
+            return int(chat['id'])
+    return 0
+
+
+def socket_path(index, socket_dir=SHARD_SOCKET_DIR):
+    return os.path.join(socket_dir, f"shard-{index}.sock")
+
+
+class ShardServer:
+    """استقبال التحديثات في العملية العاملة: سطر JSON لكل تحديث عبر مقبس يونكس"""
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                update = Update.de_json(json.loads(line), self.application.bot)
+                await self.application.update_queue.put(update)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"انقطع الاتصال بالعملية الأمامية: {e}")
+        finally:
+            writer.close()
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path, limit=MAX_BODY_SIZE + 1)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+async def run_shard_worker(application, index):
+    """تشغيل عملية عاملة تعالج مستخدمي الجزء index فقط"""
+    server = ShardServer(application, socket_path(index))
+    logger.info(f"العامل {index} يستقبل على {server.path}")
+    await run_with_server(application, server)
+
+
+class ShardRouter:
+    """توجيه كل تحديث إلى عامل ثابت حسب المستخدم
+
+    لكل عامل طابور واتصال واحد، فتصل تحديثات المستخدم الواحد بالترتيب.
+    إذا امتلأ الطابور (العامل متوقف) يُرفض التحديث ليعيد تيليجرام إرساله.
+    """
+
+    def __init__(self, shards, socket_dir=SHARD_SOCKET_DIR, queue_size=10000):
+        self.shards = shards
+        self.socket_dir = socket_dir
+        self.queues = [asyncio.Queue(queue_size) for _ in range(shards)]
+        self._tasks = []
+
+    def shard_for(self, data):
+        return jump_hash(routing_key(data), self.shards)
+
+    def dispatch(self, data):
+        line = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        shard = self.shard_for(data)
+        try:
+            self.queues[shard].put_nowait(line)
+        except asyncio.QueueFull:
+            return False
+        shard_updates.inc(shard=shard)
+        return True
+
+    async def _connect(self, index):
+        delay = 0.05
+        while True:
+            try:
+                return await asyncio.open_unix_connection(socket_path(index, self.socket_dir))
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2)
+
+    async def _forward(self, index):
+        queue = self.queues[index]
+        pending = []
+        while True:
+            reader, writer = await self._connect(index)
+            try:
+                while True:
+                    if not pending:
+                        pending.append(await queue.get())
+                    # تجميع ما تراكم في الطابور في كتابة واحدة
+                    while not queue.empty():
+                        pending.append(queue.get_nowait())
+                    writer.write(b''.join(pending))
+                    await writer.drain()
+                    pending.clear()
+            except ConnectionError as e:
+                # الدفعة غير المؤكدة تُعاد بعد إعادة الاتصال
+                logger.warning(f"انقطع الاتصال بالعامل {index}: {e}")
+                writer.close()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(self.shards)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class WorkerPool:
+    """تشغيل العمليات العاملة وإعادة تشغيل ما يتوقف منها"""
+
+    def __init__(self, command, shards, socket_dir=SHARD_SOCKET_DIR, env=None):
+        self.command = command
+        self.shards = shards
+        self.socket_dir = socket_dir
+        self.env = env or {}
+        self.processes = {}
+        self._task = None
+
+    def _spawn(self, index):
+        env = {
+            **os.environ, **self.env,
+            'SHARD_INDEX': str(index),
+            'SHARDS': str(self.shards),
+            'SHARD_SOCKET_DIR': self.socket_dir
+        }
+        self.processes[index] = subprocess.Popen(self.command, env=env)
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(1)
+            for index, process in self.processes.items():
+                if process.poll() is not None:
+                    logger.error(f"توقف العامل {index} (الرمز {process.returncode})، إعادة تشغيله")
+                    self._spawn(index)
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        for index in range(self.shards):
+            self._spawn(index)
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self, timeout=10):
+        if self._task is not None:
+            self._task.cancel()
+        for process in self.processes.values():
+            process.terminate()
+        for index, process in self.processes.items():
+            try:
+                await asyncio.to_thread(process.wait, timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"العامل {index} لم يتوقف خلال {timeout} ثانية")
+                process.kill()
+
+
+async def run_front(command, allowed_updates, shards=SHARDS):
+    """تشغيل العملية الأمامية: webhook واحد يوزع التحديثات على shards عاملاً
+
+    command أمر تشغيل العامل؛ كل عامل يُشغَّل بـ SHARD_INDEX خاص به.
+    """
+    if STORAGE_BACKEND != 'sqlite':
+        raise RuntimeError("التشغيل الموزع يتطلب STORAGE_BACKEND=sqlite لمشاركة التخزين بين العمليات")
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL غير محدد (أو RENDER_EXTERNAL_URL على Render)")
+
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    pool = WorkerPool(command, shards)
+    router = ShardRouter(shards)
+
+    async def route(data):
+        return router.dispatch(data)
+
+    server = create_update_server(route, secret_token)
+    stop_event = stop_signal()
+
+    await pool.start()
+    await router.start()
+    await server.start()
+    async with Bot(BOT_TOKEN) as bot:
+        await bot.set_webhook(
+            url=webhook_url(),
+            secret_token=secret_token,
+            allowed_updates=allowed_updates
+        )
+    logger.info(f"البوت يعمل بوضع webhook موزع على {shards} عمليات")
+    # العملية الأمامية لا تحمل بيانات، فهي جاهزة بمجرد تشغيل الخادم والعمال
+    set_ready()
+
+    await stop_event.wait()
+
+    await server.stop()
+    await router.stop()
+    await pool.stop()
+
+
+def main():
+    """العملية الأمامية للتشغيل الموزع: python sharding.py
+
+    لا تستورد bot.py، فلا تُنشأ فيها قاعدة بيانات ولا مخازن حالة لا تستخدمها؛
+    كل عامل يشغّل bot.py بـ SHARD_INDEX خاص به.
+    """
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    bot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+    asyncio.run(run_front([sys.executable, bot_path], ALLOWED_UPDATES))
+
+
+if __name__ == '__main__':
+    main()
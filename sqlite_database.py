@@ -0,0 +1,450 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import SQLITE_PATH
+from ids import question_ids, result_ids
+from journal import iter_pending
+from question_index import QuestionIndex
+from database import (
+    Database, apply_result_to_stats, apply_answer_to_item_stats, build_teacher_report,
+    rebuild_student_stats, replay_item_stats, replay_student_stats
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teachers (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    name TEXT,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    name TEXT,
+    created_at TEXT,
+    quizzes_taken INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER NOT NULL DEFAULT 0,
+    stats TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    teacher_id TEXT NOT NULL,
+    type TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL,
+    updated_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_questions_teacher ON questions (teacher_id);
+
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    student_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    date TEXT NOT NULL,
+    quiz_data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_student ON results (student_id, seq);
+CREATE INDEX IF NOT EXISTS idx_results_date ON results (date);
+
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id TEXT PRIMARY KEY,
+    teacher_id TEXT NOT NULL,
+    stats TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_question_stats_teacher ON question_stats (teacher_id);
+
+CREATE TABLE IF NOT EXISTS class_members (
+    teacher_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    joined_at TEXT,
+    PRIMARY KEY (teacher_id, student_id)
+);
+"""
+
+# ترتيب آخر إضافة أو تعديل للسؤال، أكبر من كل ما قبله في القاعدة كلها
+NEXT_UPDATED_SEQ = '(SELECT COALESCE(MAX(updated_seq), 0) + 1 FROM questions)'
+
+# حقول الإحصائيات التراكمية المحفوظة في عمود stats
+STATS_FIELDS = ('total_possible', 'best_percentage', 'recent', 'type_stats')
+
+
+class SQLiteDatabase(Database):
+    """تخزين SQLite بنفس واجهة Database مع فهارس على المعلم والطالب والتاريخ"""
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._index = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._ensure_column('students', 'stats', "TEXT NOT NULL DEFAULT '{}'")
+        self._ensure_column('questions', 'updated_seq', 'INTEGER NOT NULL DEFAULT 0')
+        with self._conn:
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_updated ON questions (updated_seq)')
+            # الأسئلة من مخطط أقدم تأخذ ترتيب إضافتها
+            self._conn.execute('UPDATE questions SET updated_seq = seq WHERE updated_seq = 0')
+        self._backfill_student_stats()
+        self.storage_files = (path, f"{path}-wal")
+
+    def _ensure_column(self, table, column, declaration):
+        """إضافة عمود جديد لقواعد أُنشئت بإصدار أقدم من المخطط"""
+        columns = {row['name'] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+            self._conn.commit()
+
+    def _backfill_student_stats(self):
+        """حساب الإحصائيات التراكمية من جدول النتائج للطلاب الذين سبقت نتائجهم عمود stats"""
+        with self._lock, self._conn:
+            stale = self._conn.execute(
+                'SELECT user_id, quizzes_taken, total_score, stats FROM students '
+                "WHERE quizzes_taken > 0 AND json_extract(stats, '$.total_possible') IS NULL"
+            ).fetchall()
+            for row in stale:
+                results = self._conn.execute(
+                    'SELECT score, total, percentage, date, quiz_data FROM results '
+                    'WHERE student_id = ? ORDER BY seq', (row['user_id'],)
+                ).fetchall()
+                if not results:
+                    continue
+
+                student = rebuild_student_stats(
+                    {**json.loads(row['stats']), 'quizzes_taken': row['quizzes_taken'], 'total_score': row['total_score']},
+                    [{**dict(result), 'quiz_data': json.loads(result['quiz_data'])} for result in results]
+                )
+                self._conn.execute(
+                    'UPDATE students SET quizzes_taken = ?, total_score = ?, stats = ? WHERE user_id = ?',
+                    (student['quizzes_taken'], student['total_score'],
+                     json.dumps({k: v for k, v in student.items() if k in STATS_FIELDS}, ensure_ascii=False),
+                     row['user_id'])
+                )
+            return len(stale)
+
+    def warm(self):
+        """بناء فهرس الأسئلة وقراءة جداول الإحصائيات مرة حتى تدخل صفحاتها ذاكرة SQLite"""
+        with self._lock:
+            self._question_index()
+            for table in ('students', 'question_stats'):
+                self._conn.execute(f'SELECT SUM(LENGTH(stats)) FROM {table}').fetchone()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # === إدارة المعلمين ===
+    def add_teacher(self, user_id, username, name):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO teachers (user_id, username, name, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (str(user_id), username, name, datetime.now().isoformat())
+            )
+
+    def is_teacher(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM teachers WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+            return row is not None
+
+    # === إدارة الطلاب ===
+    def add_student(self, user_id, username, name):
+        with self._lock, self._conn:
+            # الحفاظ على الإحصائيات عند إعادة اختيار الدور
+            self._conn.execute(
+                'INSERT INTO students (user_id, username, name, created_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, name = excluded.name',
+                (str(user_id), username, name, datetime.now().isoformat())
+            )
+
+    def is_student(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM students WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+            return row is not None
+
+    # === فصول المعلمين ===
+    def join_class(self, teacher_id, student_id):
+        """انضمام الطالب إلى فصل المعلم، ويعيد False إذا لم يكن المعلم مسجلاً"""
+        with self._lock, self._conn:
+            if not self.is_teacher(teacher_id):
+                return False
+            self._conn.execute(
+                'INSERT OR IGNORE INTO class_members (teacher_id, student_id, joined_at) VALUES (?, ?, ?)',
+                (str(teacher_id), str(student_id), datetime.now().isoformat())
+            )
+            return True
+
+    def get_class_roster(self, teacher_id):
+        """معرفات طلاب فصل المعلم: من انضموا عبر رابط الانضمام فقط"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT student_id FROM class_members WHERE teacher_id = ?', (str(teacher_id),)
+            ).fetchall()
+            return [int(row[0]) for row in rows]
+
+    # === إدارة الأسئلة ===
+    def add_questions(self, teacher_id, questions_data):
+        """إضافة عدة أسئلة في معاملة واحدة، ويعيد معرفاتها"""
+        with self._lock, self._conn:
+            questions = [
+                {
+                    **question_data,
+                    'id': question_ids.new(teacher_id),
+                    'teacher_id': str(teacher_id),
+                    'created_at': datetime.now().isoformat()
+                }
+                for question_data in questions_data
+            ]
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO questions (id, teacher_id, type, created_at, data, updated_seq) '
+                f'VALUES (?, ?, ?, ?, ?, {NEXT_UPDATED_SEQ})',
+                [self._question_row(question) for question in questions]
+            )
+            return [question['id'] for question in questions]
+
+    def _question_index(self):
+        """الفهرس يُكمل من الصفوف المضافة أو المعدلة بعد آخر صف محمّل في كل استخدام
+
+        فيرى الأسئلة التي أضافتها أو عدّلتها عمليات أخرى تشارك نفس القاعدة
+        (التشغيل الموزع)، مثل file_id الصورة بعد رفعها أول مرة، والاستعلام على
+        فهرس updated_seq لا يكلف شيئاً إذا لم يتغير شيء.
+        """
+        if self._index is None:
+            self._index = QuestionIndex()
+            self._index_seq = 0
+
+        rows = self._conn.execute(
+            'SELECT updated_seq, data FROM questions WHERE updated_seq > ? ORDER BY updated_seq',
+            (self._index_seq,)
+        ).fetchall()
+        for row in rows:
+            # add يستبدل السؤال الموجود بنسخته المعدلة
+            self._index.add(json.loads(row['data']))
+        if rows:
+            self._index_seq = rows[-1]['updated_seq']
+        return self._index
+
+    @staticmethod
+    def _question_row(question):
+        return (question['id'], question['teacher_id'], question.get('type'),
+                question.get('created_at'), json.dumps(question, ensure_ascii=False))
+
+    def _insert_question(self, question):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO questions (id, teacher_id, type, created_at, data, updated_seq) '
+            f'VALUES (?, ?, ?, ?, ?, {NEXT_UPDATED_SEQ})',
+            self._question_row(question)
+        )
+
+    def update_question(self, question_id, fields):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT data FROM questions WHERE id = ?', (question_id,)
+            ).fetchone()
+            if row is None:
+                return False
+
+            question = {**json.loads(row['data']), **fields}
+            self._conn.execute(
+                f'UPDATE questions SET type = ?, data = ?, updated_seq = {NEXT_UPDATED_SEQ} WHERE id = ?',
+                (question.get('type'), json.dumps(question, ensure_ascii=False), question_id)
+            )
+            if self._index is not None:
+                self._index.update(question_id, fields)
+            return True
+
+    def get_questions_by_teacher(self, teacher_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM questions WHERE teacher_id = ? ORDER BY seq', (str(teacher_id),)
+            ).fetchall()
+            return [json.loads(row['data']) for row in rows]
+
+    def get_all_questions(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT id, data FROM questions ORDER BY seq').fetchall()
+            return {row['id']: json.loads(row['data']) for row in rows}
+
+    # === إدارة النتائج ===
+    def save_result(self, student_id, quiz_data, score, total):
+        with self._lock, self._conn:
+            result_id = result_ids.new(student_id)
+            result = {
+                'student_id': str(student_id),
+                'quiz_data': quiz_data,
+                'score': score,
+                'total': total,
+                'percentage': (score / total * 100) if total > 0 else 0,
+                'date': datetime.now().isoformat()
+            }
+            self._insert_result(result_id, result)
+
+            # تحديث إحصائيات الطالب
+            row = self._conn.execute(
+                'SELECT stats FROM students WHERE user_id = ?', (str(student_id),)
+            ).fetchone()
+            if row is not None:
+                stats = apply_result_to_stats(json.loads(row['stats']), result)
+                self._conn.execute(
+                    'UPDATE students SET quizzes_taken = quizzes_taken + 1, '
+                    'total_score = total_score + ?, stats = ? WHERE user_id = ?',
+                    (score, json.dumps(stats, ensure_ascii=False), str(student_id))
+                )
+
+            # عدادات كل سؤال لتحليلات المعلم
+            index = self._question_index()
+            for answer in quiz_data:
+                question = index.get(answer.get('question_id'))
+                if question is not None:
+                    self._record_item_stats(question, answer)
+            return result_id
+
+    def _record_item_stats(self, question, answer):
+        row = self._conn.execute(
+            'SELECT stats FROM question_stats WHERE question_id = ?', (question['id'],)
+        ).fetchone()
+        stats = apply_answer_to_item_stats(json.loads(row['stats']) if row else {}, answer)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO question_stats (question_id, teacher_id, stats) VALUES (?, ?, ?)',
+            (question['id'], question['teacher_id'], json.dumps(stats, ensure_ascii=False))
+        )
+
+    def get_teacher_stats(self, teacher_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT question_id, stats FROM question_stats WHERE teacher_id = ?',
+                (str(teacher_id),)
+            ).fetchall()
+            question_stats = {row['question_id']: json.loads(row['stats']) for row in rows}
+            questions = self._question_index().by_teacher(teacher_id)
+            return build_teacher_report(questions, question_stats.get)
+
+    def get_student_summary(self, student_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT quizzes_taken, total_score, stats FROM students WHERE user_id = ?',
+                (str(student_id),)
+            ).fetchone()
+            if row is None:
+                return None
+            return {
+                **json.loads(row['stats']),
+                'quizzes_taken': row['quizzes_taken'],
+                'total_score': row['total_score']
+            }
+
+    def _insert_result(self, result_id, result):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO results '
+            '(id, student_id, score, total, percentage, date, quiz_data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (result_id, result['student_id'], result['score'], result['total'],
+             result['percentage'], result['date'],
+             json.dumps(result['quiz_data'], ensure_ascii=False))
+        )
+
+    def get_student_results(self, student_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT student_id, quiz_data, score, total, percentage, date '
+                'FROM results WHERE student_id = ? ORDER BY seq',
+                (str(student_id),)
+            ).fetchall()
+            return [{**dict(row), 'quiz_data': json.loads(row['quiz_data'])} for row in rows]
+
+    # === الترحيل من JSON ===
+    def import_json(self, directory='.'):
+        """استيراد ملفات JSON (مع سجل النتائج وعدادات الأسئلة) في معاملة واحدة، ويعيد عدد السجلات لكل ملف"""
+        def load(file_name):
+            path = os.path.join(directory, file_name)
+            if not os.path.exists(path):
+                return {}
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        teachers = load('teachers.json')
+        students = load('students.json')
+        questions = load('questions.json')
+        classes = load('classes.json')
+        results = load('results.json')
+        journal = list(iter_pending(os.path.join(directory, 'results.jsonl')))
+        for record in journal:
+            record = dict(record)
+            results[record.pop('id')] = record
+
+        # اللقطتان مع نتائج السجل التي لم تُحسب فيهما بعد
+        question_stats = replay_item_stats(load('question_stats.json'), journal, questions.get)
+        replay_student_stats(students, journal)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO teachers (user_id, username, name, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                [(uid, t.get('username'), t.get('name'), t.get('created_at'))
+                 for uid, t in teachers.items()]
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO students '
+                '(user_id, username, name, created_at, quizzes_taken, total_score, stats) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(uid, s.get('username'), s.get('name'), s.get('created_at'),
+                  s.get('quizzes_taken', 0), s.get('total_score', 0),
+                  json.dumps({k: v for k, v in s.items() if k in STATS_FIELDS}, ensure_ascii=False))
+                 for uid, s in students.items()]
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO class_members (teacher_id, student_id, joined_at) VALUES (?, ?, ?)',
+                [(teacher_id, student_id, joined_at)
+                 for teacher_id, members in classes.items() for student_id, joined_at in members.items()]
+            )
+            for question_id, question in questions.items():
+                self._insert_question({**question, 'id': question_id})
+            self._index = None
+            for result_id, result in results.items():
+                self._insert_result(result_id, result)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO question_stats (question_id, teacher_id, stats) VALUES (?, ?, ?)',
+                [(question_id, stats['teacher_id'],
+                  json.dumps({k: v for k, v in stats.items() if k != 'teacher_id'}, ensure_ascii=False))
+                 for question_id, stats in question_stats.items()]
+            )
+
+        # ملفات JSON الأقدم من الإحصائيات التراكمية تُحسب من النتائج المستوردة
+        self._backfill_student_stats()
+
+        return {
+            'teachers': len(teachers),
+            'students': len(students),
+            'questions': len(questions),
+            'class_members': sum(len(members) for members in classes.values()),
+            'results': len(results),
+            'question_stats': len(question_stats)
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ترحيل بيانات JSON إلى SQLite')
+    parser.add_argument('--source', default='.', help='مجلد ملفات JSON')
+    parser.add_argument('--db', default=SQLITE_PATH, help='مسار قاعدة SQLite')
+    args = parser.parse_args()
+
+    database = SQLiteDatabase(args.db)
+    counts = database.import_json(args.source)
+    database.close()
+    for name, count in counts.items():
+        print(f"{name}: {count}")
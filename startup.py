@@ -0,0 +1,61 @@
+import logging
+import os
+import time
+from http import HTTPStatus
+
+from http_server import Response
+from metrics import ready_gauge, startup_seconds
+
+logger = logging.getLogger(__name__)
+
+
+def _process_started():
+    """لحظة بدء العملية بمقياس time.monotonic من /proc، أو لحظة استيراد هذه الوحدة"""
+    try:
+        with open('/proc/self/stat') as f:
+            # الحقل 22 (starttime) بعد اسم الأمر الذي قد يحوي مسافات
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.monotonic() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return time.monotonic()
+
+
+_started = _process_started()
+_ready = False
+ready_gauge.set(0)
+
+# زمن انتهاء كل مرحلة بالثواني منذ بدء العملية
+phases = {}
+
+
+def mark(phase):
+    """تسجيل انتهاء مرحلة من التشغيل في السجل ومقياس bot_startup_seconds"""
+    elapsed = time.monotonic() - _started
+    phases[phase] = elapsed
+    startup_seconds.set(round(elapsed, 4), phase=phase)
+    return elapsed
+
+
+def set_ready():
+    """البوت جاهز لاستقبال المرور بعد اكتمال التحميل المسبق"""
+    global _ready
+    if _ready:
+        return
+    _ready = True
+    mark('ready')
+    ready_gauge.set(1)
+    summary = ', '.join(f"{phase}={seconds:.2f}" for phase, seconds in phases.items())
+    logger.info(f"البوت جاهز بعد {phases['ready']:.2f} ثانية من بدء العملية ({summary})")
+
+
+def is_ready():
+    return _ready
+
+
+async def health(request):
+    """فحص الصحة: 503 حتى يكتمل التحميل المسبق فلا يُوجه المرور إلى نسخة باردة"""
+    if not _ready:
+        return Response(HTTPStatus.SERVICE_UNAVAILABLE, 'starting')
+    return Response(HTTPStatus.OK, 'ok')
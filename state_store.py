@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+from config import STATE_BACKEND, STATE_TTL, STATE_DB_PATH, SHARD_INDEX
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStateStore(MutableMapping):
+    """حالة المحادثات في الذاكرة مع انتهاء صلاحية الجلسات المهملة
+
+    تعمل كقاموس عادي؛ كل كتابة تجدد مهلة الجلسة، والجلسات التي لم تُلمس
+    خلال ttl ثانية تُحذف عند الوصول إليها أو في جولة التنظيف الدورية.
+    """
+
+    def __init__(self, ttl=STATE_TTL, purge_interval=60):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._data = {}
+        self._last_purge = time.monotonic()
+
+    def __getitem__(self, user_id):
+        expires_at, state = self._data[user_id]
+        if expires_at <= time.monotonic():
+            del self._data[user_id]
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id, state):
+        now = time.monotonic()
+        self._data[user_id] = (now + self.ttl, state)
+        if now - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def __delitem__(self, user_id):
+        del self._data[user_id]
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def purge_expired(self):
+        """حذف الجلسات المنتهية، ويعيد عدد المحذوف"""
+        now = time.monotonic()
+        expired = [uid for uid, (expires_at, _) in self._data.items() if expires_at <= now]
+        for uid in expired:
+            del self._data[uid]
+        self._last_purge = now
+        return len(expired)
+
+    def close(self):
+        """لا شيء يُحفظ عند الإغلاق في الذاكرة"""
+
+
+class SQLiteStateStore(MemoryStateStore):
+    """حالة المحادثات في SQLite حتى تبقى بعد إعادة التشغيل
+
+    الجلسات الحية تُقرأ من الملف مرة واحدة عند الإنشاء ثم تُخدم من الذاكرة،
+    وكل تعديل يُرسل إلى خيط كتابة واحد يحفظه في SQLite، فلا تنتظر حلقة
+    الأحداث القرص في أي قراءة أو كتابة. لذلك يملك الملف عملية واحدة فقط.
+
+    الحالة تُحفظ كـ JSON لحظة الإسناد، لذلك يجب إعادة تعيين
+    user_states[user_id] بعد أي تعديل على الحالة حتى يُحفظ. إذا مُرر model
+    تُحفظ القيم عبر to_dict() وتُقرأ عبر model.from_dict() بدل القواميس.
+    """
+
+    def __init__(self, path=STATE_DB_PATH, ttl=STATE_TTL, purge_interval=60, table='states', model=None):
+        super().__init__(ttl, purge_interval)
+        self.table = table
+        self.model = model
+        # sqlite3 لا يُستورد إلا إذا اختير هذا المخزن
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_expires ON {table} (expires_at)')
+        self._conn.commit()
+        self._load_live()
+
+        # {user_id: (JSON، وقت الانتهاء)} أو None للحذف؛ آخر تعديل لكل مستخدم فقط
+        self._pending = {}
+        self._purge_due = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name=f'state-writer-{table}', daemon=True)
+        self._writer.start()
+
+    def _load_live(self):
+        """تحميل الجلسات غير المنتهية، مع تحويل وقت انتهائها إلى ساعة monotonic"""
+        now, monotonic_now = time.time(), time.monotonic()
+        rows = self._conn.execute(
+            f'SELECT user_id, data, expires_at FROM {self.table} WHERE expires_at > ?', (now,)
+        ).fetchall()
+        for user_id, data, expires_at in rows:
+            state = json.loads(data)
+            state = self.model.from_dict(state) if self.model else state
+            self._data[user_id] = (monotonic_now + expires_at - now, state)
+
+    def _queue(self, user_id, row):
+        with self._lock:
+            self._pending[user_id] = row
+        self._wakeup.set()
+
+    def __setitem__(self, user_id, state):
+        data = state.to_dict() if self.model else state
+        # التحويل إلى JSON هنا لا في خيط الكتابة حتى لا يلتقط تعديلاً لاحقاً نصف منجز
+        row = (json.dumps(data, ensure_ascii=False), time.time() + self.ttl)
+        super().__setitem__(user_id, state)
+        self._queue(user_id, row)
+
+    def __delitem__(self, user_id):
+        super().__delitem__(user_id)
+        self._queue(user_id, None)
+
+    def purge_expired(self):
+        purged = super().purge_expired()
+        with self._lock:
+            self._purge_due = True
+        self._wakeup.set()
+        return purged
+
+    def _write_loop(self):
+        while not self._stop_event.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # التعديلات الفاشلة أُعيدت إلى الانتظار وتُحفظ مع التعديل التالي
+                logger.exception(f"تعذر حفظ الحالة في جدول {self.table}")
+
+    def flush(self):
+        """حفظ التعديلات المنتظرة في معاملة واحدة"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                purge, self._purge_due = self._purge_due, False
+            if not pending and not purge:
+                return
+
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        f'INSERT OR REPLACE INTO {self.table} (user_id, data, expires_at) VALUES (?, ?, ?)',
+                        [(user_id, *row) for user_id, row in pending.items() if row is not None]
+                    )
+                    self._conn.executemany(
+                        f'DELETE FROM {self.table} WHERE user_id = ?',
+                        [(user_id,) for user_id, row in pending.items() if row is None]
+                    )
+                    if purge:
+                        self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),))
+            except BaseException:
+                # إعادتها للانتظار دون الكتابة فوق تعديل أحدث وصل أثناء المحاولة
+                with self._lock:
+                    for user_id, row in pending.items():
+                        self._pending.setdefault(user_id, row)
+                    self._purge_due = self._purge_due or purge
+                raise
+
+    def close(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        self._conn.close()
+
+
+def create_state_store(table='states', model=None):
+    """إنشاء مخزن الحالة حسب STATE_BACKEND
+
+    table جدول المخزن في ملف الحالة، و model صنف القيم إن لم تكن قواميس
+    (مخزن الذاكرة يحفظ الكائنات كما هي).
+    """
+    if STATE_BACKEND == 'sqlite':
+        path = STATE_DB_PATH
+        # كل عامل يملك حالة مستخدميه فقط، فيحفظها في ملف خاص به
+        if SHARD_INDEX is not None:
+            root, extension = os.path.splitext(STATE_DB_PATH)
+            path = f"{root}-{SHARD_INDEX}{extension}"
+        return SQLiteStateStore(path, table=table, model=model)
+    return MemoryStateStore()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# الوحدات في جذر المستودع وليست حزمة، فيُضاف الجذر لمسار الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+import os
+
+import ids
+from ids import IdAllocator
+
+
+def fixed_clock(monkeypatch, *values):
+    """ساعة تعيد القيم بالترتيب ثم تثبت على الأخيرة"""
+    values = list(values)
+
+    def clock():
+        return values.pop(0) if len(values) > 1 else values[0]
+    monkeypatch.setattr(ids.time, 'time', clock)
+
+
+def test_ids_in_same_millisecond_are_ordered_and_unique(monkeypatch):
+    fixed_clock(monkeypatch, 1700000000.0)
+    allocator = IdAllocator('r', node='abcde')
+
+    new_ids = [allocator.new(7) for _ in range(500)]
+    assert new_ids == sorted(new_ids)
+    assert len(set(new_ids)) == len(new_ids)
+    assert all(new_id.startswith('r') and new_id.endswith('abcde_7') for new_id in new_ids)
+
+
+def test_ids_follow_the_clock():
+    allocator = IdAllocator('q', node='abcde')
+    first = allocator.new(1)
+    second = allocator.new(1)
+    assert first < second
+
+
+def test_clock_going_backwards_keeps_order(monkeypatch):
+    fixed_clock(monkeypatch, 1700000000.0, 1699999990.0, 1699999990.0)
+    allocator = IdAllocator('r', node='abcde')
+
+    new_ids = [allocator.new(1) for _ in range(3)]
+    assert new_ids == sorted(new_ids)
+    assert len(set(new_ids)) == 3
+
+
+def test_sequence_overflow_moves_to_next_millisecond(monkeypatch):
+    fixed_clock(monkeypatch, 1700000000.0)
+    allocator = IdAllocator('r', node='abcde')
+
+    new_ids = [allocator.new(1) for _ in range(36 ** 2 + 2)]
+    assert new_ids == sorted(new_ids)
+    assert len(set(new_ids)) == len(new_ids)
+    assert allocator._last_ms == 1700000000000 + 1
+
+
+def test_new_ids_never_match_legacy_ids():
+    allocator = IdAllocator('q')
+    assert not allocator.new(5)[1:].split('_')[0].isdigit()
+
+
+def test_reset_node_changes_node():
+    allocator = IdAllocator('r')
+    node = allocator.node
+    allocator._reset_node()
+    assert allocator.node != node
+    assert allocator.node.isalpha() and len(allocator.node) == 5
+
+
+def test_forked_child_gets_its_own_node():
+    allocator = IdAllocator('r')
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, allocator.node.encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        child_node = pipe.read()
+    os.waitpid(pid, 0)
+    assert child_node and child_node != allocator.node
+
+
+def test_explicit_node_is_kept():
+    assert IdAllocator('q', node='fixed').node == 'fixed'
@@ -0,0 +1,175 @@
+import os
+import time
+
+import pytest
+
+import database
+import journal
+from database import BufferedDatabase, Database
+from journal import Journal, iter_journal
+
+
+def write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# === قص السطر الناقص ===
+def test_repair_cuts_partial_last_line(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_bytes(path, b'{"id": 1}\n{"id": 2}\n{"id": 3, "sco')
+
+    log = Journal(str(path))
+    assert log.count == 2
+    assert read_bytes(path) == b'{"id": 1}\n{"id": 2}\n'
+
+    # الإضافة التالية لا تلتصق بالسطر المقصوص
+    log.append({'id': 4})
+    log.close()
+    assert [record['id'] for record in iter_journal(str(path))] == [1, 2, 4]
+
+
+def test_repair_empties_file_without_complete_line(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_bytes(path, b'{"id": 1, "par')
+
+    log = Journal(str(path))
+    log.close()
+    assert log.count == 0
+    assert read_bytes(path) == b''
+
+
+def test_repair_finds_newline_before_long_partial_line(tmp_path):
+    """السطر الناقص أطول من كتلة البحث (4096 بايت)"""
+    path = tmp_path / 'results.jsonl'
+    write_bytes(path, b'{"id": 1}\n' + b'x' * 10000)
+
+    Journal(str(path)).close()
+    assert read_bytes(path) == b'{"id": 1}\n'
+
+
+def test_iter_journal_skips_partial_and_corrupt_lines(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_bytes(path, b'{"id": 1}\nnot json\n{"id": 2}\n{"id": 3')
+
+    assert [record['id'] for record in iter_journal(str(path))] == [1, 2]
+
+
+def test_rotate_keeps_records_readable_until_discarded(tmp_path):
+    log = Journal(str(tmp_path / 'results.jsonl'))
+    log.append({'id': 1})
+    log.rotate()
+    log.append({'id': 2})
+
+    assert log.count == 1
+    assert [record['id'] for record in log] == [1, 2]
+
+    log.discard_compacted()
+    assert [record['id'] for record in log] == [2]
+    log.close()
+
+
+def test_interval_policy_syncs_idle_journal(tmp_path, monkeypatch):
+    """المزامنة لا تنتظر إضافة لاحقة"""
+    synced = []
+    monkeypatch.setattr(journal.os, 'fsync', lambda fd: synced.append(fd))
+
+    log = Journal(str(tmp_path / 'results.jsonl'), fsync_policy='interval', fsync_interval=0.02)
+    log.append({'id': 1})
+    deadline = time.monotonic() + 2
+    while not synced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert synced
+
+    # لا مزامنة جديدة دون إضافة
+    count = len(synced)
+    time.sleep(0.1)
+    assert len(synced) == count
+    log.close()
+
+
+# === الدمج وإعادة التشغيل ===
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, 'JOURNAL_COMPACT_EVERY', 5)
+    return tmp_path
+
+
+def register(db):
+    """معلم بسؤال واحد وطالب، محفوظون على القرص قبل أي نتيجة"""
+    db.add_teacher(1, 'teacher', 'Teacher')
+    question_id = db.add_question(1, {'type': 'true_false', 'question': 'q', 'correct_answer': 'صح'})
+    db.add_student(2, 'student', 'Student')
+    db.flush()
+    return question_id
+
+
+def save_results(db, question_id, results):
+    for index in range(results):
+        answer = {'question_id': question_id, 'question_type': 'true_false',
+                  'user_answer': 'true', 'is_correct': index % 2 == 0}
+        db.save_result(2, [answer], 1 if answer['is_correct'] else 0, 1)
+
+
+def snapshot(db):
+    summary = db.get_student_summary(2)
+    report = db.get_teacher_stats(1)
+    return summary['quizzes_taken'], summary['total_score'], len(db.get_student_results(2)), report['attempts']
+
+
+@pytest.mark.parametrize('backend', [Database, BufferedDatabase])
+def test_compaction_and_restart_agree(workdir, backend):
+    db = backend()
+    save_results(db, register(db), 12)
+    assert snapshot(db) == (12, 6, 12, 12)
+    db.close()
+
+    # الدمج جرى في الخلفية ونقل النتائج الأولى إلى results.json
+    assert not os.path.exists('results.jsonl.compacting')
+    assert len(database._read_json('results.json')) >= 5
+
+    reopened = backend()
+    assert snapshot(reopened) == (12, 6, 12, 12)
+    reopened.close()
+
+
+@pytest.mark.parametrize('backend', [Database, BufferedDatabase])
+def test_restart_after_interrupted_compaction(workdir, backend):
+    db = backend()
+    question_id = register(db)
+    save_results(db, question_id, 3)
+    # انقطاع بعد نقل السجل وقبل كتابة اللقطات
+    with db._lock:
+        db.results_journal.rotate()
+    save_results(db, question_id, 2)
+    db.results_journal.close()
+
+    reopened = backend()
+    assert snapshot(reopened) == (5, 3, 5, 5)
+
+    reopened.compact_results()
+    reopened.compact_results()
+    assert not os.path.exists('results.jsonl.compacting')
+    reopened.close()
+
+    assert snapshot(backend()) == (5, 3, 5, 5)
+
+
+def test_buffered_aggregates_catch_up_after_crash(workdir):
+    """نتائج وصلت للسجل قبل كتابة students.json تُحسب عند التحميل"""
+    db = BufferedDatabase(flush_interval=3600)
+    question_id = register(db)
+    save_results(db, question_id, 1)
+    db.flush()
+    save_results(db, question_id, 3)
+    db.results_journal.close()
+
+    reopened = BufferedDatabase(flush_interval=3600)
+    assert snapshot(reopened)[:3] == (4, 3, 4)
+    reopened.close()
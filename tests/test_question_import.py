@@ -0,0 +1,142 @@
+import io
+import json
+
+import pytest
+
+from question_import import RowError, parse_questions, parse_questions_file, validate_row
+
+
+# === التحقق من الصف ===
+def test_true_false_accepts_arabic_type_and_answer_aliases():
+    for answer in ('صح', 'TRUE', '1', 'نعم'):
+        question = validate_row({'type': 'صح أو خطأ', 'question': 'الأرض كروية', 'correct_answer': answer})
+        assert question.type == 'true_false'
+        assert question.correct_answer == 'صح'
+
+    question = validate_row({'type': 'true_false', 'question': 'q', 'correct_answer': 'false'})
+    assert question.correct_answer == 'خطأ'
+
+
+def test_true_false_rejects_other_answers():
+    with pytest.raises(RowError):
+        validate_row({'type': 'true_false', 'question': 'q', 'correct_answer': 'ربما'})
+
+
+def test_multiple_choice_splits_options_on_pipe():
+    question = validate_row({'type': 'multiple_choice', 'question': 'q',
+                             'options': 'أ) واحد | ب) اثنان | ج) ثلاثة', 'correct_answer': 'ب'})
+    assert question.options == 'أ) واحد\nب) اثنان\nج) ثلاثة'
+    assert question.correct_answer == 'ب'
+
+
+def test_multiple_choice_keeps_newline_options_and_lowercases_letter():
+    question = validate_row({'type': 'multiple_choice', 'question': 'q',
+                             'options': 'a) one|1\nb) two', 'correct_answer': 'B'})
+    assert question.options == 'a) one|1\nb) two'
+    assert question.correct_answer == 'b'
+
+
+def test_multiple_choice_answer_must_be_an_option_letter():
+    with pytest.raises(RowError):
+        validate_row({'type': 'multiple_choice', 'question': 'q', 'options': 'أ) 1|ب) 2', 'correct_answer': 'د'})
+
+
+@pytest.mark.parametrize('options', ['أ) 1', 'أ) 1|ب) 2|ج) 3|د) 4|هـ) 5'])
+def test_multiple_choice_needs_two_to_four_options(options):
+    with pytest.raises(RowError):
+        validate_row({'type': 'multiple_choice', 'question': 'q', 'options': options, 'correct_answer': 'أ'})
+
+
+def test_short_answer_is_lowercased():
+    question = validate_row({'type': 'short_answer', 'question': 'q', 'correct_answer': '  Paris '})
+    assert question.correct_answer == 'paris'
+
+    with pytest.raises(RowError):
+        validate_row({'type': 'short_answer', 'question': 'q', 'correct_answer': ''})
+
+
+def test_keys_are_normalised_and_none_is_empty():
+    question = validate_row({' Type ': 'short_answer', 'QUESTION': 'q', 'correct_answer': 'x', 'photo_file_id': None})
+    assert question.question == 'q'
+    assert question.photo_file_id == ''
+
+
+def test_empty_question_needs_photo():
+    with pytest.raises(RowError):
+        validate_row({'type': 'short_answer', 'question': '', 'correct_answer': 'x'})
+
+    question = validate_row({'type': 'short_answer', 'question': '', 'photo_file_id': 'AgAD', 'correct_answer': 'x'})
+    assert question.photo_file_id == 'AgAD'
+
+
+def test_unknown_type_is_rejected():
+    with pytest.raises(RowError, match='نوع غير معروف'):
+        validate_row({'type': 'essay', 'question': 'q', 'correct_answer': 'x'})
+
+
+@pytest.mark.parametrize('row', [None, ['true_false', 'q'], 'q'])
+def test_non_dict_row_is_rejected(row):
+    with pytest.raises(RowError):
+        validate_row(row)
+
+
+# === قراءة الملف ===
+def stream(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def test_csv_reports_line_numbers():
+    text = ('type,question,correct_answer\n'
+            'true_false,q1,صح\n'
+            'true_false,q2,ربما\n'
+            'short_answer,"سطر\nثان",x\n'
+            'essay,q4,x\n')
+    questions, errors = parse_questions(stream(text), 'Questions.CSV', teacher_name='T')
+
+    assert [question['question'] for question in questions] == ['q1', 'سطر\nثان']
+    assert all(question['teacher_name'] == 'T' for question in questions)
+    # رقم السطر الأخير للصف في الملف، مع احتساب السطر المتعدد
+    assert [row_number for row_number, _ in errors] == [3, 6]
+
+
+def test_csv_with_bom():
+    questions, errors = parse_questions(io.BytesIO('\ufefftype,question,correct_answer\ntrue_false,q,1\n'.encode('utf-8')),
+                                       'q.csv')
+    assert len(questions) == 1 and not errors
+
+
+def test_jsonl_skips_blank_lines_and_reports_bad_ones():
+    text = ('{"type": "true_false", "question": "q1", "correct_answer": "صح"}\n'
+            '\n'
+            'not json\n'
+            '{"type": "short_answer", "question": "q2", "correct_answer": "x"}\n')
+    questions, errors = parse_questions(stream(text), 'q.jsonl')
+
+    assert [question['question'] for question in questions] == ['q1', 'q2']
+    assert [row_number for row_number, _ in errors] == [3]
+
+
+def test_json_array_rows_are_numbered():
+    rows = [{'type': 'true_false', 'question': 'q1', 'correct_answer': 'صح'}, 'bad']
+    questions, errors = parse_questions(stream(json.dumps(rows)), 'q.json')
+
+    assert len(questions) == 1
+    assert errors == [(2, 'صف غير صالح')]
+
+
+def test_json_must_be_a_list():
+    with pytest.raises(RowError):
+        parse_questions(stream('{"type": "true_false"}'), 'q.json')
+
+
+def test_unsupported_extension():
+    with pytest.raises(RowError):
+        parse_questions(stream('x'), 'q.xlsx')
+
+
+def test_parse_questions_file_uses_original_name(tmp_path):
+    path = tmp_path / 'download.tmp'
+    path.write_text('type,question,correct_answer\nshort_answer,q,x\n', encoding='utf-8')
+
+    questions, errors = parse_questions_file(str(path), 'questions.csv')
+    assert len(questions) == 1 and not errors
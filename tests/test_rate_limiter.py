@@ -0,0 +1,190 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from rate_limiter import BULK_SEND, OutboundLimiter
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def edit_data(chat_id=1, message_id=10):
+    return {'chat_id': chat_id, 'message_id': message_id}
+
+
+def test_pending_edits_of_same_message_are_coalesced():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+        sent = []
+        release = asyncio.Event()
+
+        async def edit(name):
+            sent.append(name)
+            if name == 'edit1':
+                await release.wait()
+            return name
+
+        async def request(name):
+            return await limiter.process_request(edit, (name,), {}, 'editMessageText', edit_data(), None)
+
+        first = asyncio.create_task(request('edit1'))
+        await asyncio.sleep(0)
+        # edit1 قيد الإرسال ودلو المحادثة فارغ، فينتظر edit2 ثم يحل edit3 محله
+        second = asyncio.create_task(request('edit2'))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(request('edit3'))
+        await asyncio.sleep(0)
+        release.set()
+
+        results = await asyncio.gather(first, second, third)
+        return sent, results, limiter._edits
+
+    sent, results, pending = run(scenario())
+    assert sent == ['edit1', 'edit3']
+    assert results == ['edit1', 'edit3', 'edit3']
+    assert pending == {}
+
+
+def test_edits_of_different_messages_are_not_coalesced():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=50, chat_burst=1)
+        sent = []
+
+        async def edit(message_id):
+            sent.append(message_id)
+            return message_id
+
+        await asyncio.gather(*(
+            limiter.process_request(edit, (message_id,), {}, 'editMessageText', edit_data(message_id=message_id), None)
+            for message_id in (10, 11, 12)
+        ))
+        return sent
+
+    assert sorted(run(scenario())) == [10, 11, 12]
+
+
+def test_superseded_edit_gets_successor_error():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+        release = asyncio.Event()
+
+        async def edit(name):
+            if name == 'edit1':
+                await release.wait()
+                return name
+            raise ValueError(name)
+
+        async def request(name):
+            return await limiter.process_request(edit, (name,), {}, 'editMessageText', edit_data(), None)
+
+        tasks = [asyncio.create_task(request('edit1'))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request('edit2')))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request('edit3')))
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    first, second, third = run(scenario())
+    assert first == 'edit1'
+    assert isinstance(second, ValueError) and str(second) == 'edit3'
+    assert isinstance(third, ValueError) and str(third) == 'edit3'
+
+
+def test_interactive_requests_go_before_bulk():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=10, chat_rate=1000, chat_burst=10)
+        limiter._global.tokens = 0
+        sent = []
+
+        async def send(name):
+            sent.append(name)
+            return name
+
+        bulk = [asyncio.create_task(limiter.process_request(
+            send, (f'bulk{index}',), {}, 'sendMessage', {'chat_id': 100 + index}, BULK_SEND)) for index in range(2)]
+        await asyncio.sleep(0)
+        interactive = [asyncio.create_task(limiter.process_request(
+            send, (f'reply{index}',), {}, 'sendMessage', {'chat_id': 200 + index}, None)) for index in range(2)]
+        await asyncio.gather(*bulk, *interactive)
+        return sent
+
+    sent = run(scenario())
+    assert sorted(sent[:2]) == ['reply0', 'reply1']
+    assert sorted(sent[2:]) == ['bulk0', 'bulk1']
+
+
+def test_retry_after_pauses_chat_fully_and_global_briefly():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=1000, chat_burst=10,
+                                  max_retries=0, global_cooldown=0.2)
+
+        async def flood():
+            raise RetryAfter(5)
+
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(flood, (), {}, 'sendMessage', {'chat_id': 1}, None)
+        now = time.monotonic()
+        return limiter._chats[1].paused_until - now, limiter._global.paused_until - now
+
+    chat_pause, global_pause = run(scenario())
+    assert 4.5 < chat_pause <= 5
+    assert 0 < global_pause <= 0.2
+
+
+def test_retry_after_without_chat_pauses_global_fully():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, max_retries=0, global_cooldown=0.2)
+
+        async def flood():
+            raise RetryAfter(5)
+
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(flood, (), {}, 'sendMessage', {}, None)
+        return limiter._global.paused_until - time.monotonic()
+
+    assert 4.5 < run(scenario()) <= 5
+
+
+def test_retry_after_is_retried_and_slows_other_chats():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=1000, chat_burst=10, global_cooldown=0.1)
+        calls = []
+
+        async def send(chat_id):
+            calls.append(chat_id)
+            if calls.count(chat_id) == 1 and chat_id == 1:
+                raise RetryAfter(0.4)
+            return time.monotonic()
+
+        started = time.monotonic()
+        flooded = asyncio.create_task(limiter.process_request(send, (1,), {}, 'sendMessage', {'chat_id': 1}, None))
+        await asyncio.sleep(0.01)
+        other = await limiter.process_request(send, (2,), {}, 'sendMessage', {'chat_id': 2}, None)
+        retried = await flooded
+        return calls, other - started, retried - started
+
+    calls, other_after, retried_after = run(scenario())
+    assert calls == [1, 2, 1]
+    # المحادثة الأخرى تنتظر مهلة الحد الكلي فقط، والمحادثة المتجاوزة المدة كلها
+    assert 0.1 <= other_after < 0.4
+    assert retried_after >= 0.4
+
+
+def test_unlimited_endpoints_bypass_limiter():
+    async def scenario():
+        limiter = OutboundLimiter(global_rate=1)
+        limiter._global.tokens = 0
+        limiter._global.pause(60)
+
+        async def answer():
+            return True
+
+        return await asyncio.wait_for(
+            limiter.process_request(answer, (), {}, 'answerCallbackQuery', {'callback_query_id': '1'}, None), 1)
+
+    assert run(scenario()) is True
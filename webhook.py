@@ -0,0 +1,110 @@
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+from http import HTTPStatus
+
+from telegram import Update
+
+from config import PORT, WEBHOOK_LISTEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from http_server import HTTPServer, Response
+from metrics import add_routes as add_metrics_routes
+from startup import health
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_url():
+    return f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+
+
+def create_update_server(on_update, secret_token, host=WEBHOOK_LISTEN, port=PORT):
+    """خادم يستقبل تحديثات تيليجرام على WEBHOOK_PATH ويجيب فحوص الصحة على /health
+
+    on_update(data) يستقبل التحديث كقاموس JSON بعد التحقق من الرمز السري،
+    ويعيد False إذا تعذر قبوله الآن فيُرد بـ 503 ليعيد تيليجرام المحاولة.
+    """
+    server = HTTPServer(host, port)
+
+    async def receive_update(request):
+        token = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode(), secret_token.encode()):
+            return Response(HTTPStatus.FORBIDDEN)
+
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return Response(HTTPStatus.BAD_REQUEST)
+
+        if await on_update(data) is False:
+            return Response(HTTPStatus.SERVICE_UNAVAILABLE)
+        return Response(HTTPStatus.OK)
+
+    server.route('POST', f"/{WEBHOOK_PATH}", receive_update)
+    server.route('GET', '/health', health)
+    add_metrics_routes(server)
+    return server
+
+
+def create_webhook_server(application, secret_token, host=WEBHOOK_LISTEN, port=PORT):
+    """خادم webhook يضع التحديثات في طابور التطبيق مباشرة"""
+    async def enqueue(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    return create_update_server(enqueue, secret_token, host, port)
+
+
+def stop_signal():
+    """حدث يُضبط عند استقبال SIGINT أو SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    return stop_event
+
+
+async def run_with_server(application, server, on_started=None):
+    """تشغيل التطبيق مع خادم استقبال التحديثات حتى استقبال SIGINT أو SIGTERM
+
+    server أي كائن يوفر start() و stop()، و on_started يُستدعى بعد تشغيل الخادم.
+    """
+    stop_event = stop_signal()
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+
+        await server.start()
+        if on_started:
+            await on_started()
+        await application.start()
+
+        await stop_event.wait()
+
+        await server.stop()
+        await application.stop()
+
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+async def run_webhook(application, allowed_updates):
+    """تشغيل البوت بوضع webhook حتى استقبال SIGINT أو SIGTERM"""
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL غير محدد (أو RENDER_EXTERNAL_URL على Render)")
+
+    # بدون سر ثابت يُولَّد سر جديد في كل تشغيل ويُسجل مع الـ webhook
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    server = create_webhook_server(application, secret_token)
+
+    async def set_webhook():
+        await application.bot.set_webhook(
+            url=webhook_url(),
+            secret_token=secret_token,
+            allowed_updates=allowed_updates
+        )
+        logger.info("البوت يعمل بوضع webhook")
+
+    await run_with_server(application, server, set_webhook)